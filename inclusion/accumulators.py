@@ -0,0 +1,180 @@
+# coding: utf-8
+
+_all_ = [ 'BinnedMoments', 'read_moments', 'TDigest' ]
+
+import numpy as np
+
+class BinnedMoments:
+    """
+    Streaming weighted moments of a quantity, per cell of an array of shape `shape`
+    (for instance (rows, bins)): entries, sum of weights, mean and sum of squared
+    deviations (Welford), minimum and maximum, plus a compact histogram of the values
+    with fixed `value_edges`, whose under- and overflow go to the first and last bins;
+    the number of such clipped entries is kept in `outside`.
+    Chunks of values are reduced per cell and then merged with Chan's parallel update,
+    so the memory does not grow with the number of entries.
+    """
+    keys = ('entries', 'sumw', 'mean', 'm2', 'min', 'max', 'hist', 'outside')
+
+    def __init__(self, shape, value_edges):
+        self.shape = tuple(shape)
+        self.value_edges = np.asarray(value_edges, dtype=np.float64)
+        self.entries = np.zeros(self.shape, dtype=np.int64)
+        self.sumw = np.zeros(self.shape)
+        self.mean = np.zeros(self.shape)
+        self.m2 = np.zeros(self.shape)
+        self.min = np.full(self.shape, np.inf)
+        self.max = np.full(self.shape, -np.inf)
+        self.hist = np.zeros(self.shape + (len(self.value_edges)-1,))
+        self.outside = np.zeros(self.shape, dtype=np.int64)
+
+    def _merge(self, entries, sumw, mean, m2):
+        """Chan et al. update of the running moments with the moments of another sample."""
+        total = self.sumw + sumw
+        delta = mean - self.mean
+        with np.errstate(invalid='ignore', divide='ignore'):
+            frac = np.where(total > 0, sumw / total, 0.)
+        self.m2 += m2 + delta**2 * self.sumw * frac
+        self.mean += delta * frac
+        self.sumw = total
+        self.entries += entries
+
+    def fill(self, index, values, weights=None):
+        """
+        Adds one value per entry to the cell `index`, a tuple of index arrays
+        with one element per entry (or a single index array for one-dimensional shapes).
+        """
+        values = np.asarray(values, dtype=np.float64)
+        weights = np.ones_like(values) if weights is None else np.asarray(weights, dtype=np.float64)
+        flat = np.ravel_multi_index(index if isinstance(index, tuple) else (index,), self.shape)
+        ncells = int(np.prod(self.shape))
+        sum_of = lambda x : np.bincount(flat, weights=x, minlength=ncells).reshape(self.shape)
+
+        entries = np.bincount(flat, minlength=ncells).reshape(self.shape)
+        sumw = sum_of(weights)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(sumw != 0, sum_of(weights * values) / sumw, 0.)
+        # second pass over the chunk for a numerically stable sum of squared deviations
+        m2 = sum_of(weights * (values - mean.ravel()[flat])**2)
+        self._merge(entries, sumw, mean, m2)
+
+        np.minimum.at(self.min.reshape(-1), flat, values)
+        np.maximum.at(self.max.reshape(-1), flat, values)
+        vbins = np.clip(np.searchsorted(self.value_edges, values, side='right') - 1,
+                        0, len(self.value_edges) - 2)
+        np.add.at(self.hist.reshape(ncells, -1), (flat, vbins), weights)
+        clipped = (values < self.value_edges[0]) | (values > self.value_edges[-1])
+        self.outside += np.bincount(flat[clipped], minlength=ncells).reshape(self.shape)
+
+    def add(self, other):
+        """Merges the moments of another accumulator, for instance from another file."""
+        if self.shape != other.shape or not np.array_equal(self.value_edges, other.value_edges):
+            raise ValueError('Only accumulators with the same shape and value edges can be merged.')
+        self._merge(other.entries, other.sumw, other.mean, other.m2)
+        self.min = np.minimum(self.min, other.min)
+        self.max = np.maximum(self.max, other.max)
+        self.hist += other.hist
+        self.outside += other.outside
+
+    def variance(self):
+        """Weighted variance of the values, zero for cells without entries."""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.sumw > 0, self.m2 / self.sumw, 0.)
+
+    def sum(self):
+        """Weighted sum of the values."""
+        return self.mean * self.sumw
+
+    def quantile(self, q):
+        """
+        Quantile of the values, linearly interpolated in the histogram bins.
+        Biased when values are clipped into the edge bins (see `outside`).
+        """
+        cum = np.cumsum(self.hist, axis=-1)
+        total = cum[..., -1:]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cum = np.concatenate((np.zeros_like(total), cum), axis=-1) / total
+        res = np.zeros(self.shape)
+        for idx in np.ndindex(self.shape):
+            if total[idx] > 0:
+                res[idx] = np.interp(q, cum[idx], self.value_edges)
+        return res
+
+    def write(self, group):
+        """Writes the accumulator as a few dense datasets of an `h5py` group."""
+        for key in self.keys:
+            group.create_dataset(key, data=getattr(self, key))
+        group.create_dataset('value_edges', data=self.value_edges)
+
+def read_moments(group):
+    """Reads an accumulator written by `BinnedMoments.write`."""
+    acc = BinnedMoments(group['entries'].shape, group['value_edges'][:])
+    for key in BinnedMoments.keys:
+        setattr(acc, key, group[key][:])
+    return acc
+
+class TDigest:
+    """
+    Mergeable quantile sketch (merging t-digest, Dunning & Ertl), holding weighted centroids.
+    The `k1` scale function keeps the centroids small close to the tails, where the relative
+    accuracy of the quantiles matters most, and the number of centroids is of the order of
+    `compression`. Values are added in batches, which are compressed together with the current
+    centroids; digests filled in parallel (for instance one per file) are merged with `add`.
+    The minimum and maximum are exact.
+    """
+    def __init__(self, compression=200):
+        self.compression = compression
+        self.means = np.zeros(0)
+        self.weights = np.zeros(0)
+        self.min, self.max = np.inf, -np.inf
+
+    def __len__(self):
+        return len(self.means)
+
+    def total(self):
+        return self.weights.sum()
+
+    def _compress(self, means, weights):
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+        if total == 0:
+            return
+        # centroid midpoints in the k scale; each centroid is merged with the ones in the same unit
+        qmid = (np.cumsum(weights) - weights/2) / total
+        k = self.compression / (2*np.pi) * np.arcsin(2*qmid - 1)
+        group = np.floor(k - k[0]).astype(np.int64)
+        group = np.unique(group, return_inverse=True)[1]
+        self.weights = np.bincount(group, weights=weights)
+        self.means = np.bincount(group, weights=weights*means) / self.weights
+
+    def update(self, values, weights=None):
+        """Adds a batch of values, NaNs excluded."""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        weights = np.ones_like(values) if weights is None else np.asarray(weights, dtype=np.float64).ravel()
+        finite = np.isfinite(values)
+        values, weights = values[finite], weights[finite]
+        if len(values) == 0:
+            return
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self._compress(np.concatenate((self.means, values)), np.concatenate((self.weights, weights)))
+
+    def add(self, other):
+        """Merges another digest."""
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress(np.concatenate((self.means, other.means)),
+                       np.concatenate((self.weights, other.weights)))
+
+    def quantile(self, q):
+        """
+        Quantiles of the values, interpolated between the centroids,
+        the first and last quantiles being the minimum and the maximum.
+        """
+        if len(self.means) == 0:
+            raise ValueError('The quantiles of an empty digest are not defined.')
+        total = self.total()
+        cum = np.concatenate(([0.], np.cumsum(self.weights) - self.weights/2, [total]))
+        vals = np.concatenate(([self.min], self.means, [self.max]))
+        return np.interp(np.asarray(q, dtype=np.float64) * total, cum, vals)
@@ -36,7 +36,7 @@ def closure(args)                    :
             'binedges_fname'         : args.binedges_filename,
             'data_name'              : args.data_name,
             'mc_name'                : args.mc_name,
-            'eff_prefix'             : args.eff_prefix }
+            'configuration'          : args.configuration }
     script = 'run_closure.py'
     comm = utils.build_script_command(name=script, sep=' ', **pars)
     if args.debug:
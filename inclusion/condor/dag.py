@@ -37,7 +37,7 @@ class WriteDAGManager:
                     'CountsData', 'CountsMC',
                     'HaddHistoData', 'HaddHistoMC',
                     'HaddCountsData', 'HaddCountsMC',
-                    'EffSF', 'EffSFAgg', 'Discr',
+                    'EffSF', 'EffSFAgg', 'EffSFPlots', 'Discr',
                     'Union', 'Closure'}
         for k in jobs:
             assert k in job_keys
@@ -132,19 +132,17 @@ class WriteDAGManager:
             self.write_parent_child_hierarchy(parents=p, childs=c)
             self.new_line()
 
-            # hadd aggregation for Data
-            p = [self.jobs['HaddHistoData'][0]]
-            c = [self.jobs['HaddHistoData'][1]]
-            self.write_parent_child_hierarchy(parents=p, childs=c)
-
-            # hadd aggregation for MC
-            p = [self.jobs['HaddHistoMC'][0]]
-            c = [self.jobs['HaddHistoMC'][1]]
-            self.write_parent_child_hierarchy(parents=p, childs=c)
+            # hadd aggregation for Data and MC
+            # absent when a single job merges the samples and aggregates them
+            for k in ('HaddHistoData', 'HaddHistoMC'):
+                if len(self.jobs[k]) > 1:
+                    p = [self.jobs[k][0]]
+                    c = [self.jobs[k][1]]
+                    self.write_parent_child_hierarchy(parents=p, childs=c)
             self.new_line()
 
             # efficiencies/scale factors draw and saving
-            p = [self.jobs['HaddHistoData'][1], self.jobs['HaddHistoMC'][1]]
+            p = [self.jobs['HaddHistoData'][-1], self.jobs['HaddHistoMC'][-1]]
             c = self.jobs['EffSF']
             self.write_parent_child_hierarchy(parents=p, childs=c)
 
@@ -152,6 +150,12 @@ class WriteDAGManager:
             p = self.jobs['EffSF']
             c = self.jobs['EffSFAgg']
             self.write_parent_child_hierarchy(parents=p, childs=c)
+
+            # efficiencies/scale factors plots (optional, no job waits for them)
+            if 'EffSFPlots' in self.jobs:
+                p = self.jobs['EffSF']
+                c = self.jobs['EffSFPlots']
+                self.write_parent_child_hierarchy(parents=p, childs=c)
         
         if self.branch == 'extra':
             self.new_line()
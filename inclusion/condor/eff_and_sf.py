@@ -7,8 +7,6 @@ import sys
 parent_dir = os.path.abspath(__file__ + 3 * '/..')
 sys.path.insert(0, parent_dir)
 
-import importlib
-
 import inclusion
 from inclusion.config import main
 from inclusion.utils import utils
@@ -35,14 +33,13 @@ def eff_and_sf(args):
             'outdir'        : args.outdir,
             'mc_name'       : args.mc_name,
             'data_name'     : args.data_name,
-            'triggercomb'   : '${1}',
-            'channels'      : ' '.join(args.channels),
+            'channel'       : '${1}',
             'variables'     : ' '.join(args.variables),
             'configuration' : args.configuration,
             'subtag'        : args.subtag,
             'tprefix'       : args.tprefix,
             'year'          : args.year,
-            'canvas_prefix' : args.canvas_prefix}
+            'nworkers'      : args.ncores}
 
     script = 'run_eff_and_sf.py'
     comm = utils.build_script_command(name=script, sep=' ', **pars)
@@ -62,20 +59,12 @@ def eff_and_sf(args):
                     outfile=outs_check,
                     logfile=outs_log,
                     queue=main.queue,
-                    machine=main.machine)
+                    machine=main.machine,
+                    ncores=args.ncores)
 
-    cfg = importlib.import_module(args.configuration)
     qlines = []
     for chn in args.channels:
-        if chn == args.channels[0]:
-            triggercomb = utils.generate_trigger_combinations(chn, cfg.triggers,
-                                                              cfg.exclusive)
-        else:
-            triggercomb += utils.generate_trigger_combinations(chn, cfg.triggers,
-                                                               cfg.exclusive)
-            
-    for tcomb in set(triggercomb):
-        qlines.append('  {}'.format( utils.join_name_trigger_intersection(tcomb)) )
+        qlines.append('  {}'.format(chn))
 
-    jw.write_queue( qvars=('triggercomb',),
+    jw.write_queue( qvars=('channel',),
                     qlines=qlines )
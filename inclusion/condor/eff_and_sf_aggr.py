@@ -28,7 +28,8 @@ def eff_and_sf_aggr(args):
             'outdir'      : args.outdir,
             'channel'     : '${1}',
             'file_prefix' : args.file_prefix,
-            'variables'   : ' '.join(args.variables,),
+            'data_name'   : args.data_name,
+            'mc_name'     : args.mc_name,
             'subtag'      : args.subtag}
 
     script = 'aggr_eff_and_sf.py'
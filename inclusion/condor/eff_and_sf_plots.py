@@ -0,0 +1,62 @@
+# coding: utf-8
+
+_all_ = [ 'eff_and_sf_plots', 'eff_and_sf_plots_outputs' ]
+
+import os
+import sys
+parent_dir = os.path.abspath(__file__ + 3 * '/..')
+sys.path.insert(0, parent_dir)
+
+import inclusion
+from inclusion.config import main
+from inclusion.utils import utils
+from inclusion.condor.job_writer import JobWriter
+
+@utils.set_pure_input_namespace
+def eff_and_sf_plots_outputs(args):
+    job_f, subm_f, check_f, log_f = JobWriter.define_output( localdir=args.localdir,
+                                                             data_folders='EffAndSFPlots',
+                                                             tag=args.tag )
+    return job_f[0], subm_f[0], check_f[0], log_f[0]
+
+@utils.set_pure_input_namespace
+def eff_and_sf_plots(args):
+    """One job per channel, drawing the stored efficiencies and scale factors with `ncores` processes."""
+    outs_job, outs_submit, outs_check, outs_log = eff_and_sf_plots_outputs(args)
+
+    #### Write shell executable (python scripts must be wrapped in shell files to run on HTCondor)
+    pars = {'indir'         : args.outdir,
+            'outdir'        : args.outdir,
+            'mc_name'       : args.mc_name,
+            'data_name'     : args.data_name,
+            'channels'      : '${1}',
+            'subtag'        : args.subtag,
+            'year'          : args.year,
+            'extensions'    : ' '.join(args.extensions),
+            'nworkers'      : args.ncores}
+
+    script = 'draw_eff_and_sf.py'
+    comm = utils.build_script_command(name=script, sep=' ', **pars)
+    if args.debug:
+        comm += '--debug '
+
+    jw = JobWriter()
+    jw.write_shell(filename=outs_job, command=comm, localdir=args.localdir, machine=main.machine)
+    jw.add_string('echo "{} done."'.format(script))
+
+    #### Write submission file
+    jw.write_condor(filename=outs_submit,
+                    real_exec=utils.build_script_path(script),
+                    shell_exec=outs_job,
+                    outfile=outs_check,
+                    logfile=outs_log,
+                    queue=main.queue,
+                    machine=main.machine,
+                    ncores=args.ncores)
+
+    qlines = []
+    for chn in args.channels:
+        qlines.append('  {}'.format(chn))
+
+    jw.write_queue( qvars=('channel',),
+                    qlines=qlines )
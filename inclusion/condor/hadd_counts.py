@@ -21,14 +21,14 @@ def run_hadd_counts_outputs(args):
     _tbase1, _tbase2 = utils.hadd_subpaths(args)
     tbase = _tbase1 + _tbase2
     for chn in args.channels:
-        t = os.path.join( args.indir, tbase + '_' + chn + '.csv' )
+        t = os.path.join( args.indir, tbase + '_' + chn + '.npy' )
         targets.append( t )
 
     # add individual sample merges
     for smpl in args.samples:
         tbase = _tbase1 + '_' + smpl + _tbase2
         for chn in args.channels:
-            t = os.path.join( args.indir, tbase + '_' + chn + '.csv' )
+            t = os.path.join( args.indir, tbase + '_' + chn + '.npy' )
             targets.append( t )
     return targets
 
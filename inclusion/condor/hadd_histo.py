@@ -11,6 +11,7 @@ import inclusion
 from inclusion.config import main
 from inclusion.utils import utils
 from inclusion.condor.job_writer import JobWriter
+from inclusion.utils.utils import build_script_command as bsc
 
 @utils.set_pure_input_namespace
 def run_hadd_histo_outputs(args):
@@ -35,10 +36,13 @@ def hadd_histo_outputs(args):
     """
     Outputs are guaranteed to have the same length.
     Returns all separate paths to avoid code duplication.
+    With a single merging step the aggregation has no job of its own.
     """
+    folders = ['HaddHisto' + args.dataset_name]
+    if not args.single_step:
+        folders.append('HaddHistoAgg' + args.dataset_name)
     ret = JobWriter.define_output( localdir=args.localdir,
-                                   data_folders=['HaddHisto' + args.dataset_name,
-                                                 'HaddHistoAgg' + args.dataset_name],
+                                   data_folders=folders,
                                    tag=args.tag )
     return ret
 
@@ -46,15 +50,34 @@ def hadd_histo_outputs(args):
 @utils.set_pure_input_namespace
 def hadd_histo(args):
     """Adds ROOT histograms"""
-    script = os.path.basename(__file__)
     targets = run_hadd_histo_outputs(args)
     outs_job, outs_submit, outs_check, outs_log = hadd_histo_outputs(args)
-    jw = JobWriter()
-    comm = 'hadd -f ${1} ${@:2}'
+    sample_inputs = [os.path.join(args.indir, smpl, args.tprefix + '*' + args.subtag + '.root')
+                     for smpl in args.samples]
+
+    if args.merger == 'uproot':
+        script = 'merge_histos.py'
+        real_exec = utils.build_script_path(script)
+        comm = bsc(name=script, sep=' ', nworkers=args.ncores)
+        if args.single_step:
+            # a single job per dataset: the patterns are quoted to be expanded by the merger
+            comm += '--outfile {} --sample_outfiles {} --inputs {}'.format(
+                targets[0], ' '.join(targets[1:]), ' '.join("'" + x + "'" for x in sample_inputs))
+        else:
+            comm += '--outfile ${1} --inputs ${@:2}'
+    else:
+        if args.single_step:
+            raise ValueError('A single merging step is only supported by the uproot merger.')
+        script = os.path.basename(__file__)
+        real_exec = '/dev/null'
+        comm = 'hadd -f ${1} ${@:2}'
 
+    jw = JobWriter()
     for out in outs_job:
         jw.write_shell(filename=out, command=comm, localdir=args.localdir, machine=main.machine)
-        if out == outs_job[0]:
+        if args.single_step:
+            jw.add_string('echo "{} with and without aggregation (dataset {}) done."'.format(script, args.dataset_name))
+        elif out == outs_job[0]:
             jw.add_string('echo "{} without aggregation (dataset {}) done."'.format(script, args.dataset_name))
         elif out == outs_job[1]:
             jw.add_string('echo "{} with aggregation (dataset {}) done."'.format(script, args.dataset_name))
@@ -63,17 +86,21 @@ def hadd_histo(args):
     inputs_join = []
     for out1,out2,out3,out4 in zip(outs_job,outs_submit,outs_check,outs_log):
         jw.write_condor(filename=out2,
-                        real_exec='/dev/null',
+                        real_exec=real_exec,
                         shell_exec=out1,
                         outfile=out3,
                         logfile=out4,
                         queue=main.queue,
-                        machine=main.machine)
+                        machine=main.machine,
+                        ncores=args.ncores if args.merger == 'uproot' else 1)
+
+        if args.single_step:
+            jw.write_queue()
+            continue
 
         qlines = []
         if out1 == outs_job[0]:
-            for t,smpl in zip(targets[1:], args.samples):
-                inputs = os.path.join(args.indir, smpl, args.tprefix + '*' + args.subtag + '.root')
+            for t,inputs in zip(targets[1:], sample_inputs):
                 inputs_join.append(t)
                 # join subdatasets (different MC or Data subfolders, ex: TT_fullyHad, TT_semiLep, ...)
                 qlines.append('  {}, {}'.format(t, inputs))
@@ -0,0 +1,206 @@
+# coding: utf-8
+
+_all_ = [ 'LocalDAGExecutor' ]
+
+import os
+import sys
+parent_dir = os.path.abspath(__file__ + 3 * '/..')
+sys.path.insert(0, parent_dir)
+
+import re
+import glob
+import time
+import shlex
+import argparse
+import subprocess
+from concurrent import futures
+
+class LocalDAGExecutor:
+    """
+    Runs a DAG written by `dag.WriteDAGManager` on the local machine, replacing `condor_submit_dag`.
+    Each node is a condor submission file whose `queue ... from` items run as separate
+    processes, at most `nworkers` at a time. A node starts once all its parents succeeded.
+    The outputs of each item go to the 'output' and 'error' files of the submission file.
+    When a node fails its descendants are skipped, and a rescue file listing the
+    completed nodes is written next to the DAG (`<dag>.rescue001`, ...). As with DAGMan,
+    the latest rescue file is used by the next execution, unless `force` is set.
+    """
+    def __init__(self, dagfile, nworkers=None):
+        self.dagfile = dagfile
+        self.nworkers = nworkers if nworkers else os.cpu_count()
+        self.logfile = dagfile + '.local.log'
+        self.nodes, self.parents = self.parse_dag(dagfile)
+
+    @staticmethod
+    def parse_dag(dagfile):
+        """Returns the submission file of each node, and the parents of each node."""
+        nodes, parents = {}, {}
+        with open(dagfile, 'r') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) == 0:
+                    continue
+                if fields[0] == 'JOB':
+                    nodes[fields[1]] = fields[2]
+                    parents[fields[1]] = set()
+                elif fields[0] == 'PARENT':
+                    ichild = fields.index('CHILD')
+                    for child in fields[ichild+1:]:
+                        parents[child].update(fields[1:ichild])
+        return nodes, parents
+
+    @staticmethod
+    def parse_submission(subfile):
+        """
+        Reads the commands of a submission file written by `JobWriter`.
+        Returns a dict with the submission commands (lower case), plus the
+        queue variables ('qvars') and their values ('qlines').
+        """
+        sub = {'qvars': (), 'qlines': []}
+        with open(subfile, 'r') as f:
+            lines = iter(f.readlines())
+        for line in lines:
+            line = line.strip()
+            if line.lower().startswith('queue'):
+                match = re.match(r'queue\s+(.+?)\s+from\s+\(', line, re.IGNORECASE)
+                if match is None:
+                    sub['qlines'].append('')
+                    continue
+                sub['qvars'] = tuple(x.strip() for x in match.group(1).split(','))
+                for qline in lines:
+                    if qline.strip() == ')':
+                        break
+                    sub['qlines'].append(qline.strip())
+            elif '=' in line:
+                key, val = line.split('=', 1)
+                sub[key.strip().lower()] = val.strip()
+        return sub
+
+    @staticmethod
+    def split_queue_line(line, nvars):
+        """Splits on commas and spaces: the last variable takes the rest of the line."""
+        if nvars == 0:
+            return []
+        return re.split(r'[\s,]+', line, maxsplit=nvars-1)
+
+    def node_commands(self, name, cluster):
+        """Command, output and error files of each item of a node."""
+        sub = self.parse_submission(self.nodes[name])
+        cmds = []
+        for process, qline in enumerate(sub['qlines']):
+            macros = dict(zip(sub['qvars'], self.split_queue_line(qline, len(sub['qvars']))))
+            macros.update({'Cluster': str(cluster), 'Process': str(process)})
+            expand = lambda s: re.sub(r'\$\((\w+)\)', lambda m: macros.get(m.group(1), ''), s)
+
+            arguments = expand(sub.get('arguments', '').strip('"'))
+            outfile = expand(sub.get('output', os.devnull))
+            errfile = expand(sub.get('error', os.devnull))
+            cmds.append(([sub['executable']] + shlex.split(arguments), outfile, errfile))
+        return cmds
+
+    @staticmethod
+    def run_command(cmd, outfile, errfile):
+        with open(outfile, 'w') as out, open(errfile, 'w') as err:
+            return subprocess.run(cmd, stdout=out, stderr=err).returncode
+
+    def rescue_files(self):
+        return sorted(glob.glob(self.dagfile + '.rescue[0-9][0-9][0-9]'))
+
+    def read_rescue(self):
+        done = set()
+        rescues = self.rescue_files()
+        if rescues:
+            with open(rescues[-1], 'r') as f:
+                done = {line.split()[1] for line in f if line.startswith('DONE')}
+            self.log('Using rescue file {} ({} nodes done).'.format(rescues[-1], len(done)))
+        return done
+
+    def write_rescue(self, done):
+        rescue = '{}.rescue{:03d}'.format(self.dagfile, len(self.rescue_files()) + 1)
+        with open(rescue, 'w') as f:
+            for name in self.nodes:
+                if name in done:
+                    f.write('DONE {}\n'.format(name))
+        return rescue
+
+    def log(self, mes):
+        mes = '[{}] {}'.format(time.strftime('%Y-%m-%d %H:%M:%S'), mes)
+        print(mes, flush=True)
+        with open(self.logfile, 'a') as f:
+            f.write(mes + '\n')
+
+    def run(self, force=False):
+        """Runs all nodes. Returns whether all of them succeeded."""
+        if force:
+            for rescue in self.rescue_files():
+                os.remove(rescue)
+        done = self.read_rescue()
+        pending = [x for x in self.nodes if x not in done]
+        failed, skipped = (set() for _ in range(2))
+        running, status = {}, {}
+
+        with futures.ThreadPoolExecutor(max_workers=self.nworkers) as pool:
+            while True:
+                started = False
+                for name in list(pending):
+                    if self.parents[name] & (failed | skipped):
+                        pending.remove(name)
+                        skipped.add(name)
+                        self.log('Node {} skipped: a parent failed.'.format(name))
+                    elif self.parents[name] <= done:
+                        pending.remove(name)
+                        started = True
+                        cmds = self.node_commands(name, cluster=list(self.nodes).index(name))
+                        status[name] = []
+                        if len(cmds) == 0: # nothing to run, its children can start
+                            done.add(name)
+                            self.log('Node {} done (no processes).'.format(name))
+                            continue
+                        self.log('Node {} started ({} processes).'.format(name, len(cmds)))
+                        for cmd in cmds:
+                            running[pool.submit(self.run_command, *cmd)] = name
+
+                if not running:
+                    if started: # nodes without processes may have released their children
+                        continue
+                    break
+                finished, _ = futures.wait(running, return_when=futures.FIRST_COMPLETED)
+                for fut in finished:
+                    name = running.pop(fut)
+                    status[name].append(fut.result())
+                    if name in running.values():
+                        continue
+                    if all(x == 0 for x in status[name]):
+                        done.add(name)
+                        self.log('Node {} done.'.format(name))
+                    else:
+                        failed.add(name)
+                        nfail = sum(x != 0 for x in status[name])
+                        self.log('Node {} failed ({} of {} processes).'.format(name, nfail, len(status[name])))
+
+        # nodes never started, for instance with a parent missing from the DAG
+        for name in pending:
+            self.log('Node {} never started: its parents did not complete.'.format(name))
+        skipped.update(pending)
+
+        if failed or skipped:
+            rescue = self.write_rescue(done)
+            self.log('{} nodes failed and {} were skipped. Rescue file: {}'.format(len(failed), len(skipped), rescue))
+            return False
+        self.log('All {} nodes done.'.format(len(self.nodes)))
+        return True
+
+# -- Parse options
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a DAG locally instead of with HTCondor.')
+
+    parser.add_argument('--dag', required=True, help='DAG file written by the workflow.')
+    parser.add_argument('--workers', default=None, type=int,
+                        help='Maximum number of processes running at the same time.')
+    parser.add_argument('--force', action='store_true',
+                        help='Ignore existing rescue files and run all nodes.')
+    args = parser.parse_args()
+
+    executor = LocalDAGExecutor(args.dag, nworkers=args.workers)
+    if not executor.run(force=args.force):
+        sys.exit(1)
@@ -8,6 +8,7 @@ parent_dir = os.path.abspath(__file__ + 3 * '/..')
 sys.path.insert(0, parent_dir)
 
 import inclusion
+from inclusion import counts
 from inclusion.config import main
 from inclusion.utils import utils
 from inclusion.condor.job_writer import JobWriter
@@ -82,18 +83,37 @@ def processing(args):
 
     for i, (kproc, vproc) in enumerate(_all_processes):
         filelist, _ = utils.get_root_inputs(vproc, args.indir)
-        
+
+        # the MC normalization is computed once, before the jobs are submitted
+        sumw_index = utils.sum_weights_index_path(args.outdir, vproc)
+        if vproc not in args.data_vals:
+            utils.build_sum_weights_index(vproc, args.indir, sumw_index)
+
+        # one job per work unit: small files are grouped and large ones split
+        units_index = utils.work_units_path(args.outdir, vproc)
+        units = utils.build_work_units(filelist, units_index, args.unit_size)
+
+        # the aggregation of the counts reads the list of expected files instead of walking the folder
+        if args.mode == 'counts':
+            counts.write_manifest(counts.manifest_path(args.outdir, vproc),
+                                  [counts.table_path(args.outdir, args.tprefix, vproc, unit, args.subtag)
+                                   for unit in units])
+
         #### Write shell executable (python scripts must be wrapped in shell files to run on HTCondor)
         pars = {'outdir'        : args.outdir,
                 'dataset'       : kproc,
                 'sample'        : vproc,
                 'isdata'        : int(vproc in args.data_vals),
-                'file'          : '${1}',
+                'unit'          : '${1}',
+                'units_index'   : units_index,
+                'ncores'        : args.ncores,
                 'subtag'        : args.subtag,
                 'channels'      : ' '.join(args.channels),
                 'tprefix'       : args.tprefix,
                 'year'          : args.year,
-                'configuration' : args.configuration}
+                'configuration' : args.configuration,
+                'engine'        : args.engine,
+                'sumw_index'    : sumw_index}
         script = ('produce_trig_histos.py' if args.mode == 'histos'
                   else 'produce_trig_counts.py')
         comm = utils.build_script_command(name=script, sep=' ', **pars)
@@ -116,13 +136,14 @@ def processing(args):
                         outfile=outs_check[i],
                         logfile=outs_log[i],
                         queue=main.queue,
-                        machine=main.machine)
+                        machine=main.machine,
+                        ncores=args.ncores)
         
         qlines = []
-        for listname in filelist:
-            qlines.append(' {}'.format( listname.replace('\n','') ))
+        for unit in units:
+            qlines.append(' {}'.format(unit))
         
-        jw.write_queue( qvars=('filename',),
+        jw.write_queue( qvars=('unit',),
                         qlines=qlines )
 
 # -- Parse options
@@ -155,6 +176,12 @@ if __name__ == '__main__':
                         help='Dummy string associated to trigger histograms were no cuts are applied.')
     parser.add_argument('--configuration', required=True,
                         help='Name of the configuration module to use.')
+    parser.add_argument('--engine', default='root', choices=('root', 'columnar'),
+                        help='Event processing engine.')
+    parser.add_argument('--ncores', default=1, type=int,
+                        help='Number of cores requested by each job.')
+    parser.add_argument('--unit_size', default=0, type=int,
+                        help='Target size in MB of the inputs of each job. 0 means one job per file.')
     args = parser.parse_args()
 
     submitTriggerEff( args )
@@ -48,7 +48,9 @@ def union_calculator(args):
                 'data_name'              : args.data_name,
                 'mc_name'                : args.mc_name,
                 'binedges_fname'         : args.binedges_filename,
-                'configuration'          : args.configuration}
+                'year'                   : args.year,
+                'configuration'          : args.configuration,
+                'ratio_range'            : ' '.join(str(x) for x in args.ratio_range)}
 
         script = 'run_union_calculator.py'
         comm = utils.build_script_command(name=script, sep=' ', **pars)
@@ -98,6 +98,23 @@ trig_map = {'2018':
             }
 trig_map['2016APV'] = trig_map['2016']
 
+# Run-dependent triggers, as (first run, last run, path) with the path defined in `trig_map`
+# The path is used for data runs in [first run, last run), `None` meaning there is no bound
+# MC always uses the last path
+trig_run_ranges = {'2018':
+                   {'IsoDoubleTauCustom': ((None, 317509, 'IsoDoubleTau'),
+                                           (317509, None, 'IsoDoubleTauHPS')),
+                    'IsoMuIsoTauCustom':  ((None, 317509, 'IsoMuIsoTau'),
+                                           (317509, None, 'IsoMuIsoTauHPS')),
+                    'EleIsoTauCustom':    ((None, 317509, 'EleIsoTau'),
+                                           (317509, None, 'EleIsoTauHPS')),
+                    'VBFTauCustom':       ((None, 317509, 'VBFTau'),
+                                           (317509, None, 'VBFTauHPS'))},
+                   '2017': {},
+                   '2016': {},
+                   }
+trig_run_ranges['2016APV'] = trig_run_ranges['2016']
+
 lep_triggers = {'2018':
                 {'Ele32', 'EleIsoTauCustom', 'IsoMu24', 'IsoMuIsoTauCustom', 'IsoDoubleTauCustom'},
                 '2017':
@@ -12,8 +12,8 @@ from inclusion.utils import utils
 bjets_cut = True
 mass_cut = None #standard, inverted
 category = 'baseline'
-custom_cut = ('(self.entries.dau2_pt < 40 and self.entries.dau1_pt < 190) or ' +
-              '(self.entries.dau1_pt < 40 and self.entries.dau2_pt < 190)')
+custom_cut = ('(dau2_pt < 40 and dau1_pt < 190) or ' +
+              '(dau1_pt < 40 and dau2_pt < 190)')
 
 triggers = ('METNoMu120', 'IsoMu24')
 trig_custom = set()
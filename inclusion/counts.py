@@ -0,0 +1,75 @@
+# coding: utf-8
+
+_all_ = [ 'make_table', 'concatenate', 'group_sum', 'table_path', 'write_table', 'read_table',
+          'manifest_path', 'write_manifest', 'read_manifest' ]
+
+import os
+import json
+import numpy as np
+from numpy.lib import recfunctions
+
+keys = ('channel', 'tcomb', 'reference')
+columns = (('c_ref', np.int64), ('c_inters', np.int64),
+           ('w_ref', np.float64), ('w_inters', np.float64),
+           ('w2_ref', np.float64), ('w2_inters', np.float64))
+
+def make_table(channel, tcomb, reference, **values):
+    """
+    Trigger counts as a NumPy structured array, with one row per channel,
+    trigger intersection and reference trigger. The columns not provided are zero.
+    """
+    strs = [np.asarray(x, dtype=str) for x in (channel, tcomb, reference)]
+    dtype = [(k, s.dtype) for k,s in zip(keys, strs)] + list(columns)
+    table = np.zeros(len(strs[0]), dtype=dtype)
+    for k, s in zip(keys, strs):
+        table[k] = s
+    for name, _ in columns:
+        table[name] = values.get(name, 0)
+    return table
+
+def concatenate(tables):
+    """Concatenates tables whose string columns may have different widths."""
+    dtype = [(k, 'U{}'.format(max(1, max(t.dtype[k].itemsize // 4 for t in tables))))
+             for k in keys]
+    dtype += list(columns)
+    return np.concatenate([t.astype(dtype) for t in tables])
+
+def group_sum(table, by=keys):
+    """Sums the counts of the rows sharing the same values of the `by` columns (sorted)."""
+    groups = recfunctions.repack_fields(table[list(by)])
+    unique, inverse = np.unique(groups, return_inverse=True)
+    out = np.zeros(len(unique), dtype=unique.dtype.descr + list(columns))
+    for k in by:
+        out[k] = unique[k]
+    for name, dtype in columns:
+        sums = np.bincount(inverse.ravel(), weights=table[name], minlength=len(unique))
+        out[name] = sums.astype(dtype)
+    return out
+
+def table_path(outdir, tprefix, sample, file_id, subtag):
+    """Counts produced by one processing job."""
+    return os.path.join(outdir, sample, tprefix + sample + '_' + file_id + subtag + '.npy')
+
+def write_table(fname, table):
+    np.save(fname, table, allow_pickle=False)
+
+def read_table(fname):
+    return np.load(fname, allow_pickle=False)
+
+def manifest_path(outdir, sample):
+    return os.path.join(outdir, sample, 'counts_manifest.json')
+
+def write_manifest(fname, files):
+    """Lists the counts files a sample is expected to produce, so that no directory walk is needed."""
+    os.makedirs(os.path.dirname(fname), exist_ok=True)
+    with open(fname, 'w') as f:
+        json.dump({'files': list(files)}, f, indent=1)
+
+def read_manifest(fname):
+    with open(fname, 'r') as f:
+        files = json.load(f)['files']
+    missing = [x for x in files if not os.path.exists(x)]
+    if missing:
+        mes = '{} of the {} counts files listed in {} are missing, for instance {}.'
+        raise FileNotFoundError(mes.format(len(missing), len(files), fname, missing[0]))
+    return files
@@ -0,0 +1,119 @@
+# coding: utf-8
+
+_all_ = [ 'Cut', 'parse_cut' ]
+
+import ast
+import copy
+import functools
+import numpy as np
+
+class _Validator(ast.NodeVisitor):
+    """Restricts expressions to comparisons and arithmetic on branches."""
+    allowed = ( ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not,
+                ast.USub, ast.UAdd, ast.Compare, ast.Lt, ast.LtE, ast.Gt, ast.GtE,
+                ast.Eq, ast.NotEq, ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div,
+                ast.Name, ast.Load, ast.Constant, ast.Call )
+
+    def __init__(self, expr):
+        self.expr = expr
+
+    def generic_visit(self, node):
+        if not isinstance(node, self.allowed):
+            mes = "Element '{}' is not supported in cut '{}'.".format(type(node).__name__, self.expr)
+            if isinstance(node, ast.Attribute):
+                mes += ' Use branch names directly (`dau1_pt`, not `self.entries.dau1_pt`).'
+            raise ValueError(mes)
+        if isinstance(node, ast.Call):
+            if not (isinstance(node.func, ast.Name) and node.func.id == 'abs'
+                    and len(node.args) == 1 and not node.keywords):
+                raise ValueError("Only 'abs(x)' calls are supported in cut '{}'.".format(self.expr))
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float)):
+            raise ValueError("Constant '{}' is not supported in cut '{}'.".format(node.value, self.expr))
+        super().generic_visit(node)
+
+class _Branches(ast.NodeTransformer):
+    """Replaces branch names by `e['name']`."""
+    def visit_Call(self, node):
+        node.args = [self.visit(x) for x in node.args]
+        return node
+
+    def visit_Name(self, node):
+        return ast.Subscript(value=ast.Name(id='e', ctx=ast.Load()),
+                             slice=ast.Constant(value=node.id), ctx=ast.Load())
+
+class _Masks(_Branches):
+    """Rewrites the logical operators as element-wise operations on arrays."""
+    @staticmethod
+    def _call(name, *args):
+        return ast.Call(func=ast.Name(id=name, ctx=ast.Load()), args=list(args), keywords=[])
+
+    def visit_BoolOp(self, node):
+        op = ast.BitAnd() if isinstance(node.op, ast.And) else ast.BitOr()
+        values = [self._call('_bool', self.visit(x)) for x in node.values]
+        return functools.reduce(lambda x,y: ast.BinOp(left=x, op=op, right=y), values)
+
+    def visit_UnaryOp(self, node):
+        if isinstance(node.op, ast.Not):
+            return self._call('_not', self.visit(node.operand))
+        return self.generic_visit(node)
+
+    def visit_Compare(self, node):
+        # chained comparisons: a < b < c -> (a < b) & (b < c)
+        left = self.visit(node.left)
+        comparators = [self.visit(x) for x in node.comparators]
+        terms = []
+        for op, right in zip(node.ops, comparators):
+            terms.append(ast.Compare(left=left, ops=[op], comparators=[right]))
+            left = right
+        return functools.reduce(lambda x,y: ast.BinOp(left=x, op=ast.BitAnd(), right=y), terms)
+
+class Cut:
+    """
+    Selection cut written as an expression on the branches of 'HTauTauTree'.
+    Example: '(dau2_pt < 40 and dau1_pt < 190) or (dau1_pt < 40 and dau2_pt < 190)'
+    Supports comparisons, `and`, `or`, `not`, parentheses, `+ - * /` and `abs()`.
+    The expression is parsed once and compiled twice: calling the object evaluates
+    a single event, while `mask` evaluates dictionaries of arrays.
+    """
+    def __init__(self, expr):
+        self.expr = expr
+        tree = ast.parse(expr.strip(), mode='eval')
+        _Validator(expr).visit(tree)
+
+        self.branches = tuple(sorted({ x.id for x in ast.walk(tree) if isinstance(x, ast.Name)
+                                       and not self._is_function(tree, x) }))
+
+        scalar = ast.fix_missing_locations(_Branches().visit(copy.deepcopy(tree)))
+        self._scalar = compile(scalar, '<cut>', 'eval')
+        array = ast.fix_missing_locations(_Masks().visit(copy.deepcopy(tree)))
+        self._array = compile(array, '<cut>', 'eval')
+
+    @staticmethod
+    def _is_function(tree, name):
+        return any(isinstance(x, ast.Call) and x.func is name for x in ast.walk(tree))
+
+    def __call__(self, entries):
+        return bool(eval(self._scalar, {'__builtins__': {}, 'abs': abs}, {'e': entries}))
+
+    def __repr__(self):
+        return "Cut('{}')".format(self.expr)
+
+    def mask(self, entries):
+        nevents = len(entries[self.branches[0]]) if self.branches else 1
+        res = eval(self._array, {'__builtins__': {}, 'abs': np.abs, '_not': np.logical_not,
+                                 '_bool': lambda x: np.asarray(x, dtype=bool)},
+                   {'e': entries})
+        return np.broadcast_to(np.asarray(res, dtype=bool), (nevents,))
+
+@functools.lru_cache(maxsize=None)
+def _parse_cut(expr):
+    return Cut(expr)
+
+def parse_cut(cut):
+    """
+    Parses a cut expression, only once per expression.
+    `None` (no cut) and already parsed cuts are returned unchanged.
+    """
+    if cut is None or isinstance(cut, Cut):
+        return cut
+    return _parse_cut(cut)
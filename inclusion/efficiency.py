@@ -0,0 +1,51 @@
+# coding: utf-8
+
+_all_ = [ 'clopper_pearson', 'clopper_pearson_weighted', 'efficiency_strings' ]
+
+import numpy as np
+from scipy.stats import beta
+
+one_sigma = 0.682689492137 # default confidence level of ROOT.TEfficiency
+
+def clopper_pearson(npass, ntot, cl=one_sigma):
+    """
+    Efficiencies and their central Clopper-Pearson intervals, for arrays of counts.
+    Returns the efficiencies and the lower and upper errors, with the conventions of
+    `ROOT.TEfficiency`: an empty total has zero efficiency and an upper error of one.
+    The counts do not need to be integers (see `clopper_pearson_weighted`).
+    """
+    npass, ntot = np.broadcast_arrays(np.asarray(npass, dtype=np.float64),
+                                      np.asarray(ntot, dtype=np.float64))
+    if (npass < 0).any() or (npass > ntot).any():
+        raise ValueError('The passed counts must lie between zero and the total counts.')
+    alpha = (1. - cl) / 2.
+    nonzero = ntot > 0
+
+    eff = np.zeros_like(ntot)
+    eff[nonzero] = npass[nonzero] / ntot[nonzero]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        low = np.where(npass > 0, beta.ppf(alpha, npass, ntot - npass + 1), 0.)
+        up = np.where(npass < ntot, beta.ppf(1. - alpha, npass + 1, ntot - npass), 1.)
+    return eff, eff - low, up - eff
+
+def clopper_pearson_weighted(wpass, wtot, w2tot, cl=one_sigma):
+    """
+    Clopper-Pearson intervals for weighted events, using effective counts.
+    The total is replaced by its effective number of entries, (sum w)^2 / sum w^2,
+    and the passed weights are scaled by the same factor, sum w / sum w^2.
+    The efficiencies are the ratios of the weights.
+    Negative sums of weights, possible with negative weights, are clipped.
+    """
+    wpass, wtot, w2tot = np.broadcast_arrays(*[np.asarray(x, dtype=np.float64)
+                                               for x in (wpass, wtot, w2tot)])
+    factor = np.zeros_like(wtot)
+    valid = (wtot > 0) & (w2tot > 0)
+    factor[valid] = wtot[valid] / w2tot[valid]
+    ntot = np.clip(wtot, 0., None) * factor
+    npass = np.clip(wpass * factor, 0., ntot)
+    return clopper_pearson(npass, ntot, cl=cl)
+
+def efficiency_strings(eff, low, up, ndigits=3):
+    """Formats efficiencies with their errors, as displayed in the tables of counts."""
+    return ['{} +{} -{}'.format(*[str(round(float(x), ndigits)) for x in (e, u, l)])
+            for e,l,u in zip(eff, low, up)]
@@ -0,0 +1,194 @@
+# coding: utf-8
+
+_all_ = [ 'HistogramFamily', 'HistogramRegistry', 'read_histograms', 'remove_negative_bins' ]
+
+import numpy as np
+
+class HistogramFamily:
+    """
+    Histograms sharing the same binning, stored as contiguous arrays.
+    `sumw` and `sumw2` have shape (nhistograms, nbinsx+2[, nbinsy+2]), including
+    the under- and overflow bins with the conventions of ROOT's `TAxis::FindBin`.
+    Each histogram (a row) is identified by a key, and written with its own name.
+    """
+    def __init__(self, edges, keys, names):
+        self.edges = tuple(np.asarray(e, dtype=np.float64) for e in edges)
+        self.keys = tuple(keys)
+        self.names = tuple(names)
+        self.index = {k: i for i,k in enumerate(self.keys)}
+        if len(self.index) != len(self.keys):
+            raise ValueError('Histogram keys must be unique.')
+
+        shape = (len(self.keys),) + tuple(len(e)+1 for e in self.edges)
+        self.sumw = np.zeros(shape, dtype=np.float64)
+        self.sumw2 = np.zeros(shape, dtype=np.float64)
+        self.entries = np.zeros(len(self.keys), dtype=np.int64)
+
+    def find_bins(self, *values):
+        """Bins of the values along each axis. 0 is the underflow and nbins+1 the overflow."""
+        return tuple(np.searchsorted(e, v, side='right') for e,v in zip(self.edges, values))
+
+    def fill(self, rows, weights, *values):
+        """
+        Fills the histograms in `rows` with one weight and one value per axis.
+        All arguments are broadcast together: a single event can fill several rows.
+        """
+        rows, weights, *bins = np.broadcast_arrays(rows, weights, *self.find_bins(*values))
+        index = (rows,) + tuple(bins)
+        np.add.at(self.sumw, index, weights)
+        np.add.at(self.sumw2, index, np.square(weights))
+        np.add.at(self.entries, rows, 1)
+
+    def add(self, other):
+        """Adds the contents of a family with the same histograms, filled separately."""
+        if self.keys != other.keys or any(len(x) != len(y) or (x != y).any()
+                                          for x,y in zip(self.edges, other.edges)):
+            raise ValueError('Only families with the same histograms and binning can be added.')
+        self.sumw += other.sumw
+        self.sumw2 += other.sumw2
+        self.entries += other.entries
+
+    def scale(self, factor):
+        """Scales all histograms, or each one with an array of factors."""
+        factor = np.reshape(factor, np.shape(factor) + (1,) * (self.sumw.ndim - np.ndim(factor)))
+        self.sumw *= factor
+        self.sumw2 *= np.square(factor)
+
+    def integral(self):
+        """Sum of the contents of each histogram, excluding under- and overflow."""
+        inner = (slice(None),) + (slice(1,-1),) * len(self.edges)
+        return self.sumw[inner].reshape(len(self.keys), -1).sum(axis=1)
+
+    def to_root(self, key):
+        """Converts one histogram to a `ROOT.TH1D` or `ROOT.TH2D`."""
+        import ROOT # only required when writing
+        row = self.index[key]
+        if len(self.edges) == 1:
+            hist = ROOT.TH1D(self.names[row], '', len(self.edges[0])-1, self.edges[0])
+        else:
+            hist = ROOT.TH2D(self.names[row], '', len(self.edges[0])-1, self.edges[0],
+                             len(self.edges[1])-1, self.edges[1])
+        hist.Sumw2()
+        # ROOT orders the global bins with the x axis running fastest
+        ncells = self.sumw[row].size
+        hist.SetContent(np.ascontiguousarray(self.sumw[row].ravel(order='F')))
+        hist.GetSumw2().Set(ncells, np.ascontiguousarray(self.sumw2[row].ravel(order='F')))
+        hist.ResetStats()
+        hist.SetEntries(float(self.entries[row]))
+        return hist
+
+    def to_uproot(self, key):
+        """
+        Converts one histogram to an object `uproot` can write, without ROOT.
+        The statistics are computed from the bin centers, as done by `TH1::ResetStats`.
+        """
+        from uproot.writing import identify # only required when writing
+        row = self.index[key]
+        inner = tuple(slice(1,-1) for _ in self.edges)
+        sumw, sumw2 = self.sumw[row][inner], self.sumw2[row][inner]
+        centers = np.meshgrid(*[(e[1:] + e[:-1]) / 2 for e in self.edges], indexing='ij')
+
+        axes = [identify.to_TAxis(n, '', len(e)-1, e[0], e[-1], fXbins=e)
+                for n,e in zip(('xaxis', 'yaxis'), self.edges)]
+        axes += [identify.to_TAxis(n, '', 1, 0., 1.) for n in ('yaxis', 'zaxis')[len(self.edges)-1:]]
+        stats = [(sumw * centers[0]).sum(), (sumw * centers[0]**2).sum()]
+        if len(self.edges) == 2:
+            stats += [(sumw * centers[1]).sum(), (sumw * centers[1]**2).sum(),
+                      (sumw * centers[0] * centers[1]).sum()]
+
+        args = (self.names[row], '', self.sumw[row].ravel(order='F'), float(self.entries[row]),
+                sumw.sum(), sumw2.sum(), *stats, self.sumw2[row].ravel(order='F'))
+        if len(self.edges) == 1:
+            return identify.to_TH1x(*args, *axes)
+        return identify.to_TH2x(*args, *axes)
+
+class HistogramRegistry:
+    """
+    Collection of histogram families, to replace one ROOT object per histogram.
+    The histograms are filled and post-processed as arrays, and converted
+    to ROOT objects only when written.
+    """
+    def __init__(self):
+        self.families = {}
+
+    def __getitem__(self, name):
+        return self.families[name]
+
+    def __contains__(self, name):
+        return name in self.families
+
+    def book(self, name, edges, keys, names):
+        self.families[name] = HistogramFamily(edges, keys, names)
+        return self.families[name]
+
+    def merge(self, other):
+        """Adds the histograms of another registry, for instance filled by another process."""
+        if self.families.keys() != other.families.keys():
+            raise ValueError('Only registries with the same histogram families can be merged.')
+        for name, family in self.families.items():
+            family.add(other.families[name])
+
+    def scale(self, factor):
+        for family in self.families.values():
+            family.scale(factor)
+
+    def write(self):
+        """Writes all histograms in the current ROOT directory."""
+        for family in self.families.values():
+            for key in family.keys:
+                family.to_root(key).Write()
+
+    def write_uproot(self, fout):
+        """Writes all histograms in a file opened with `uproot.recreate`."""
+        for family in self.families.values():
+            for key in family.keys:
+                fout[family.names[family.index[key]]] = family.to_uproot(key)
+
+def read_histograms(filename):
+    """
+    Reads all 1D and 2D histograms of a ROOT file with `uproot`.
+    Each histogram is stored in its own family, keyed by its name.
+    """
+    import uproot
+    hists = HistogramRegistry()
+    with uproot.open(filename) as f:
+        for name, classname in f.classnames(recursive=False, cycle=False).items():
+            if not classname.startswith(('TH1', 'TH2')):
+                continue
+            h = f[name]
+            family = hists.book(name, [ax.edges() for ax in h.axes], keys=(name,), names=(name,))
+            family.sumw[0] = h.values(flow=True)
+            family.sumw2[0] = h.variances(flow=True)
+            family.entries[0] = h.member('fEntries')
+    return hists
+
+def remove_negative_bins(ref, trg, parents):
+    """
+    Sets negative bins of 1D reference and trigger histograms to zero, preserving their integrals.
+    Checks the reference counts are never smaller than the ones after applying some cut.
+    `parents` holds the row of the reference histogram for each trigger histogram.
+    Only the underflow and regular bins are considered, as done previously bin by bin.
+    """
+    parents = np.asarray(parents, dtype=np.int64)
+    # reference histograms without any trigger histogram are left untouched
+    has_trg = np.isin(np.arange(len(ref.keys)), parents)
+
+    factors = []
+    for hists, rows in ((ref, has_trg), (trg, np.ones(len(trg.keys), dtype=bool))):
+        old = hists.integral()
+        neg = (hists.sumw[:, :-1] < 0.) & rows[:, None]
+        hists.sumw[:, :-1][neg] = 0.
+        factor = np.ones(len(hists.keys))
+        negrows = neg.any(axis=1)
+        factor[negrows] = old[negrows] / hists.integral()[negrows]
+        factors.append(factor)
+
+    bad = ref.sumw[parents, :-1] < trg.sumw[:, :-1]
+    if bad.any():
+        row, ibin = np.argwhere(bad)[0]
+        print('Denominator: {} | Numerator: {}'.format(ref.sumw[parents[row], ibin], trg.sumw[row, ibin]))
+        print('NegRef? {} | NegTrg? {}'.format(factors[0][parents[row]] != 1., factors[1][row] != 1.))
+        raise AssertionError()
+
+    ref.scale(factors[0])
+    trg.scale(factors[1])
@@ -23,9 +23,11 @@ from condor import (
     discriminator,   
     eff_and_sf,
     eff_and_sf_aggr,
+    eff_and_sf_plots,
     hadd_counts,
     hadd_histo,
     job_writer,
+    local_executor,
     processing,
     union_calculator,
     )
@@ -79,6 +81,13 @@ parser.add_argument(
                   'should provide a perfect match between original and ',
                   'weighted MC), one must specify here the trigger to consider.'))
     )
+parser.add_argument(
+    '--closure_ratio_range',
+    nargs=2,
+    type=float,
+    default=(0., 2.),
+    help='Range of the probability ratios (data/MC) histogrammed for the closure. Ratios outside are clipped into the edge bins.'
+    )
 parser.add_argument(
     '--channels',
     nargs='+', #1 or more arguments
@@ -140,6 +149,62 @@ parser.add_argument(
     default='sel_default',
     help='Specifies a subtag, for instance an additional cut within the same tag. We force its first character to be an underscore.'
     )
+parser.add_argument(
+    '--engine',
+    type=str,
+    choices=['root', 'columnar'],
+    default='root',
+    help='Engine used to process the input events.\nroot: per-event PyROOT loop (default).\ncolumnar: chunked uproot/NumPy processing.'
+    )
+parser.add_argument(
+    '--backend',
+    type=str,
+    choices=['condor', 'local'],
+    default='condor',
+    help='Backend running the DAG.\ncondor: submitted with condor_submit_dag (default).\nlocal: run on this machine with a bounded process pool.'
+    )
+parser.add_argument(
+    '--force_dag',
+    action='store_true',
+    help='Local backend only: ignore the rescue files of a previous execution and run all DAG nodes.\nBy default the nodes completed in a failed execution are not run again.'
+    )
+parser.add_argument(
+    '--merger',
+    type=str,
+    choices=['hadd', 'uproot'],
+    default='hadd',
+    help='Tool merging the histograms.\nhadd: ROOT\'s hadd (default).\nuproot: parallel in-process merger.'
+    )
+parser.add_argument(
+    '--single_merge_step',
+    action='store_true',
+    help='Write the per-sample and aggregated histograms in a single pass (uproot merger only).'
+    )
+parser.add_argument(
+    '--no_plots',
+    action='store_true',
+    help='Do not draw the efficiencies and scale factors, which are still computed and stored.'
+    )
+parser.add_argument(
+    '--extensions',
+    nargs='+',
+    type=str,
+    choices=main.extensions,
+    default=main.extensions,
+    help='Formats of the efficiency and scale factor plots, for instance `png` for quick checks.'
+    )
+parser.add_argument(
+    '--ncores',
+    type=int,
+    default=1,
+    help='Number of cores requested by each histos/counts job, which splits its entries among as many processes.\nAlso used by the uproot merger and the binning definition.'
+    )
+parser.add_argument(
+    '--unit_size',
+    type=int,
+    default=0,
+    help='Target size in MB of the inputs processed by each histos/counts job.\nSmall files are grouped and large files split into entry ranges.\n0: one job per file (default).'
+    )
 parser.add_argument(
     '--debug_workflow',
     action='store_true',
@@ -185,6 +250,7 @@ bins_params = {'nbins'             : FLAGS.nbins,
                'tag'               : FLAGS.tag,
                'subtag'            : subtag,
                'configuration'     : sel_config,
+               'ncores'            : FLAGS.ncores,
                'debug'             : FLAGS.debug_workflow}
 
 #### condor/dag
@@ -208,13 +274,19 @@ histos_params = {'binedges_filename' : binedges_filename,
                  'subtag'            : subtag,
                  'intersection_str'  : main.inters_str,
                  'nocut_dummy_str'   : main.nocut_dummy,
-                 'configuration'     : sel_config}
+                 'configuration'     : sel_config,
+                 'engine'            : FLAGS.engine,
+                 'unit_size'         : FLAGS.unit_size,
+                 'ncores'            : FLAGS.ncores}
 
 #### scripts/hadd_histo
-haddhisto_params = {'indir'    : data_storage,
-                    'localdir' : main.base_folder[main.machine],
-                    'tag'      : FLAGS.tag,
-                    'subtag'   : subtag, }
+haddhisto_params = {'indir'       : data_storage,
+                    'localdir'    : main.base_folder[main.machine],
+                    'tag'         : FLAGS.tag,
+                    'subtag'      : subtag,
+                    'merger'      : FLAGS.merger,
+                    'single_step' : FLAGS.single_merge_step,
+                    'ncores'      : FLAGS.ncores, }
 
 #### scripts/add_counts
 haddcounts_params = {'indir'    : data_storage,
@@ -238,16 +310,30 @@ sf_params = {'data_name'            : data_name,
              'year'                 : FLAGS.year,
              'tag'                  : FLAGS.tag,
              'subtag'               : subtag,
-             'canvas_prefix'        : main.pref['canvas'],
              'intersection_str'     : main.inters_str,
              'nocut_dummy_str'      : main.nocut_dummy,
+             'ncores'               : FLAGS.ncores,
              'debug'                : FLAGS.debug_workflow,}
 
+#### scripts/draw_eff_and_sf
+sfplots_params = {'data_name'     : data_name,
+                  'mc_name'       : mc_name,
+                  'outdir'        : out_storage,
+                  'localdir'      : main.base_folder[main.machine],
+                  'channels'      : FLAGS.channels,
+                  'year'          : FLAGS.year,
+                  'tag'           : FLAGS.tag,
+                  'subtag'        : subtag,
+                  'extensions'    : FLAGS.extensions,
+                  'ncores'        : FLAGS.ncores,
+                  'debug'         : FLAGS.debug_workflow,}
+
 sfagg_params = {'indir'       : out_storage,
                 'outdir'      : out_storage,
                 'localdir'    : main.base_folder[main.machine],
                 'channels'    : FLAGS.channels,
-                'variables'   : FLAGS.variables_for_efficiencies,
+                'data_name'   : data_name,
+                'mc_name'     : mc_name,
                 'tag'         : FLAGS.tag,
                 'subtag'      : subtag,
                 'file_prefix' : main.pref['sf'],
@@ -281,7 +367,9 @@ calculator_params = {'binedges_filename'       : binedges_filename,
                      'variables'               : FLAGS.variables_for_efficiencies,
                      'tag'                     : FLAGS.tag,
                      'subtag'                  : subtag,
+                     'year'                    : FLAGS.year,
                      'configuration'           : sel_config,
+                     'ratio_range'             : FLAGS.closure_ratio_range,
                      'debug'                   : FLAGS.debug_workflow,}
 
 #### scripts/closure
@@ -293,7 +381,6 @@ closure_params = {'data_name'               : data_name,
                   'indir_json'              : data_storage,
                   'outdir'                  : out_storage,
                   'inprefix'                : main.pref['clos'],
-                  'eff_prefix'              : main.pref['sf'],
                   'mc_processes'            : mc_vals,
                   'out_weighted_prefix'     : main.pref['clos'],
                   'out_original_prefix'     : main.pref['histos'],
@@ -303,6 +390,7 @@ closure_params = {'data_name'               : data_name,
                   'variables'               : FLAGS.variables_for_efficiencies,
                   'tag'                     : FLAGS.tag,
                   'subtag'                  : subtag,
+                  'configuration'           : sel_config,
                   'debug'                   : FLAGS.debug_workflow }
 
 #### Helper functions
@@ -462,7 +550,7 @@ class EffAndSF(lutils.ForceRun):
  
 class EffAndSFAggr(lutils.ForceRun):
     """
-    Aggregate htcondor files for efficiencies and scale factors.
+    Write htcondor files exporting the efficiency and scale factor stores to one ROOT file per channel.
     Useful for transfering the intersection efficiencies to the KLUB framework.
     Not needed for the following steps.
     """
@@ -488,6 +576,32 @@ class EffAndSFAggr(lutils.ForceRun):
         eff_and_sf_aggr.eff_and_sf_aggr(self.params)
  
  
+class EffAndSFPlots(lutils.ForceRun):
+    """
+    Write htcondor files for the plots of efficiencies and scale factors.
+    No other step depends on the plots.
+    """
+    params = utils.dot_dict(sfplots_params)
+    
+    @lutils.WorkflowDebugger(flag=FLAGS.debug_workflow)
+    def output(self):
+        o1, o2, _, _ = eff_and_sf_plots.eff_and_sf_plots_outputs(self.params)
+ 
+        target_path = get_target_path(self.__class__.__name__,
+                                             targets_folder)
+        utils.remove( target_path )
+        with open( target_path, 'w' ) as f:
+            f.write( o1 + '\n' )
+            f.write( o2 + '\n' )
+ 
+        _c1 = lutils.convert_to_luigi_local_targets(o1)
+        _c2 = lutils.convert_to_luigi_local_targets(o2)
+        return _c1 + _c2
+ 
+    @lutils.WorkflowDebugger(flag=FLAGS.debug_workflow)
+    def run(self):
+        eff_and_sf_plots.eff_and_sf_plots(self.params)
+ 
 class Discriminator(lutils.ForceRun):
     """Write htcondor files for the variable discriminator."""
     params = utils.dot_dict(discriminator_params)
@@ -569,6 +683,7 @@ class Dag(lutils.ForceRun):
     p_hadd_counts = utils.dot_dict(haddhisto_params)
     p_eff_sf      = utils.dot_dict(sf_params)
     p_eff_sf_agg  = utils.dot_dict(sfagg_params)
+    p_eff_sf_plot = utils.dot_dict(sfplots_params)
     p_disc        = utils.dot_dict(discriminator_params)
     p_calc        = utils.dot_dict(calculator_params)
     p_closure     = utils.dot_dict(closure_params)
@@ -612,6 +727,7 @@ class Dag(lutils.ForceRun):
         
         subm_eff_sf = eff_and_sf.eff_and_sf_outputs(self.p_eff_sf)[1]
         subm_eff_sf_agg = eff_and_sf_aggr.eff_and_sf_aggr_outputs(self.p_eff_sf_agg)[1]
+        subm_eff_sf_plot = eff_and_sf_plots.eff_and_sf_plots_outputs(self.p_eff_sf_plot)[1]
         subm_disc = discriminator.discriminator_outputs(self.p_disc)[1]
         # subm_union = union_calculator.union_calculator_outputs(self.p_calc)[1]
         # subm_closure = closure.closure_outputs(self.p_closure)
@@ -629,6 +745,8 @@ class Dag(lutils.ForceRun):
                          'HaddHistoMC'  : subm_hadd_hmc,
                          'EffSF'        : [subm_eff_sf],
                          'EffSFAgg'     : [subm_eff_sf_agg]})
+            if not FLAGS.no_plots:
+                jobs['EffSFPlots'] = [subm_eff_sf_plot]
         if self.branch == 'extra':
             jobs.update({'Discr'  : subm_disc,
                          'Union'  : subm_union,
@@ -659,6 +777,18 @@ class SubmitDAG(lutils.ForceRun):
     @lutils.WorkflowDebugger(flag=FLAGS.debug_workflow)
     def run(self):
         outfile = self.input()[-1][0].path
+        if FLAGS.backend == 'local':
+            # as many processes as jobs with 'ncores' cores fit in the machine
+            nworkers = max(1, os.cpu_count() // FLAGS.ncores)
+            executor = local_executor.LocalDAGExecutor(outfile, nworkers=nworkers)
+            if not executor.run(force=FLAGS.force_dag):
+                mes = 'The local execution of {} failed. See {}.'.format(outfile, executor.logfile)
+                raise RuntimeError(mes)
+            # the target is only created once all nodes succeeded
+            with open(self.output().path, 'w') as f:
+                f.write(executor.logfile + '\n')
+            return
+
         com = 'condor_submit_dag -no_submit -f'
         com += ' -notification Always'
         com += ' -append "notify_user={}"'.format(main.email)
@@ -676,7 +806,10 @@ class SubmitDAG(lutils.ForceRun):
     @lutils.WorkflowDebugger(flag=FLAGS.debug_workflow)
     def output(self):
         # WriteDag dependency is the last one
-        target = self.input()[-1][0].path + '.condor.sub'
+        if FLAGS.backend == 'local':
+            target = self.input()[-1][0].path + '.local.done'
+        else:
+            target = self.input()[-1][0].path + '.condor.sub'
         return luigi.LocalTarget(target)
  
     @lutils.WorkflowDebugger(flag=FLAGS.debug_workflow)
@@ -689,6 +822,7 @@ class SubmitDAG(lutils.ForceRun):
                  HaddCounts(dataset_name=mc_name, samples=mc_vals ),
                  EffAndSF(),
                  EffAndSFAggr(),
+                 EffAndSFPlots(),
                  Discriminator(),
                  UnionCalculator(),
                  Closure(),
@@ -0,0 +1,167 @@
+# coding: utf-8
+
+_all_ = [ 'efficiencies', 'scale_factors', 'normalized', 'compute_eff_and_sf',
+          'store_path', 'write_results', 'read_results', 'write_index', 'EfficiencyStore' ]
+
+import os
+import h5py
+import numpy as np
+
+from inclusion import efficiency
+from inclusion.utils import utils
+
+def _inner(family):
+    """Contents of the regular bins of one-row histogram families."""
+    inner = (0,) + (slice(1,-1),) * len(family.edges)
+    return family.sumw[inner], family.sumw2[inner]
+
+def efficiencies(passed, total, w2total, cl=0.95):
+    """
+    Efficiencies per bin with asymmetric Clopper-Pearson errors, stacked as (value, low, up).
+    Weighted histograms use the effective number of entries of the total.
+    """
+    return np.stack(efficiency.clopper_pearson_weighted(passed, total, w2total, cl=cl))
+
+def scale_factors(eff_data, eff_mc):
+    """
+    Ratio of data and MC efficiencies, stacked as (value, low, up).
+    The absolute errors are added in quadrature. Bins without MC efficiency are set to zero.
+    """
+    sf = np.zeros_like(eff_data[0])
+    np.divide(eff_data[0], eff_mc[0], out=sf, where=eff_mc[0] != 0.)
+    low = np.where(sf != 0., np.hypot(eff_data[1], eff_mc[1]), 0.)
+    up = np.where(sf != 0., np.hypot(eff_data[2], eff_mc[2]), 0.)
+    return np.stack((sf, low, up))
+
+def normalized(sumw, sumw2):
+    """Distributions normalized to unit integral along the bins, with symmetric errors."""
+    axes = tuple(range(1, sumw.ndim))
+    integral = sumw.sum(axis=axes, keepdims=True)
+    integral = np.where(integral == 0., 1., integral)
+    err = np.sqrt(sumw2) / np.abs(integral)
+    return np.stack((sumw / integral, err, err))
+
+def compute_eff_and_sf(hdata, hmc, channel, vname, tcomb, cl=0.95):
+    """
+    Data and MC efficiencies and scale factors of all the cuts of a trigger combination,
+    computed in a single vectorized pass. 1D or 2D (`vname` with '_VERSUS_').
+    `hdata` and `hmc` are registries read with `histograms.read_histograms`.
+    Returns `None` when the trigger combination has no histograms, otherwise a dict with
+    the 'cuts', the bin 'edges', and the 'eff_data', 'eff_mc', 'sf', 'norm_data' and
+    'norm_mc' arrays, each with shape (3, ncuts, nbins[, nbinsy]) for (value, low, up).
+    """
+    dim = '2D' if len(utils.split_vnames(vname)) == 2 else '1D'
+    ref_name = utils.get_hnames('Ref' + dim)(channel, vname, tcomb)
+    prefix = utils.rewrite_cut_string(utils.get_hnames('Trig' + dim)(channel, vname, tcomb), '')
+
+    names = sorted(x for x in hmc.families if x.startswith(prefix))
+    extra = [x for x in hdata.families if x.startswith(prefix) and x not in hmc]
+    if extra:
+        raise ValueError('Histograms {} are present in data but not in MC.'.format(extra))
+    if len(names) == 0:
+        return None
+
+    res = {'cuts': [x[len(prefix):] for x in names], 'edges': hmc[ref_name].edges}
+    for label, hists in (('data', hdata), ('mc', hmc)):
+        shape = (len(names),) + tuple(len(e)-1 for e in res['edges'])
+        passed, passed2 = (np.zeros(shape) for _ in range(2))
+        for irow, name in enumerate(names):
+            if name in hists:
+                passed[irow], passed2[irow] = _inner(hists[name])
+        total, total2 = _inner(hists[ref_name]) if ref_name in hists else (np.zeros(shape[1:]),)*2
+
+        res['eff_' + label] = efficiencies(passed, total, total2, cl=cl)
+        res['norm_' + label] = normalized(passed, passed2)
+
+    res['sf'] = scale_factors(res['eff_data'], res['eff_mc'])
+    return res
+
+def store_path(outdir, data_name, mc_name, channel, subtag):
+    """Efficiencies and scale factors of one channel, for all variables, trigger combinations and cuts."""
+    return os.path.join(outdir, 'EffSF_' + data_name + '_' + mc_name + '_' + channel + subtag + '.hdf5')
+
+# sigmoid parameters, covariances and status per cut, see `turn_on.fit_turn_ons`
+fit_keys = ('fit_data', 'fit_mc', 'cov_data', 'cov_mc', 'status_data', 'status_mc', 'fit_range')
+
+def write_results(group, res):
+    """Writes the output of `compute_eff_and_sf` in an `h5py` group, with the sigmoid fits if present."""
+    group.create_dataset('cuts', data=np.array(res['cuts'], dtype='S'))
+    for iax, edges in enumerate(res['edges']):
+        group.create_dataset('edges_' + 'xy'[iax], data=edges)
+    for key in ('eff_data', 'eff_mc', 'sf', 'norm_data', 'norm_mc'):
+        group.create_dataset(key, data=res[key], compression='gzip')
+    for key in fit_keys:
+        if key in res:
+            group.create_dataset(key, data=res[key])
+
+def read_results(group):
+    """Reads a group written by `write_results`."""
+    res = {'cuts': [x.decode() for x in group['cuts'][:]],
+           'edges': tuple(group[x][:] for x in ('edges_x', 'edges_y') if x in group)}
+    for key in ('eff_data', 'eff_mc', 'sf', 'norm_data', 'norm_mc') + fit_keys:
+        if key in group:
+            res[key] = group[key][:]
+    return res
+
+def write_index(fout):
+    """
+    Writes the index of a store whose groups are '<variable>/<tcomb>':
+    one row per variable, trigger combination and cut, with the row of the cut in the arrays.
+    """
+    rows = []
+    for vname in fout:
+        if vname == 'index':
+            continue
+        for tcomb in fout[vname]:
+            for icut, cut in enumerate(fout[vname][tcomb]['cuts'][:]):
+                rows.append((vname, tcomb, cut.decode(), icut))
+    width = max([1] + [len(x) for row in rows for x in row[:3]])
+    index = np.array(rows, dtype=[('variable', 'S{}'.format(width)), ('tcomb', 'S{}'.format(width)),
+                                  ('cut', 'S{}'.format(width)), ('row', np.int64)])
+    fout.create_dataset('index', data=index)
+
+class EfficiencyStore:
+    """
+    Efficiencies and scale factors of one channel, written by `run_eff_and_sf.py`,
+    keyed by (variable, trigger combination, cut). The index is read once when opening the store,
+    so that each lookup only reads the required row of the arrays.
+    """
+    def __init__(self, filename):
+        self.file = h5py.File(filename, 'r')
+        self.index = {(v.decode(), t.decode(), c.decode()): r for v,t,c,r in self.file['index'][:]}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def keys(self):
+        return self.index.keys()
+
+    def close(self):
+        self.file.close()
+
+    def results(self, variable, tcomb):
+        """All the cuts of a variable and trigger combination, as returned by `compute_eff_and_sf`."""
+        return read_results(self.file[variable][tcomb])
+
+    def get(self, variable, tcomb, cut):
+        """
+        Edges and (value, low, up) arrays of a single cut.
+        The sigmoid parameters and their covariances are included when the efficiencies were fitted.
+        """
+        row = self.index[(variable, tcomb, cut)]
+        group = self.file[variable][tcomb]
+        res = {'edges': tuple(group[x][:] for x in ('edges_x', 'edges_y') if x in group)}
+        for key in ('eff_data', 'eff_mc', 'sf', 'norm_data', 'norm_mc'):
+            res[key] = group[key][:, row]
+        for key in fit_keys[:-1]:
+            if key in group:
+                res[key] = group[key][row]
+        if 'fit_range' in group:
+            res['fit_range'] = group['fit_range'][:]
+        return res
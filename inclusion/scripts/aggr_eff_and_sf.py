@@ -8,108 +8,68 @@ parent_dir = os.path.abspath(__file__ + 3 * '/..')
 sys.path.insert(0, parent_dir)
 
 import inclusion
+from inclusion import scale_factors
 from inclusion.utils import utils
 
-import re
 import argparse
-import ctypes
+import numpy as np
 
 import ROOT
 ROOT.gROOT.SetBatch(True)
-from ROOT import (
-    TFile,
-    TGraphAsymmErrors,
-    TH1D,
-    TH2D,
-    )
-from array import array
 
-def convert_graph_to_hist(graph):
+def to_hist(name, edges, arr):
     """
-    Converts 1D TGraphAsymmErrors to TH1D.
-    TODO: support 2D graphs [3D histograms hopefully not...]
-    The convertion is required due to ROOT's bad support of 2D objects:
-    - TGraph2DAsymmErrors must have the same number of points in X and Y!
-    - TGraph3DAsymmErrors does not exist
-    - Histograms are the most flexible, although do not support asym errors.
+    Converts (value, low, up) arrays to TH1D or TH2D, as expected by the KLUB framework.
+    Histograms do not support asymmetric errors: the sum of both is used, as done previously.
+    The asymmetric errors are kept in the efficiency store.
     """
-    n = graph.GetN()
-    name = graph.GetName()
-
-    # define x (bin centers)
-    x = array('d')
-    x.append((3.0 * graph.GetX()[0] - graph.GetX()[1]) / 2.0)
-    for i in range(1,n):
-        x.append((graph.GetX()[i-1] + graph.GetX()[i]) / 2.0)
-    x.append((3.0 * graph.GetX()[n-1] - graph.GetX()[n-2]) / 2.0)
-    histo = TH1D(name, name, n, x)
-
-    # fill y values (counts)
-    for i in range(n):
-        histo.SetBinContent(i+1, graph.GetY()[i])
-        # losing up/down asymmetric info...
-        toterr = graph.GetErrorYhigh(i)+graph.GetErrorYlow(i)
-        histo.SetBinError(i+1, toterr)
-
+    darr = lambda x : np.ascontiguousarray(x, dtype=np.double)
+    if len(edges) == 1:
+        histo = ROOT.TH1D(name, name, len(edges[0])-1, darr(edges[0]))
+    else:
+        histo = ROOT.TH2D(name, name, len(edges[0])-1, darr(edges[0]), len(edges[1])-1, darr(edges[1]))
+    for idx in np.ndindex(arr.shape[1:]):
+        ibin = histo.GetBin(*[i+1 for i in idx])
+        histo.SetBinContent(ibin, arr[(0,) + idx])
+        histo.SetBinError(ibin, arr[(1,) + idx] + arr[(2,) + idx])
     return histo
 
-def aggregate_eff_and_sf(indir, outdir, channel, subtag, prefix, variables, debug):
-    extension = 'root'
-    _outname = os.path.join(outdir, prefix + channel + '.' + extension)
-    fout = ROOT.TFile.Open(_outname , 'RECREATE')
-    
-    var_re = '_(.+)_TRG_' # ?: match but do not capture
-    trig_re = '(.+)_CUTS_'
-    cuts_re = '(.+)'
-    regex_str = ( '.*' + channel + var_re + trig_re +
-                   cuts_re + args.subtag + '\.' + extension )
-    regex = re.compile( regex_str )
-
-    walk_path = os.path.join(indir, channel)
-    for root, _, files in os.walk( walk_path ):
-        for afile in files:
-            if afile.endswith('.' + extension):
-                print(os.path.join(root,afile))
-                froot = ROOT.TFile.Open( os.path.join(root,afile), 'READ' )
-                keyList = ROOT.TIter(froot.GetListOfKeys())
-                fout.cd()
-                for key in keyList:
-                    h = key.ReadObj()
-                    if ( not h.InheritsFrom(TGraphAsymmErrors.Class()) and
-                         not h.InheritsFrom(TH2D.Class()) ):
-                        mess = '\n - Dir: {}\n'.format(root)
-                        mess += ' - File: {}\n'.format(afile)
-                        mess += ' - Key: {}\n'.format(key)
-                        raise ValueError(mess)
-
-                    if h.InheritsFrom(TGraphAsymmErrors.Class()):
-                        h = convert_graph_to_hist(h)
-
-                    try:
-                        var, trigger, cut = regex.match(afile).groups()
-                    except AttributeError as e:
-                        mess = '\nNo match! Regex: {}\n'.format(regex)
-                        mess += 'Channel: {}\n'.format(channel)
-                        mess += 'File: {}\n'.format(afile)
-                        mess += 'Dir: {}\n'.format(root)
-                        raise AttributeError(mess) from e
-                    new_name = h.GetName() + '_VAR_' + var + '_TRG_' + trigger + '_CUT_' + cut
-
-                    h.Write(new_name)
+def aggregate_eff_and_sf(indir, outdir, channel, subtag, prefix, data_name, mc_name, debug):
+    """
+    Exports the efficiencies and scale factors of a channel from its store to a single ROOT file.
+    Each object is named '<Data|MC|SF><1D|2D>_VAR_<variable>_TRG_<tcomb>_CUT_<cut>'.
+    """
+    store = scale_factors.store_path(indir, data_name, mc_name, channel, subtag)
+    _outname = os.path.join(outdir, prefix + channel + '.root')
+    fout = ROOT.TFile.Open(_outname, 'RECREATE')
+    fout.cd()
+
+    with scale_factors.EfficiencyStore(store) as effs:
+        for var, tcomb in dict.fromkeys((v,t) for v,t,_ in effs.keys()):
+            res = effs.results(var, tcomb)
+            dim = '{}D'.format(len(res['edges']))
+            for icut, cut in enumerate(res['cuts']):
+                cutstr = utils.rewrite_cut_string('', 'CUTS_' + cut, regex=True).replace('_CUTS_', '', 1)
+                for key, oname in (('eff_data', 'Data'), ('eff_mc', 'MC'), ('sf', 'SF')):
+                    new_name = oname + dim + '_VAR_' + var + '_TRG_' + tcomb + '_CUT_' + cutstr
+                    if debug:
+                        print(new_name)
+                    to_hist(new_name, res['edges'], res[key][:, icut]).Write(new_name)
+    fout.Close()
     print('File {} saved.'.format(_outname))
-            
-parser = argparse.ArgumentParser(description='Draw trigger scale factors')
+
+parser = argparse.ArgumentParser(description='Export trigger scale factors to a ROOT file')
 
 parser.add_argument('--indir', help='Inputs directory', required=True)
 parser.add_argument('--outdir', help='Output directory', required=True, )
 parser.add_argument('--channel', dest='channel', required=True, type=str,
                     help='Select the channels over which the workflow will be run.' )
 parser.add_argument('--file_prefix', help='ROOT file prefix', required=True)
-parser.add_argument('--variables', dest='variables', required=True, type=str, nargs='+',
-                    help='Select the variables over which the workflow will be run.' )
+parser.add_argument('--data_name', required=True, type=str, help='Id for all data samples')
+parser.add_argument('--mc_name', required=True, type=str, help='Id for all MC samples')
 parser.add_argument('--subtag', dest='subtag', required=True, help='subtag')
 parser.add_argument('--debug', action='store_true', help='debug verbosity')
 args = utils.parse_args(parser)
 
 aggregate_eff_and_sf(args.indir, args.outdir, args.channel, args.subtag,
-                     args.file_prefix, args.variables, args.debug)
+                     args.file_prefix, args.data_name, args.mc_name, args.debug)
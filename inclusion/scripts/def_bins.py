@@ -9,12 +9,14 @@ sys.path.insert(0, parent_dir)
 
 import glob
 import h5py
+import multiprocessing
 import uproot as up
 import numpy as np
 import argparse
 import importlib
 
 import inclusion
+from inclusion import accumulators
 from inclusion.utils import utils
 from inclusion.config import main
 
@@ -29,33 +31,35 @@ def define_binning_outputs(args):
     assert os.path.splitext(args.binedges_filename)[1] == '.hdf5'
     return os.path.join(args.outdir, args.binedges_filename)
 
-def set_min_max(acc, obj):
-    for k in acc:
-        if obj[k][0] < acc[k][0]:
-            acc[k][0] = obj[k][0]
-        if obj[k][1] > acc[k][1]:
-            acc[k][1] = obj[k][1]
-            
-def set_quantiles(acc, quant, ntotal, nbatch):
+def channel_selection(chn, pair_type):
+    if chn == 'all':
+        return pair_type < main.sel[chn]['pairType'][1]
+    return pair_type == main.sel[chn]['pairType'][1]
+
+def fill_digests(task):
     """
-    Accumulates the weighted average of quantiles.
-    - 'acc': accumulator
-    - 'quant': new quantile being averaged
+    Quantile sketches of the variables per channel for a single file,
+    restricted to the `ranges` of the variables binned with quantiles.
     """
-    for k in acc:
-        if acc[k] is None: # first iteration
-            acc[k] = quant[k]
-        else:
-            frac_old = (ntotal-nbatch) / ntotal
-            frac_new = nbatch / ntotal
-            acc[k] = acc[k]*frac_old + quant[k]*frac_new
-            
+    fname, channels, variables, ranges = task
+    digests = {(chn,v): accumulators.TDigest() for chn in channels for v in variables}
+    for batch in up.iterate(files=fname, expressions=variables + ('pairType',),
+                            step_size='500 MB', library='np'):
+        for chn in channels:
+            sel_chn = channel_selection(chn, batch['pairType'])
+            for v in variables:
+                vals = batch[v][sel_chn]
+                if (chn,v) in ranges:
+                    vals = vals[(vals > ranges[(chn,v)][0]) & (vals < ranges[(chn,v)][1])]
+                digests[(chn,v)].update(vals)
+    return digests
+
 @utils.set_pure_input_namespace
 def define_binning(args):
     """
-    Determine histogram quantiles
+    Determine histogram quantiles.
+    All files are read, each one filling its own quantile sketches, which are then merged.
     """
-    quant_down, quant_up = 0., 1.
     cfg = importlib.import_module(args.configuration)
     
     channel_to_dataset = {'etau'   : main.data[args.year]['EG'][0],
@@ -63,68 +67,50 @@ def define_binning(args):
                           'tautau' : main.data[args.year]['Tau'][0],
                           'mumu'   : main.data[args.year]['Mu'][0],
                           'ee'     : main.data[args.year]['EG'][0],}
-    
+
+    quantiles = np.linspace(0., 1., num=args.nbins+1)
+    quantiles[-1] = 0.99
     min_max, quants = {}, {}
-    for k in args.channels:
-        min_max[k], quants[k] = {}, {}
-        for v in args.variables:
-            min_max[k][v] = [1e10, -1e10]
-            quants[k][v] = None
         
     ###############################################
     ############## Data Loop: Start ###############
     ###############################################
     if not skip_data_loop(args, cfg):
+        # channels sharing a dataset are filled while reading its files once
+        samples = {}
+        for chn in args.channels:
+            samples.setdefault(channel_to_dataset[chn], []).append(chn)
 
+        ranges = {}
         for chn in args.channels:
-            sample = channel_to_dataset[chn]
-            
-            #### Parse input list
-            filelist, _ = utils.get_root_inputs(sample, args.indir, include_tree=True)
+            for v in args.variables:
+                if utils.key_exists(cfg.binedges, v, chn) and cfg.binedges[v][chn][0] == "quantiles":
+                    ranges[(chn,v)] = cfg.binedges[v][chn][1:3]
 
-            treesize = 0
-            percentage = 0.05
-
-            quantiles = np.linspace(0., 1., num=args.nbins+1)
-            quantiles[-1] = 0.99
-                
-            branches = args.variables + ('pairType',)
-            nfiles = len(filelist)
-            for ib,batch in enumerate(up.iterate(files=filelist, expressions=branches,
-                                                 step_size='500 MB', library='ak')):
-                treesize += len(batch)
-
-                # assume X% of the files are enough to estimate quantiles
-                if ib+1 > int(percentage*nfiles) and nfiles > 30:
-                    break
-
-                print('{}/{} {} files for channel {} (only {} will be processed)\r'
-                      .format(ib+1, nfiles, sample, chn, int(percentage*nfiles)),
-                      end='' if ib+1!=nfiles else '\n', flush=True)
-                
-                if chn == 'all':
-                    sel_chn = batch.pairType < main.sel[chn]['pairType'][1]
-                else:
-                    sel_chn = batch.pairType == main.sel[chn]['pairType'][1]
-
-                batch_chn, batch_sel = batch[sel_chn], {}
-                for v in args.variables:
-                    if utils.key_exists(cfg.binedges, v, chn) and cfg.binedges[v][chn][0] == "quantiles":
-                        batch_sel[v] = batch_chn[v][(batch_chn[v] > cfg.binedges[v][chn][1]) &
-                                                    (batch_chn[v] < cfg.binedges[v][chn][2])]
+        tasks = []
+        for sample, channels in samples.items():
+            filelist, _ = utils.get_root_inputs(sample, args.indir, include_tree=True)
+            tasks.extend((f, channels, tuple(args.variables), ranges) for f in filelist)
+
+        digests = {}
+        with multiprocessing.Pool(processes=max(1, args.ncores)) as pool:
+            for it, res in enumerate(pool.imap_unordered(fill_digests, tasks)):
+                print('{}/{} files processed\r'.format(it+1, len(tasks)),
+                      end='' if it+1!=len(tasks) else '\n', flush=True)
+                for k, dig in res.items():
+                    if k in digests:
+                        digests[k].add(dig)
                     else:
-                        batch_sel[v] = batch_chn[v]
-
-                if len(batch_sel) != 0:
-                    # trim outliers
-                    quant1 = {v:np.quantile(batch_sel[v], q=np.array(quantiles)) for v in args.variables}
-                    set_quantiles(quants[chn], quant1, ntotal=treesize, nbatch=len(batch))
-                    quant2 = {v:np.quantile(batch_sel[v], q=np.array([0., 0.99])) for v in args.variables}
-                    set_min_max(min_max[chn], quant2)
-                else:
-                    mes = ("Channel {} is not present in batch {} of sample {} in folders {}."
-                           .format(chn, ib, sample, args.indir))
-                    raise RuntimeError(mes)
+                        digests[k] = dig
+
+        for (chn,v), dig in digests.items():
+            if dig.total() == 0:
+                mes = ("Channel {} has no entries for variable {} in folders {}."
+                       .format(chn, v, args.indir))
+                raise RuntimeError(mes)
+            # trim outliers
+            quants.setdefault(chn, {})[v] = dig.quantile(quantiles)
+            min_max.setdefault(chn, {})[v] = dig.quantile([0., 0.99])
 
     ###############################################
     ############## Data Loop: End #################
@@ -179,7 +165,7 @@ if __name__ == '__main__':
 
     parser.add_argument('--binedges_filename', dest='binedges_filename',
                         required=True, help='in directory')
-    parser.add_argument('--nbins', dest='nbins', required=True, help='number of X bins')
+    parser.add_argument('--nbins', dest='nbins', required=True, type=int, help='number of X bins')
     parser.add_argument('-a', '--indir', dest='indir', required=True, help='in directory')
     parser.add_argument('-o', '--outdir', dest='outdir', required=True, help='out directory')
     parser.add_argument('-t', '--tag', dest='tag', required=True, help='tag')
@@ -194,6 +180,8 @@ if __name__ == '__main__':
                         help='Select the channels over which the workflow will be run.' )
     parser.add_argument('--configuration', dest='configuration', required=True,
                         help='Name of the configuration module to use.')
+    parser.add_argument('--ncores', type=int, default=1,
+                        help='Number of processes reading the input files.')
     parser.add_argument('--debug', action='store_true', help='debug verbosity')
     args = utils.parse_args(parser)
 
@@ -0,0 +1,304 @@
+# coding: utf-8
+
+_all_ = [ 'draw_eff_and_sf', 'canvas_name', 'plot_tasks' ]
+
+import os
+import sys
+parent_dir = os.path.abspath(__file__ + 3 * '/..')
+sys.path.insert(0, parent_dir)
+
+import argparse
+import multiprocessing
+from copy import copy
+import numpy as np
+import h5py
+
+import inclusion
+from inclusion import scale_factors, turn_on
+from inclusion.config import main
+from inclusion.utils import utils
+
+import ROOT
+ROOT.gROOT.SetBatch(True)
+
+lumi = {"2016APV": "19.5", "2016": "16.8", "2017": "41.5", "2018": "59.7"}
+
+def canvas_name(prefix, proc, chn, var, trig, data_name, cut, subtag):
+    """Name of the canvases of a single cut, as produced by the former plotting code."""
+    name = prefix + data_name + '_' + proc + '_' + chn + '_' + var + '_TRG_' + trig
+    return utils.rewrite_cut_string(name + main.placeholder_cuts + subtag, 'CUTS_' + cut, regex=True)
+
+def _graph(edges, arr):
+    """TGraphAsymmErrors from a (value, low, up) array."""
+    darr = lambda x : np.ascontiguousarray(x, dtype=np.double)
+    x = (edges[1:] + edges[:-1]) / 2
+    ex = (edges[1:] - edges[:-1]) / 2
+    return ROOT.TGraphAsymmErrors(len(x), darr(x), darr(arr[0]),
+                                  darr(ex), darr(ex), darr(arr[1]), darr(arr[2]))
+
+def _fit_curve(pars, frange, npoints=200):
+    """Stored turn-on fit drawn as a line in its fit range."""
+    x = np.linspace(frange[0], frange[1], npoints)
+    return ROOT.TGraph(npoints, x, np.ascontiguousarray(turn_on.sigmoid(x, pars)[0]))
+
+def _hist2d(name, edges, values):
+    darr = lambda x : np.ascontiguousarray(x, dtype=np.double)
+    h = ROOT.TH2D(name, name, len(edges[0])-1, darr(edges[0]), len(edges[1])-1, darr(edges[1]))
+    for ix in range(values.shape[0]):
+        for iy in range(values.shape[1]):
+            h.SetBinContent(ix+1, iy+1, values[ix,iy])
+    return h
+
+def _latex_channel(channel):
+    latex = copy(channel)
+    latex = latex.replace('mu','#mu')
+    latex = latex.replace('tau','#tau_{h}')
+    return latex.replace('Tau','#tau_{h}')
+
+def draw_1d(task):
+    """Draws the efficiencies (or normalized distributions) and scale factors of one cut."""
+    outputs = []
+    canvas_dims = 900, 600
+    standard_text_font = 42
+    transp = 0.5
+    for atype in ('eff', 'norm'):
+        dt = _graph(task['edges'][0], task[atype + '_data'])
+        mc = _graph(task['edges'][0], task[atype + '_mc'])
+        if atype == 'eff':
+            sf = _graph(task['edges'][0], task['sf'])
+        else: # ratio of the normalized distributions
+            sf = _graph(task['edges'][0], scale_factors.scale_factors(task['norm_data'], task['norm_mc']))
+
+        cname = atype + '_' + task['name']
+        canvas = ROOT.TCanvas(cname, 'canvas', *canvas_dims)
+        canvas.cd()
+        pad1 = ROOT.TPad('pad1', 'pad1', 0, 0.3, 1, 1)
+        pad1.SetBottomMargin(0.005)
+        pad1.SetLeftMargin(0.12)
+        pad1.Draw()
+        pad1.cd()
+
+        dt.GetYaxis().SetTitle('Efficiency' if atype=='eff' else 'Normalized counts')
+        for g, color, marker in ((dt, ROOT.kBlack, 20), (mc, ROOT.kRed, 22)):
+            g.SetLineWidth(2)
+            g.SetMarkerSize(1.3)
+            g.SetMarkerStyle(marker)
+            g.SetLineColorAlpha(color, transp)
+            g.SetMarkerColorAlpha(color, transp)
+        dt.GetYaxis().SetLabelSize(0.05)
+        dt.GetYaxis().SetTitleSize(0.05)
+        if atype == 'eff':
+            dt.GetYaxis().SetRangeUser(-0.05, 1.22)
+        else:
+            amax = max(task['norm_data'][0].max(), task['norm_mc'][0].max())
+            amin = min(task['norm_data'][0].min(), task['norm_mc'][0].min())
+            if amax == amin:
+                amax, amin = 1., 0.
+            dt.GetYaxis().SetRangeUser(amin-0.1*(amax-amin), amax+0.4*(amax-amin))
+        dt.Draw('AP')
+        mc.Draw('same P')
+        curves = []
+        if atype == 'eff' and 'fit_data' in task:
+            for key, color in (('data', ROOT.kBlack), ('mc', ROOT.kRed)):
+                if not np.isfinite(task['fit_' + key]).all(): # too few points to fit
+                    continue
+                curves.append(_fit_curve(task['fit_' + key], task['fit_range']))
+                curves[-1].SetLineColor(color)
+                curves[-1].SetLineStyle(2)
+                curves[-1].Draw('same L')
+        pad1.Update()
+
+        l = ROOT.TLine()
+        l.SetLineWidth(1)
+        l.SetLineStyle(7)
+        l.DrawLine(pad1.GetUxmin(), 1., pad1.GetUxmax(), 1.)
+
+        leg = ROOT.TLegend(0.71, 0.77, 0.89, 0.89)
+        leg.SetFillStyle(0)
+        leg.SetBorderSize(0)
+        leg.SetTextSize(0.04)
+        leg.SetTextFont(standard_text_font)
+        leg.AddEntry(dt, 'Data', 'p')
+        leg.AddEntry(mc, task['mc_name'].replace('MC_', '').replace('TT', 'TTbar').replace('_', '+'), 'p')
+        leg.Draw('same')
+
+        lX, lY, lXstep, lYstep = 0.15, 0.85, 0.02, 0.06
+        tex = ROOT.TLatex()
+        tex.SetNDC()
+        tex.SetTextFont(standard_text_font)
+        tex.SetTextSize(0.04)
+        tex.DrawLatex(lX, lY, 'Channel: ' + _latex_channel(task['channel']))
+        tex.DrawLatex(lX, lY-lYstep, utils.write_trigger_string(task['tcomb'], task['intersection_str'],
+                                                               items_per_line=2))
+        pad_top = pad1.GetTopMargin()
+        for text, font, size, xpos in (('CMS', 62, 0.75, lX-1.5*lXstep),
+                                       ('Preliminary', 52, 0.6, lX+2.5*lXstep),
+                                       (lumi[task['year']] + ' fb^{-1} (13 TeV)', standard_text_font, 0.6, lX+28*lXstep)):
+            tex.SetTextFont(font)
+            tex.SetTextSize(size*pad_top)
+            tex.DrawLatex(xpos, lY+1.3*lYstep, text)
+        utils.redraw_border()
+
+        canvas.cd()
+        pad2 = ROOT.TPad('pad2', 'pad2', 0., 0., 1., 0.3)
+        pad2.SetTopMargin(0.01)
+        pad2.SetBottomMargin(0.3)
+        pad2.SetLeftMargin(0.12)
+        pad2.Draw()
+        pad2.cd()
+        pad2.SetGridy()
+
+        sf.GetYaxis().SetRangeUser(.3, 1.10)
+        sf.SetLineWidth(2)
+        sf.SetLineColorAlpha(ROOT.kBlue, transp)
+        sf.SetMarkerColorAlpha(ROOT.kBlue, transp)
+        sf.SetMarkerSize(1.3)
+        sf.SetMarkerStyle(22)
+        sf.GetYaxis().SetLabelSize(0.1)
+        sf.GetXaxis().SetLabelSize(0.1)
+        sf.GetXaxis().SetTitleSize(0.1)
+        sf.GetYaxis().SetTitleSize(0.1)
+        sf.GetYaxis().SetTitleOffset(0.3)
+        sf.GetYaxis().SetTitle('Data/MC')
+        xlabel = utils.get_display_variable_name(task['channel'], task['vname'])
+        if 'met' in task['vname']:
+            xlabel += ' [GeV]'
+        sf.GetXaxis().SetTitle(xlabel)
+        sf.GetXaxis().SetTickLength(0.07)
+        sf.Draw('AP')
+        utils.redraw_border()
+
+        for ext in task['extensions']:
+            outputs.append(os.path.join(task['outdir'], cname + '.' + ext))
+            canvas.SaveAs(outputs[-1])
+    return outputs
+
+def draw_2d(task):
+    """Draws the data and MC efficiencies and the scale factors of one cut, with their errors as text."""
+    outputs = []
+    vnames = utils.split_vnames(task['vname'])
+    vname_x = utils.get_display_variable_name(task['channel'], vnames[0])
+    vname_y = utils.get_display_variable_name(task['channel'], vnames[1])
+    for prefix, key in (('EffData_', 'eff_data'), ('EffMC_', 'eff_mc'), ('SF_', 'sf')):
+        cname = prefix + task['name']
+        canvas = ROOT.TCanvas(cname, cname, 900, 600)
+        canvas.SetLeftMargin(0.08)
+        canvas.SetRightMargin(0.15)
+        canvas.cd()
+
+        hists = []
+        for ival, (offset, fmt) in enumerate(((0.22, '4.3f'), (0.10, '- 4.3f'), (0.323, '+ 4.3f'))):
+            values = task[key][ival]
+            if ival > 0: # zero bins are not drawn by the 'text' option
+                values = np.where((task[key][0] == 0.) | (values == 0.), 1.e-10, values)
+            h = _hist2d(cname + str(ival), task['edges'], values)
+            h = utils.apply_equal_bin_width(h, roundx=0 if 'pt' in vname_x else 2,
+                                            roundy=0 if 'pt' in vname_y else 2)
+            h.SetBarOffset(offset)
+            ROOT.gStyle.SetPaintTextFormat(fmt)
+            if ival == 0:
+                h.GetXaxis().SetTitle(vname_x)
+                h.GetYaxis().SetTitle(vname_y)
+                h.GetYaxis().SetTitleOffset(1.3)
+                for ax in (h.GetXaxis(), h.GetYaxis()):
+                    ax.SetTitleSize(0.03)
+                    ax.SetLabelSize(0.03)
+                h.SetMarkerSize(.8)
+                h.SetMarkerColor(ROOT.kOrange+10)
+                h.Draw('colz text')
+            else:
+                h.SetMarkerSize(.6)
+                h.SetMarkerColor(ROOT.kBlack)
+                h.Draw('same text')
+            hists.append(h)
+
+        tex = ROOT.TLatex()
+        tex.SetNDC()
+        tex.SetTextFont(72)
+        tex.SetTextSize(0.03)
+        tex.SetTextColor(2)
+        tex.DrawLatex(0.8, 0.92, prefix.replace('Eff', '').replace('_', ''))
+        tex.SetTextColor(1)
+        tex.DrawLatex(0.04, 0.96, utils.write_trigger_string(task['tcomb'], task['intersection_str'],
+                                                              items_per_line=2))
+        tex.DrawLatex(0.7, 0.96, 'Channel: ' + _latex_channel(task['channel']))
+        utils.redraw_border()
+
+        for ext in task['extensions']:
+            outputs.append(os.path.join(task['outdir'], cname + '.' + ext))
+            canvas.SaveAs(outputs[-1])
+    return outputs
+
+def draw(task):
+    ROOT.gStyle.SetOptStat(0)
+    ROOT.gStyle.SetOptTitle(0)
+    return draw_1d(task) if len(task['edges']) == 1 else draw_2d(task)
+
+def plot_tasks(args):
+    """
+    One task per channel, variable, trigger combination and cut, holding all the arrays to draw.
+    The stores are read sequentially, while the workers render the previous tasks.
+    """
+    for chn in args.channels:
+        store = scale_factors.store_path(args.indir, args.data_name, args.mc_name, chn, args.subtag)
+        with scale_factors.EfficiencyStore(store) as effs:
+            for vname, tcomb in dict.fromkeys((v,t) for v,t,_ in effs.keys()):
+                res = effs.results(vname, tcomb)
+                outdir = os.path.join(args.outdir, chn, vname, '')
+                utils.create_single_dir(outdir)
+                prefix = main.pref['canvas'] if len(res['edges']) == 1 else ''
+                for icut, cut in enumerate(res['cuts']):
+                    task = {'channel': chn, 'vname': vname, 'tcomb': tcomb, 'cut': cut,
+                            'edges': res['edges'], 'outdir': outdir,
+                            'name': canvas_name(prefix, args.mc_name, chn, vname, tcomb,
+                                                args.data_name, cut, args.subtag),
+                            'mc_name': args.mc_name, 'year': args.year,
+                            'intersection_str': args.intersection_str,
+                            'extensions': args.extensions}
+                    for key in ('eff_data', 'eff_mc', 'sf', 'norm_data', 'norm_mc'):
+                        task[key] = res[key][:, icut]
+                    if 'fit_data' in res:
+                        task.update(fit_data=res['fit_data'][icut], fit_mc=res['fit_mc'][icut],
+                                    fit_range=res['fit_range'])
+                    yield task
+
+@utils.set_pure_input_namespace
+def draw_eff_and_sf(args):
+    """
+    Renders the efficiencies and scale factors stored by `run_eff_and_sf.py`, in a pool of processes.
+    Only the requested formats are saved.
+    """
+    tasks = plot_tasks(args)
+    noutputs = 0
+    if args.nworkers > 1:
+        with multiprocessing.Pool(args.nworkers) as pool:
+            for outputs in pool.imap_unordered(draw, tasks, chunksize=8):
+                noutputs += len(outputs)
+    else:
+        for task in tasks:
+            noutputs += len(draw(task))
+    print('{} plots saved in {}.'.format(noutputs, args.outdir))
+
+# -- Parse options
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Draw trigger efficiencies and scale factors')
+
+    parser.add_argument('--indir', required=True, help='Directory of the stored efficiencies.')
+    parser.add_argument('--outdir', required=True, help='Output directory.')
+    parser.add_argument('--data_name', required=True, type=str, help='Id for all data samples')
+    parser.add_argument('--mc_name', required=True, type=str, help='Id for all MC samples')
+    parser.add_argument('--channels', required=True, nargs='+', type=str,
+                        help='Select the channels over which the workflow will be run.')
+    parser.add_argument('--subtag', required=True, help='subtag')
+    parser.add_argument('--year', default='2018', type=str,
+                        choices=('2016', '2016APV', '2017', '2018'), help='Period/era.')
+    parser.add_argument('--extensions', nargs='+', type=str, default=main.extensions,
+                        choices=main.extensions, help='Formats of the saved plots.')
+    parser.add_argument('--nworkers', type=int, default=1,
+                        help='Number of processes drawing the plots.')
+    parser.add_argument('--intersection_str', required=False, default=main.inters_str,
+                        help='String used to represent set intersection between triggers.')
+    parser.add_argument('--debug', action='store_true', help='debug verbosity')
+    args = utils.parse_args(parser)
+
+    draw_eff_and_sf(args)
@@ -0,0 +1,116 @@
+# coding: utf-8
+
+_all_ = [ 'merge_histos' ]
+
+import os
+import sys
+parent_dir = os.path.abspath(__file__ + 3 * '/..')
+sys.path.insert(0, parent_dir)
+
+import glob
+import argparse
+import multiprocessing
+
+import uproot as up
+
+import inclusion
+from inclusion import histograms
+from inclusion.utils import utils
+
+def add_histograms(hists, other):
+    """
+    Adds the histograms of `other` to `hists`, as done by `hadd`:
+    histograms missing in `hists` are copied.
+    """
+    if hists is None:
+        return other
+    for name, family in other.families.items():
+        if name in hists:
+            hists[name].add(family)
+        else:
+            hists.families[name] = family
+    return hists
+
+def merge_chunk(files):
+    """Merges files sequentially, keeping at most two of them in memory."""
+    hists = None
+    for f in files:
+        hists = add_histograms(hists, histograms.read_histograms(f))
+    return hists
+
+def merge_files(files, nworkers, pool=None):
+    """
+    Tree reduction: each worker merges an interleaved chunk of the files,
+    and the partial sums are added as soon as they become available.
+    The memory is bounded by one merged output per worker.
+    """
+    if pool is None or len(files) < 2:
+        return merge_chunk(files)
+    chunks = [files[i::nworkers] for i in range(min(nworkers, len(files)))]
+    hists = None
+    for part in pool.imap_unordered(merge_chunk, chunks):
+        hists = add_histograms(hists, part)
+    return hists
+
+def expand(patterns):
+    files = []
+    for p in patterns:
+        files.extend(sorted(glob.glob(p)) if glob.has_magic(p) else [p])
+    return files
+
+def write(hists, outfile):
+    with up.recreate(outfile) as fout:
+        hists.write_uproot(fout)
+    print('Saving file {}'.format(outfile))
+
+@utils.set_pure_input_namespace
+def merge_histos(args):
+    """
+    Replaces `hadd -f`: adds the histograms of the input files into `outfile`.
+    When `sample_outfiles` are given, each input pattern is first merged into
+    its own sample file, and `outfile` holds the sum of all samples, so that the
+    per-sample and aggregation steps are done in a single pass over the inputs.
+    """
+    if args.sample_outfiles and len(args.sample_outfiles) != len(args.inputs):
+        raise ValueError('One sample output is required for each input pattern.')
+
+    pool = multiprocessing.Pool(args.nworkers) if args.nworkers > 1 else None
+    try:
+        if args.sample_outfiles:
+            total = None
+            for outfile, pattern in zip(args.sample_outfiles, args.inputs):
+                files = expand([pattern])
+                if len(files) == 0:
+                    raise FileNotFoundError('No input files for pattern {}.'.format(pattern))
+                hists = merge_files(files, args.nworkers, pool)
+                write(hists, outfile)
+                # the sample histograms are not needed anymore after writing
+                total = add_histograms(total, hists)
+        else:
+            files = expand(args.inputs)
+            if len(files) == 0:
+                raise FileNotFoundError('No input files for {}.'.format(args.inputs))
+            total = merge_files(files, args.nworkers, pool)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    write(total, args.outfile)
+
+# -- Parse options
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Merge histograms with uproot.')
+
+    parser.add_argument('--outfile', dest='outfile', required=True,
+                        help='Output file with the sum of all inputs.')
+    parser.add_argument('--inputs', dest='inputs', required=True, nargs='+', type=str,
+                        help='Input files or (quoted) glob patterns.')
+    parser.add_argument('--sample_outfiles', dest='sample_outfiles', required=False, nargs='+',
+                        type=str, default=None,
+                        help='One output per input pattern, merged in the same pass.')
+    parser.add_argument('--nworkers', dest='nworkers', required=False, type=int, default=1,
+                        help='Number of processes reading and adding the input files.')
+    args = utils.parse_args(parser)
+
+    merge_histos(args)
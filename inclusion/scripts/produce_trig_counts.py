@@ -1,6 +1,6 @@
 # coding: utf-8
 
-_all_ = [ 'get_trig_counts' ]
+_all_ = [ 'count_events_columnar', 'count_events_root', 'get_trig_counts' ]
 
 import os
 import sys
@@ -9,40 +9,20 @@ sys.path.insert(0, parent_dir)
 import glob
     
 import inclusion
-from inclusion import selection
+from inclusion import counts, selection
 from inclusion.utils import utils
 from inclusion.utils.utils import join_name_trigger_intersection as joinNTC
 
 import functools
 import argparse
 import importlib
+import multiprocessing
+import numpy as np
+import uproot as up
 
 import ROOT
 
-def get_trig_counts(args):
-    # -- Check if outdir exists, if not create it
-    if not os.path.exists(args.outdir):
-        os.makedirs(args.outdir)
-    if not os.path.exists( os.path.join(args.outdir, args.sample) ):
-        os.makedirs( os.path.join(args.outdir, args.sample) )
-    outdir = os.path.join(args.outdir, args.sample)
-    
-    if not os.path.exists(args.filename):
-        mes = '[' + os.path.basename(__file__) + '] {} does not exist.'.format(args.filename)
-        raise ValueError(mes)
-
-    config_module = importlib.import_module(args.configuration)
-    
-    xsec_norm = utils.total_cross_section(args.filename, args.isdata)
-    
-    f_in = ROOT.TFile(args.filename)
-    t_in = f_in.Get('HTauTauTree')
-
-    triggercomb = {}
-    for chn in args.channels:
-        triggercomb[chn] = utils.generate_trigger_combinations(chn, config_module.triggers,
-                                                               config_module.exclusive)
-
+def define_counters(args, triggercomb):
     c_ref , c_inters  = ({} for _ in range(2))
     w_ref , w_inters  = ({} for _ in range(2))
     w2_ref, w2_inters = ({} for _ in range(2))
@@ -59,15 +39,28 @@ def get_trig_counts(args):
             w2_ref[chn][tstr] = 0.
             w2_inters[chn][tstr] = 0.
 
+    return c_ref, c_inters, w_ref, w_inters, w2_ref, w2_inters
+
+def count_events_root(args, t_in, config_module, plan, triggercomb,
+                      c_ref, c_inters, w_ref, w_inters, w2_ref, w2_inters,
+                      entry_start=None, entry_stop=None):
+    """
+    Increments the counters looping over the events one by one with PyROOT.
+    Only the entries in [entry_start, entry_stop) are processed.
+    """
     t_in.SetBranchStatus('*', 0)
     _entries = utils.define_used_tree_variables(config_module.custom_cut)
     for ientry in _entries:
         t_in.SetBranchStatus(ientry, 1)
 
     nentries = t_in.GetEntriesFast()
-    for ientry,entry in enumerate(t_in):
+    entry_start = 0 if entry_start is None else entry_start
+    entry_stop = nentries if entry_stop is None else entry_stop
+    for ientry in range(entry_start, entry_stop):
         if ientry%10000==0:
             print('{} / {}'.format(ientry, nentries))
+        t_in.GetEntry(ientry)
+        entry = t_in
 
         # this is slow: do it once only
         entries = utils.dot_dict({x: getattr(entry, x) for x in _entries})
@@ -101,7 +94,8 @@ def get_trig_counts(args):
             if abs(evt_weight) != 1.:
                 raise RuntimeError('The weight for data is {}!'.format(evt_weight))
 
-        sel = selection.EventSelection(entries, args.isdata, configuration=config_module)
+        sel = selection.EventSelection(entries, args.isdata, year=args.year,
+                                       configuration=config_module, plan=plan)
 
         if not sel.sel_category(config_module.category):
             continue
@@ -113,17 +107,13 @@ def get_trig_counts(args):
         for chn in args.channels:
             if utils.is_channel_consistent(chn, entries.pairType):
                     
-                for tcomb in triggercomb[chn]:                
+                for tcomb in plan.tcombs(chn):
                     pass_trigger_intersection = functools.reduce(
                         lambda x,y: x and y, #logic AND to join all triggers in this option
                         [ pass_trigger[x] for x in tcomb ]
                     )
 
-                    if not sel.check_inters_with_dataset(tcomb, chn, args.dataset):
-                        continue
-                    if not sel.dataset_cuts(tcomb, chn):
-                        continue
-                    if not sel.dataset_triggers(tcomb, chn, config_module.triggers, args.dataset)[0]:
+                    if not sel.reference_cuts(tcomb, chn):
                         continue
 
                     tstr = joinNTC(tcomb)
@@ -135,71 +125,206 @@ def get_trig_counts(args):
                         c_inters[chn][tstr] += 1
                         w_inters[chn][tstr] += evt_weight
                         w2_inters[chn][tstr] += evt_weight*evt_weight
-                                            
 
-    file_id = ''.join( c for c in args.filename[-10:] if c.isdigit() )
+def count_events_columnar(args, infile, config_module, plan, triggercomb,
+                          c_ref, c_inters, w_ref, w_inters, w2_ref, w2_inters,
+                          entry_start=None, entry_stop=None):
+    """
+    Increments the counters reading the required branches in chunks with uproot.
+    Each counter becomes a masked sum per channel and trigger combination.
+    Only the entries in [entry_start, entry_stop) are processed.
+    """
+    _entries = sorted(utils.define_used_tree_variables(config_module.custom_cut))
+    weight_names = ('MC_weight', 'PUReweight', 'L1pref_weight', 'trigSF',
+                    'IdSF_deep_2d', 'PUjetID_SF')
+
+    nentries = 0
+    t_in = up.open(infile + ':HTauTauTree')
+    for entries in t_in.iterate(_entries, step_size=args.step_size, library='np',
+                                entry_start=entry_start, entry_stop=entry_stop):
+        nentries += len(entries['triggerbit'])
+        print('{} entries read'.format(nentries))
+
+        weights = {}
+        for wname in weight_names + ('bTagweightReshape',):
+            w = entries[wname].astype(np.float64)
+            weights[wname] = np.where(np.isnan(w), 1., w)
+
+        evt_weight = functools.reduce(lambda x,y: x * y, [weights[x] for x in weight_names])
+        if args.isdata and np.any(evt_weight != 1.):
+            raise RuntimeError('The weight for data is {}!'.format(evt_weight[evt_weight != 1.][0]))
 
-    proc_folder = os.path.dirname(args.filename).split('/')[-1]
-    if not os.path.exists(outdir):
-        os.makedirs(outdir)
+        if config_module.category != "baseline" and config_module.category != "boosted":
+            # can be '-1' when no bjets are present
+            evt_weight *= weights['bTagweightReshape']
 
-    outName = os.path.join(outdir, args.tprefix + proc_folder + '_' + file_id + args.subtag + '.csv')
-    print('Saving file {} at {} '.format(file_id, outName) )
+        if args.isdata and np.any(np.abs(evt_weight) != 1.):
+            raise RuntimeError('The weight for data is {}!'.format(evt_weight[np.abs(evt_weight) != 1.][0]))
+
+        sel = selection.EventSelectionArray(entries, args.isdata, year=args.year,
+                                            configuration=config_module, plan=plan)
+        category = sel.sel_category(config_module.category)
 
-    sep = ','
-    with open(outName, 'w') as f:
         for chn in args.channels:
-            for tcomb in triggercomb[chn]:
-                try:
-                    reftrig = sel.dataset_triggers(tcomb, chn, config_module.triggers, args.dataset)[1]
-                except OverflowError:
+            chn_mask = category & sel.channel_mask(chn)
+            if not chn_mask.any():
+                continue
+
+            for tcomb in plan.tcombs(chn):
+                ref = chn_mask & sel.reference_cuts(tcomb, chn)
+                if not ref.any():
                     continue
-                
-                reftrig = joinNTC(reftrig)
-                
+
+                inters = ref & sel.trigger_intersection(tcomb)
+
                 tstr = joinNTC(tcomb)
-                basestr = sep.join((tstr, chn, reftrig))
-
-                if not args.isdata:
-                    norm_factor = utils.get_lumi(args.year) / utils.total_sum_weights(args.file, isdata=False)
-                    w_ref[chn][tstr] *= norm_factor
-                    w_inters[chn][tstr] *= norm_factor
-                    w2_ref[chn][tstr] *= norm_factor**2
-                    w2_inters[chn][tstr] *= norm_factor**2
-
-                counts_ref = str(int(c_ref[chn][tstr]))
-                counts_int = str(int(c_inters[chn][tstr]))
-                f.write( sep.join(('Reference', basestr, counts_ref)) + '\n' )
-                f.write( sep.join(('Intersection', basestr, counts_int)) + '\n' )
-
-                weights_ref = str(float(w_ref[chn][tstr]))
-                weights_int = str(float(w_inters[chn][tstr]))
-                f.write( sep.join(('Reference_weighted', basestr, weights_ref)) + '\n' )
-                f.write( sep.join(('Intersection_weighted', basestr, weights_int)) + '\n' )
-
-                w2_ref_str = str(float(w2_ref[chn][tstr]))
-                w2_int_str = str(float(w2_inters[chn][tstr]))
-                f.write( sep.join(('Reference_w2', basestr, w2_ref_str)) + '\n' )
-                f.write( sep.join(('Intersection_w2', basestr, w2_int_str)) + '\n' )
+                c_ref[chn][tstr] += int(np.sum(ref))
+                w_ref[chn][tstr] += np.sum(evt_weight[ref])
+                w2_ref[chn][tstr] += np.sum(evt_weight[ref]**2)
+
+                c_inters[chn][tstr] += int(np.sum(inters))
+                w_inters[chn][tstr] += np.sum(evt_weight[inters])
+                w2_inters[chn][tstr] += np.sum(evt_weight[inters]**2)
+
+def write_counts(args, outdir, infile, file_id,
+                 c_ref, c_inters, w_ref, w_inters, w2_ref, w2_inters):
+    """Writes the counters as a table with one row per channel and trigger intersection."""
+    config_module = importlib.import_module(args.configuration)
+    triggercomb = {}
+    for chn in args.channels:
+        triggercomb[chn] = utils.generate_trigger_combinations(chn, config_module.triggers,
+                                                               config_module.exclusive)
+
+    # only the (event-independent) reference triggers are required
+    sel = selection.EventSelection({'triggerbit': 0, 'RunNumber': 0, 'isLeptrigger': 0},
+                                   args.isdata, year=args.year, configuration=config_module)
+
+    if not os.path.exists(outdir):
+        os.makedirs(outdir)
+
+    outName = counts.table_path(args.outdir, args.tprefix, args.sample, file_id, args.subtag)
+    print('Saving file {} at {} '.format(file_id, outName) )
+
+    norm_factor = 1.
+    if not args.isdata:
+        sumw = utils.total_sum_weights(infile, isdata=False, index=args.sumw_index)
+        norm_factor = utils.get_lumi(args.year) / sumw
+
+    rows = []
+    for chn in args.channels:
+        for tcomb in triggercomb[chn]:
+            try:
+                reftrig = sel.dataset_triggers(tcomb, chn, config_module.triggers, args.dataset)[1]
+            except OverflowError:
+                continue
+            rows.append((chn, joinNTC(tcomb), joinNTC(reftrig)))
+
+    chns, tstrs, refs = zip(*rows) if rows else ((), (), ())
+    cols = {}
+    for name, counter, norm in (('c_ref', c_ref, 1.), ('c_inters', c_inters, 1.),
+                                ('w_ref', w_ref, norm_factor), ('w_inters', w_inters, norm_factor),
+                                ('w2_ref', w2_ref, norm_factor**2), ('w2_inters', w2_inters, norm_factor**2)):
+        cols[name] = np.array([counter[chn][tstr] for chn,tstr in zip(chns, tstrs)]) * norm
+    table = counts.make_table(chns, tstrs, refs, **cols)
+    counts.write_table(outName, table)
+
+def count_work_items(args, items):
+    """
+    Defines and increments the counters of a list of (filename, entry_start, entry_stop).
+    Everything is built from `args`, so that it can run in a separate process.
+    """
+    config_module = importlib.import_module(args.configuration)
+
+    triggercomb = {}
+    for chn in args.channels:
+        triggercomb[chn] = utils.generate_trigger_combinations(chn, config_module.triggers,
+                                                               config_module.exclusive)
+
+    plan = selection.SelectionPlan(args.isdata, args.year, config_module, triggercomb,
+                                   config_module.triggers, args.dataset)
+
+    counters = define_counters(args, triggercomb)
+    for infile, entry_start, entry_stop in items:
+        if args.engine == 'root':
+            f_in = ROOT.TFile(infile)
+            count_events_root(args, f_in.Get('HTauTauTree'), config_module, plan, triggercomb,
+                              *counters, entry_start=entry_start, entry_stop=entry_stop)
+            f_in.Close()
+        else:
+            count_events_columnar(args, infile, config_module, plan, triggercomb,
+                                  *counters, entry_start=entry_start, entry_stop=entry_stop)
+    return counters
+
+def merge_counters(counters, other):
+    """Adds counters filled separately (see `define_counters`)."""
+    for counter, counter_other in zip(counters, other):
+        for chn in counter:
+            for tstr in counter[chn]:
+                counter[chn][tstr] += counter_other[chn][tstr]
+
+def get_trig_counts(args):
+    # -- Check if outdir exists, if not create it
+    if not os.path.exists(args.outdir):
+        os.makedirs(args.outdir)
+    if not os.path.exists( os.path.join(args.outdir, args.sample) ):
+        os.makedirs( os.path.join(args.outdir, args.sample) )
+    outdir = os.path.join(args.outdir, args.sample)
+    
+    # files and entry ranges to process (see `utils.plan_work_units`)
+    if args.unit is None:
+        items, file_id = [(args.filename, None, None)], utils.get_file_id(args.filename)
+    else:
+        items, file_id = utils.load_work_unit(args.units_index, args.unit), args.unit
+    for infile,_,_ in items:
+        if not os.path.exists(infile):
+            mes = '[' + os.path.basename(__file__) + '] {} does not exist.'.format(infile)
+            raise ValueError(mes)
+
+    if args.ncores > 1:
+        # each process fills its own counters, which are then added
+        parts = utils.split_work_unit(items, args.ncores)
+        with multiprocessing.Pool(processes=len(parts)) as pool:
+            results = pool.starmap(count_work_items, [(args, part) for part in parts])
+        counters = results[0]
+        for res in results[1:]:
+            merge_counters(counters, res)
+    else:
+        counters = count_work_items(args, items)
+
+    write_counts(args, outdir, items[0][0], file_id, *counters)
 
 # -- Parse input arguments
-parser = argparse.ArgumentParser(description='Produce trigger counts.')
-
-parser.add_argument('--outdir',      dest='outdir',      required=True, help='output directory')
-parser.add_argument('--dataset', dest='dataset', required=True,
-                    help='Dataset name as provided by the user: MET, EG, ...')
-parser.add_argument('--sample',      dest='sample',      required=True, help='Process name as in SKIM directory')
-parser.add_argument('--isdata',      dest='isdata',      required=True, help='Whether it is data or MC', type=int)
-parser.add_argument('--year', required=True, type=str, choices=('2016', '2016APV', '2017', '2018'),
-                    help='Data year: impact thresholds and selections.')
-parser.add_argument('--file',        dest='filename',    required=True, help='ID of input root file')
-parser.add_argument('--subtag',      dest='subtag',      required=True,
-                    help='Additional (sub)tag to differ  entiate similar runs within the same tag.')
-parser.add_argument('--tprefix',     dest='tprefix',     required=True, help='Targets name prefix.')
-parser.add_argument('--channels',    dest='channels',    required=True, nargs='+', type=str,  
-                    help='Select the channels over which the workflow will be run.' )
-parser.add_argument('--configuration', dest='configuration', required=True,
-                    help='Name of the configuration module to use.')
-args = utils.parse_args(parser)
-
-get_trig_counts(args)
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Produce trigger counts.')
+
+    parser.add_argument('--outdir',      dest='outdir',      required=True, help='output directory')
+    parser.add_argument('--dataset', dest='dataset', required=True,
+                        help='Dataset name as provided by the user: MET, EG, ...')
+    parser.add_argument('--sample',      dest='sample',      required=True, help='Process name as in SKIM directory')
+    parser.add_argument('--isdata',      dest='isdata',      required=True, help='Whether it is data or MC', type=int)
+    parser.add_argument('--year', required=True, type=str, choices=('2016', '2016APV', '2017', '2018'),
+                        help='Data year: impact thresholds and selections.')
+    inputs = parser.add_mutually_exclusive_group(required=True)
+    inputs.add_argument('--file',        dest='filename',    default=None, help='ID of input root file')
+    inputs.add_argument('--unit',        default=None,
+                        help='Name of the work unit to process, as stored in `--units_index`.')
+    parser.add_argument('--units_index', required=False, default=None,
+                        help='JSON index with the work units of the sample (see `utils.plan_work_units`).')
+    parser.add_argument('--subtag',      dest='subtag',      required=True,
+                        help='Additional (sub)tag to differ  entiate similar runs within the same tag.')
+    parser.add_argument('--tprefix',     dest='tprefix',     required=True, help='Targets name prefix.')
+    parser.add_argument('--channels',    dest='channels',    required=True, nargs='+', type=str,  
+                        help='Select the channels over which the workflow will be run.' )
+    parser.add_argument('--configuration', dest='configuration', required=True,
+                        help='Name of the configuration module to use.')
+    parser.add_argument('--engine', required=False, default='root', choices=('root', 'columnar'),
+                        help='Per-event PyROOT loop or chunked uproot/NumPy processing.')
+    parser.add_argument('--step_size', required=False, default='100 MB',
+                        help='Size of the chunks read by the columnar engine.')
+    parser.add_argument('--sumw_index', required=False, default=None,
+                        help='JSON index with the sum of weights of the MC samples.')
+    parser.add_argument('--ncores', required=False, default=1, type=int,
+                        help='Number of processes sharing the entries of the job.')
+    args = utils.parse_args(parser)
+
+    get_trig_counts(args)
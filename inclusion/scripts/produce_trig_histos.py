@@ -1,6 +1,6 @@
 # coding: utf-8
 
-_all_ = [ 'build_histograms' ]
+_all_ = [ 'build_histograms', 'fill_histograms_columnar', 'fill_histograms_root' ]
 
 import os
 import sys
@@ -8,7 +8,7 @@ parent_dir = os.path.abspath(__file__ + 3 * '/..')
 sys.path.insert(0, parent_dir)
 
 import inclusion
-from inclusion import selection
+from inclusion import histograms, selection
 from inclusion.config import main
 from inclusion.utils import utils
 from inclusion.utils.utils import join_name_trigger_intersection as joinNTC
@@ -18,74 +18,77 @@ import functools
 import argparse
 import itertools as it
 import importlib
+import multiprocessing
+import numpy as np
+import uproot as up
 
 import ROOT
 
-def build_histograms(args):
-    # -- Check if outdir exists, if not create it
-    if not os.path.exists(args.outdir):
-        os.makedirs(args.outdir)
-    if not os.path.exists( os.path.join(args.outdir, args.sample) ):
-        os.makedirs( os.path.join(args.outdir, args.sample) )
-    outdir = os.path.join(args.outdir, args.sample)
-
-    if not os.path.exists(args.infile):
-        mes = '[' + os.path.basename(__file__) + '] {} does not exist.'.format(args.infile)
-        raise ValueError(mes)
-
-    config_module = importlib.import_module(args.configuration)
-
-    f_in = ROOT.TFile.Open(args.infile)
-    t_in = f_in.Get('HTauTauTree')
+def define_histograms(args, config_module, plan, binedges, triggercomb):
+    """
+    Books the histograms, one family per channel and variable(s) (see `histograms.HistogramRegistry`).
+      Ref: pass the reference trigger, one histogram per trigger combination
+      Trig: pass the reference trigger + trigger under study, one histogram
+            per trigger combination and cut combination (see `selection.CutCombinations`)
+    """
+    hists = histograms.HistogramRegistry()
 
-    binedges, nbins = utils.load_binning(afile=args.binedges_fname, key=args.subtag,
-                                         variables=args.variables, channels=args.channels)
-    triggercomb = {}
     for chn in args.channels:
-        triggercomb[chn] = utils.generate_trigger_combinations(chn, config_module.triggers,
-                                                               config_module.exclusive)
+        cstrs = [joinNTC(tcomb) for tcomb in triggercomb[chn]]
 
-    # Define 1D histograms
-    #  hRef: pass the reference trigger
-    #  hTrg: pass the reference trigger + trigger under study
-    hRef, hTrg = ({} for _ in range(2))
-
-    for chn in args.channels:
-        hRef[chn], hTrg[chn] = ({} for _ in range(2))
+        # 1D histograms
         for j in args.variables:
-            binning1D = (nbins[j][chn], binedges[j][chn])
-            hTrg[chn][j], hRef[chn][j] = ({} for _ in range(2))
-            for tcomb in triggercomb[chn]:
-                hname = utils.get_hnames('Ref1D')(chn, j, joinNTC(tcomb))
-
-                hRef[chn][j][joinNTC(tcomb)] = ROOT.TH1D(hname, '', *binning1D)
-                hTrg[chn][j][joinNTC(tcomb)] = {}
-
-    # Define 2D histograms
-    #  h2Ref: pass the reference trigger
-    #  h2Trig: pass the reference trigger + trigger under study
-    h2Ref, h2Trig = ({} for _ in range(2))
-    
-    for chn in args.channels:
-        h2Ref[chn], h2Trig[chn] = ({} for _ in range(2))
+            edges = (binedges[j][chn],)
+            hists.book(('Ref1D', chn, j), edges, cstrs,
+                       [utils.get_hnames('Ref1D')(chn, j, cstr) for cstr in cstrs])
+
+            keys = [ (joinNTC(tcomb), key) for tcomb in triggercomb[chn]
+                     for key in plan.cuts.combinations(tcomb, (j,))[0] ]
+            names = [ utils.rewrite_cut_string(utils.get_hnames('Trig1D')(chn, j, cstr), key)
+                      for cstr,key in keys ]
+            hists.book(('Trig1D', chn, j), edges, keys, names)
+
+        # 2D histograms, only for the trigger combinations including a trigger in 'pairs2D'
+        pairs = {}
         for onetrig in config_module.triggers:
             if onetrig in config_module.pairs2D.keys():
-                combtrigs = {x for x in triggercomb[chn] if onetrig in x}
-                for combtrig in combtrigs:
-                    cstr = joinNTC(combtrig)
-                    
-                    for j in config_module.pairs2D[onetrig]:
-                        bin2D = ( nbins[j[0]][chn], binedges[j[0]][chn],
-                                  nbins[j[1]][chn], binedges[j[1]][chn] )
-                        vname = utils.add_vnames(j[0], j[1])
-                        if vname not in h2Ref[chn]:
-                            h2Ref[chn][vname] = {}
-                        hname = utils.get_hnames('Ref2D')(chn, vname, cstr)
-                        h2Ref[chn][vname][cstr] = ROOT.TH2D(hname, '', *bin2D)
-                        if vname not in h2Trig[chn]:
-                            h2Trig[chn][vname] = {}
-                        h2Trig[chn][vname][cstr] = {}
-
+                for j in config_module.pairs2D[onetrig]:
+                    pairs.setdefault(j, [])
+                    pairs[j].extend(x for x in triggercomb[chn] if onetrig in x and x not in pairs[j])
+
+        for j,combtrigs in pairs.items():
+            vname = utils.add_vnames(j[0], j[1])
+            edges = (binedges[j[0]][chn], binedges[j[1]][chn])
+            cstrs = [joinNTC(combtrig) for combtrig in combtrigs]
+            hists.book(('Ref2D', chn, vname), edges, cstrs,
+                       [utils.get_hnames('Ref2D')(chn, vname, cstr) for cstr in cstrs])
+
+            keys = [ (joinNTC(combtrig), key) for combtrig in combtrigs
+                     for key in plan.cuts.combinations(combtrig, j)[0] ]
+            names = [ utils.rewrite_cut_string(utils.get_hnames('Trig2D')(chn, vname, cstr), key)
+                      for cstr,key in keys ]
+            hists.book(('Trig2D', chn, vname), edges, keys, names)
+
+    return hists
+
+def trigger_rows(hists):
+    """
+    Rows of the trigger histograms of each trigger combination,
+    in the order of the cut combinations (see `selection.CutCombinations`).
+    """
+    rows = {}
+    for (kind, chn, vname),family in hists.families.items():
+        if kind in ('Trig1D', 'Trig2D'):
+            for irow,(cstr,_) in enumerate(family.keys):
+                rows.setdefault((chn, vname, cstr), []).append(irow)
+    return {k: np.array(v) for k,v in rows.items()}
+
+def fill_histograms_root(args, t_in, config_module, plan, binedges, triggercomb, hists,
+                         entry_start=None, entry_stop=None):
+    """
+    Fills the histograms looping over the events one by one with PyROOT.
+    Only the entries in [entry_start, entry_stop) are processed.
+    """
     t_in.SetBranchStatus('*', 0)
     _entries = utils.define_used_tree_variables(config_module.custom_cut)
     _entries += tuple(args.variables)
@@ -93,10 +96,16 @@ def build_histograms(args):
         t_in.SetBranchStatus(ientry, 1)
     cmet = 0
 
+    trig_rows = trigger_rows(hists)
+
     nentries = t_in.GetEntriesFast()
-    for ientry,entry in enumerate(t_in):
+    entry_start = 0 if entry_start is None else entry_start
+    entry_stop = nentries if entry_stop is None else entry_stop
+    for ientry in range(entry_start, entry_stop):
         if ientry%10000==0:
              print('{} / {}'.format(ientry, nentries))
+        t_in.GetEntry(ientry)
+        entry = t_in
 
         # this is slow: do it once only
         entries = utils.dot_dict({x: getattr(entry, x) for x in _entries})
@@ -131,7 +140,7 @@ def build_histograms(args):
                 raise RuntimeError('The weight for data is {}!'.format(evt_weight))
 
         sel = selection.EventSelection(entries, isdata=args.isdata, year=args.year,
-                                       configuration=config_module)
+                                       configuration=config_module, plan=plan)
 
         if not sel.sel_category(config_module.category):
             continue
@@ -144,26 +153,11 @@ def build_histograms(args):
                 if fill_var[v][chn]>binedges[v][chn][-1]:
                     fill_var[v][chn]=binedges[v][chn][-1] # include overflow
 
-        # whether the event passes cuts (1 and 2-dimensional) and single triggers
-        pass_trigger, pcuts1D, pcuts2D = ({} for _ in range(3))
-        for trig in config_module.triggers:
-            pcuts2D[trig] = {}
-        for trig in config_module.triggers:
-            pass_trigger[trig] = sel.trigger_bits(trig)
-            pcuts1D[trig] = {}
-            for var in args.variables:
-                pcuts1D[trig][var] = sel.var_cuts(trig, [var], args.nocut_dummy_str)
-
-            if trig in config_module.pairs2D.keys():
-                # combtrigs = tuple(x for x in triggercomb if trig in x)
-                # for combtrig in combtrigs:
-                # pcuts2D[joinNTC(combtrig)] = {}
-                for j in config_module.pairs2D[trig]:
-                    vname = utils.add_vnames(j[0],j[1])
-                    for t in config_module.triggers:
-                        pcuts2D[t][vname] = sel.var_cuts(t, [j[0], j[1]], args.nocut_dummy_str)
+        # cuts passed by the event (1 and 2-dimensional), one bit per cut
+        cutbits = plan.cuts.bits(entries)
 
         #logic AND to intersect all triggers in this combination
+        pass_trigger = {trig: sel.trigger_bits(trig) for trig in config_module.triggers}
         pass_trigger_intersection = {}
         for chn in args.channels:
             for tcomb in triggercomb[chn]:
@@ -176,216 +170,286 @@ def build_histograms(args):
 
                 # fill histograms for 1D efficiencies
                 for j in args.variables:
-                    binning1D = (nbins[j][chn], binedges[j][chn])
+                    href, htrg = hists['Ref1D', chn, j], hists['Trig1D', chn, j]
 
                     # The following is tricky, as we are considering, simultaneously:
                     # - all trigger intersection combinations
                     # - all cut combinations for each trigger combination (see 'main.cuts')
-                        
-                    # Logic AND to intersect all cuts for this trigger combination
-                    # Each element will contain one possible cut combination
-                    # for the trigger combination 'tcomb' being considered
-                    for tcomb in triggercomb[chn]:
+                    for tcomb in plan.tcombs(chn):
                         cstr = joinNTC(tcomb)
 
-                        if not sel.check_inters_with_dataset(tcomb, chn, args.dataset):
-                            continue
-                        if not sel.dataset_cuts(tcomb, chn):
-                            continue
-                        if not sel.dataset_triggers(tcomb, chn, config_module.triggers,
-                                                    args.dataset)[0]:
+                        if not sel.reference_cuts(tcomb, chn):
                             continue
 
                         # avoid underflow bin with negative weights crashing efficiency calculation
                         underflow = fill_var[j][chn] < binedges[j][chn][0]
-                        fill_info = fill_var[j][chn], 1. if underflow else evt_weight
-                        hRef[chn][j][cstr].Fill(*fill_info)
-                        
-                        cuts_combinations = list(it.product( *(pcuts1D[atrig][j].items()
-                                                             for atrig in tcomb) ))
-
-                        # One dict item per cut combination
-                        # - key: all cut strings joined
-                        # - value: logical and of all cuts
-                        pcuts_inters = { (args.intersection_str).join(e[0] for e in elem): 
-                                         functools.reduce(                 
-                                             lambda x,y: x and y,
-                                             [ e[1] for e in elem ]
-                                         )
-                                         for elem in cuts_combinations }
-                    
-                        for key,val in pcuts_inters.items():
-                            if key not in hTrg[chn][j][cstr]:
-                                base_str = utils.get_hnames('Trig1D')(chn,j,cstr)
-                                htrig_name = utils.rewrite_cut_string(base_str, key)
-                                hTrg[chn][j][cstr][key] = ROOT.TH1D(htrig_name, '', *binning1D)
-
-                            if val and pass_trigger_intersection[cstr]:
-                                hTrg[chn][j][cstr][key].Fill(*fill_info)
+                        weight = 1. if underflow else evt_weight
+                        href.fill(href.index[cstr], weight, fill_var[j][chn])
+
+                        # one row per cut combination, in the same order
+                        if pass_trigger_intersection[cstr]:
+                            passed = plan.cuts.passes(cutbits, tcomb, (j,))
+                            htrg.fill(trig_rows[chn, j, cstr][passed], weight, fill_var[j][chn])
 
                 # fill 2D efficiencies
                 for onetrig in config_module.triggers:
                     if onetrig in config_module.pairs2D.keys():
-                        combtrigs = tuple(x for x in triggercomb[chn] if onetrig in x)
+                        combtrigs = tuple(x for x in plan.tcombs(chn) if onetrig in x)
 
                         for combtrig in combtrigs:
                             cstr = joinNTC(combtrig)
                             
-                            if not sel.check_inters_with_dataset(combtrig, chn, args.dataset):
-                                continue
-                            if not sel.dataset_cuts(combtrig, chn):
-                                continue
-                            if not sel.dataset_triggers(combtrig, chn, config_module.triggers, args.dataset)[0]:
+                            if not sel.reference_cuts(combtrig, chn):
                                 continue
                             
                             for j in config_module.pairs2D[onetrig]:
                                 vname = utils.add_vnames(j[0],j[1])
+                                href, htrg = hists['Ref2D', chn, vname], hists['Trig2D', chn, vname]
+
                                 # avoid underflow bin with negative weights crashing efficiency calculation
                                 underflow = (fill_var[j[0]][chn] < binedges[j[0]][chn][0] or
                                              fill_var[j[1]][chn] < binedges[j[1]][chn][0])
-                                fill_info = (fill_var[j[0]][chn], fill_var[j[1]][chn], 1. if underflow else evt_weight)
-
-                                try:
-                                    cuts_combinations = list(it.product(
-                                        *(pcuts2D[atrig][vname].items() for atrig in combtrig) ))
-                                except KeyError:
-                                    print('CHECK: ', combtrig)
-                                    raise
-
-                                # One dict item per cut combination
-                                # - key: all cut strings joined
-                                # - value: logical and of all cuts
-                                pcuts_inters = { (args.intersection_str).join(e[0] for e in elem):
-                                                 functools.reduce(
-                                                     lambda x,y: x and y,
-                                                     [ e[1] for e in elem ]
-                                                     )
-                                                 for elem in cuts_combinations }
-
-                                h2Ref[chn][vname][cstr].Fill(*fill_info)
-    
-                                for key,val in pcuts_inters.items():
-                                    if key not in h2Trig[chn][vname][cstr]:
-                                        base_str = utils.get_hnames('Trig2D')(chn, vname, cstr)
-                                        h2name = utils.rewrite_cut_string(base_str, key)
-                                        bin2D = ( nbins[j[0]][chn], binedges[j[0]][chn],  
-                                                  nbins[j[1]][chn], binedges[j[1]][chn] ) 
-                                        h2Trig[chn][vname][cstr][key] = ROOT.TH2D(h2name, '', *bin2D)
-                                        
-                                    if val and pass_trigger_intersection[cstr]:
-                                        h2Trig[chn][vname][cstr][key].Fill(*fill_info)
-    
-    file_id = ''.join(c for c in args.infile[-10:] if c.isdigit())
+                                weight = 1. if underflow else evt_weight
+                                values = fill_var[j[0]][chn], fill_var[j[1]][chn]
+
+                                href.fill(href.index[cstr], weight, *values)
+
+                                if pass_trigger_intersection[cstr]:
+                                    passed = plan.cuts.passes(cutbits, combtrig, j)
+                                    htrg.fill(trig_rows[chn, vname, cstr][passed], weight, *values)
+
+def fill_histograms_columnar(args, infile, config_module, plan, binedges, triggercomb, hists,
+                             entry_start=None, entry_stop=None):
+    """
+    Fills the histograms reading the required branches in chunks with uproot.
+    Only the entries in [entry_start, entry_stop) are processed.
+    The selection is applied with boolean masks (see `selection.EventSelectionArray`).
+    Mirrors `fill_histograms_root`.
+    """
+    _entries = utils.define_used_tree_variables(config_module.custom_cut)
+    _entries += tuple(args.variables)
+    _entries = sorted(set(_entries))
+
+    trig_rows = trigger_rows(hists)
+
+    nentries = 0
+    t_in = up.open(infile + ':HTauTauTree')
+    for entries in t_in.iterate(_entries, step_size=args.step_size, library='np',
+                                entry_start=entry_start, entry_stop=entry_stop):
+        nchunk = len(entries['triggerbit'])
+        nentries += nchunk
+        print('{} entries read'.format(nentries))
+
+        # see `fill_histograms_root` for the (currently unused) event weights
+        evt_weight = np.ones(nchunk)
+
+        sel = selection.EventSelectionArray(entries, isdata=args.isdata, year=args.year,
+                                            configuration=config_module, plan=plan)
+        category = sel.sel_category(config_module.category)
+
+        fill_var = {}
+        for v in args.variables:
+            fill_var[v] = {}
+            for chn in args.channels:
+                # include overflow
+                fill_var[v][chn] = np.where(entries[v] > binedges[v][chn][-1],
+                                            binedges[v][chn][-1], entries[v])
+
+        # cuts passed by the events (1 and 2-dimensional), one bit per cut
+        cutbits = plan.cuts.bits(entries)
+
+        for chn in args.channels:
+            chn_mask = category & sel.channel_mask(chn)
+            if not chn_mask.any():
+                continue
+
+            # events passing the reference selection and triggers, per trigger combination
+            pass_ref, pass_trigger_intersection = ({} for _ in range(2))
+            for tcomb in plan.tcombs(chn):
+                mask = chn_mask & sel.reference_cuts(tcomb, chn)
+                if not mask.any():
+                    continue
+                pass_ref[joinNTC(tcomb)] = mask
+                pass_trigger_intersection[joinNTC(tcomb)] = sel.trigger_intersection(tcomb)
+
+            # fill histograms for 1D efficiencies
+            for j in args.variables:
+                href, htrg = hists['Ref1D', chn, j], hists['Trig1D', chn, j]
+
+                for tcomb in triggercomb[chn]:
+                    cstr = joinNTC(tcomb)
+                    if cstr not in pass_ref:
+                        continue
+                    ref = pass_ref[cstr]
+
+                    # avoid underflow bin with negative weights crashing efficiency calculation
+                    values = fill_var[j][chn][ref]
+                    weights = np.where(values < binedges[j][chn][0], 1., evt_weight[ref])
+                    href.fill(href.index[cstr], weights, values)
+
+                    # one column per cut combination, in the order of the histogram rows
+                    passed = ( plan.cuts.passes(cutbits[ref], tcomb, (j,)) &
+                               pass_trigger_intersection[cstr][ref][:, None] )
+                    evts, combs = np.nonzero(passed)
+                    htrg.fill(trig_rows[chn, j, cstr][combs], weights[evts], values[evts])
+
+            # fill 2D efficiencies
+            for onetrig in config_module.triggers:
+                if onetrig not in config_module.pairs2D.keys():
+                    continue
+                combtrigs = tuple(x for x in triggercomb[chn] if onetrig in x)
+
+                for combtrig in combtrigs:
+                    cstr = joinNTC(combtrig)
+                    if cstr not in pass_ref:
+                        continue
+                    ref = pass_ref[cstr]
+
+                    for j in config_module.pairs2D[onetrig]:
+                        vname = utils.add_vnames(j[0],j[1])
+                        href, htrg = hists['Ref2D', chn, vname], hists['Trig2D', chn, vname]
+
+                        values = (fill_var[j[0]][chn][ref], fill_var[j[1]][chn][ref])
+                        # avoid underflow bin with negative weights crashing efficiency calculation
+                        underflow = ((values[0] < binedges[j[0]][chn][0]) |
+                                     (values[1] < binedges[j[1]][chn][0]))
+                        weights = np.where(underflow, 1., evt_weight[ref])
+                        href.fill(href.index[cstr], weights, *values)
+
+                        passed = ( plan.cuts.passes(cutbits[ref], combtrig, j) &
+                                   pass_trigger_intersection[cstr][ref][:, None] )
+                        evts, combs = np.nonzero(passed)
+                        htrg.fill(trig_rows[chn, vname, cstr][combs], weights[evts],
+                                  values[0][evts], values[1][evts])
+
+def write_histograms(args, outdir, hists, infile, file_id):
     outname = os.path.join(outdir, args.tprefix + args.sample + '_' + file_id + args.subtag + '.root')
-    empty_files = True
 
     # normalize all histograms with luminosity and sum of weights
     if not args.isdata:
-        norm = utils.get_lumi(args.year) / utils.total_sum_weights(args.infile, isdata=False)
-        for chn in args.channels:
-            for vname in hRef[chn].keys():
-                for cstr in hRef[chn][vname].keys():
-                    hRef[chn][vname][cstr].Scale(norm)
-                    for key in hTrg[chn][vname][cstr].keys():
-                        hTrg[chn][vname][cstr][key].Scale(norm)
-            for vname in h2Ref[chn].keys():
-                for cstr in h2Ref[chn][vname].keys():
-                    h2Ref[chn][vname][cstr].Scale(norm)
-                    for key in h2Trig[chn][vname][cstr].keys():
-                        h2Trig[chn][vname][cstr][key].Scale(norm)
+        sumw = utils.total_sum_weights(infile, isdata=False, index=args.sumw_index)
+        hists.scale(utils.get_lumi(args.year) / sumw)
 
     # sanity check: reference counts must be always equal or larger than after applying some cut
     # remove negative weights under special conditions
-    for chn in args.channels:
-        for vname in hRef[chn].keys():
-            for cstr in hRef[chn][vname].keys():
-                old_ref = hRef[chn][vname][cstr].Integral()
-                for key in hTrg[chn][vname][cstr].keys():
-                    old_trg = hTrg[chn][vname][cstr][key].Integral()
-                    neg_ref, neg_trg = False, False
-                    for ibin in range(hRef[chn][vname][cstr].GetNbinsX()+1):
-                        val_ref = hRef[chn][vname][cstr].GetBinContent(ibin)
-                        val_trg = hTrg[chn][vname][cstr][key].GetBinContent(ibin)
-                        if val_ref < 0.:
-                            neg_ref = True
-                            hRef[chn][vname][cstr].SetBinContent(ibin, 0.)
-                        if val_trg < 0.:
-                            neg_trg = True
-                            hTrg[chn][vname][cstr][key].SetBinContent(ibin, 0.)
-
-                        val_ref = hRef[chn][vname][cstr].GetBinContent(ibin)
-                        val_trg = hTrg[chn][vname][cstr][key].GetBinContent(ibin)
-                        if val_ref < val_trg:
-                            print("Denominator: {} | Numerator: {}".format(val_ref, val_trg))
-                            print("NegRef? {} | NegTrg? {}".format(neg_ref, neg_trg))
-                            raise AssertionError()
-                    if neg_ref:
-                        new = hRef[chn][vname][cstr].Integral()
-                        hRef[chn][vname][cstr].Scale(old_ref/new)
-                    if neg_trg:
-                        new = hTrg[chn][vname][cstr][key].Integral()
-                        hTrg[chn][vname][cstr][key].Scale(old_trg/new)
-
-    f_out = ROOT.TFile(outname, 'RECREATE')
-    f_out.cd()
     for chn in args.channels:
         for j in args.variables:
-            for tcomb in triggercomb[chn]:
-                cstr = joinNTC(tcomb)
-                if hRef[chn][j][cstr].GetEntries() > 0:
-                    empty_files = False
-                
-                hRef[chn][j][cstr].Write( utils.get_hnames('Ref1D')(chn,j,cstr) )
-
-                for khist,vhist in hTrg[chn][j][cstr].items():
-                    base_str = utils.get_hnames('Trig1D')(chn, j, cstr)
-                    writename = utils.rewrite_cut_string(base_str, khist)
-                    vhist.Write(writename)
-
-        for vname in h2Ref[chn].keys():
-
-            for tc in h2Trig[chn][vname].keys():
-                h2Ref[chn][vname][tc].Write()
-                
-                for key in h2Trig[chn][vname][tc].keys():
-                    base_str = h2Trig[chn][vname][tc][key].GetName()
-                    writename = utils.rewrite_cut_string(base_str, key)
-                    h2Trig[chn][vname][tc][key].Write(writename)
-
-    if empty_files:
+            href, htrg = hists['Ref1D', chn, j], hists['Trig1D', chn, j]
+            parents = [href.index[cstr] for cstr,_ in htrg.keys]
+            histograms.remove_negative_bins(href, htrg, parents)
+
+    if not any(hists['Ref1D', chn, j].entries.any()
+               for chn in args.channels for j in args.variables):
         mes = 'All 1D histograms are empty.'
         print('WARNING: ' + mes)
 
-    f_in.Close()
+    f_out = ROOT.TFile(outname, 'RECREATE')
+    f_out.cd()
+    hists.write()
     f_out.Close()
     print('Saving file {} at {} '.format(file_id, outname) )
 
+def fill_work_items(args, items):
+    """
+    Defines and fills the histograms of a list of (filename, entry_start, entry_stop).
+    Everything is built from `args`, so that it can run in a separate process.
+    """
+    config_module = importlib.import_module(args.configuration)
+
+    binedges, nbins = utils.load_binning(afile=args.binedges_fname, key=args.subtag,
+                                         variables=args.variables, channels=args.channels)
+    triggercomb = {}
+    for chn in args.channels:
+        triggercomb[chn] = utils.generate_trigger_combinations(chn, config_module.triggers,
+                                                               config_module.exclusive)
+
+    plan = selection.SelectionPlan(args.isdata, args.year, config_module, triggercomb,
+                                   config_module.triggers, args.dataset,
+                                   args.nocut_dummy_str, args.intersection_str)
+
+    hists = define_histograms(args, config_module, plan, binedges, triggercomb)
+    for infile, entry_start, entry_stop in items:
+        if args.engine == 'root':
+            f_in = ROOT.TFile.Open(infile)
+            fill_histograms_root(args, f_in.Get('HTauTauTree'), config_module, plan,
+                                 binedges, triggercomb, hists, entry_start, entry_stop)
+            f_in.Close()
+        else:
+            fill_histograms_columnar(args, infile, config_module, plan, binedges, triggercomb,
+                                     hists, entry_start, entry_stop)
+    return hists
+
+def build_histograms(args):
+    # -- Check if outdir exists, if not create it
+    if not os.path.exists(args.outdir):
+        os.makedirs(args.outdir)
+    if not os.path.exists( os.path.join(args.outdir, args.sample) ):
+        os.makedirs( os.path.join(args.outdir, args.sample) )
+    outdir = os.path.join(args.outdir, args.sample)
+
+    # files and entry ranges to process (see `utils.plan_work_units`)
+    if args.unit is None:
+        items, file_id = [(args.infile, None, None)], utils.get_file_id(args.infile)
+    else:
+        items, file_id = utils.load_work_unit(args.units_index, args.unit), args.unit
+    for infile,_,_ in items:
+        if not os.path.exists(infile):
+            mes = '[' + os.path.basename(__file__) + '] {} does not exist.'.format(infile)
+            raise ValueError(mes)
+
+    if args.ncores > 1:
+        # each process fills its own histograms, which are then added
+        parts = utils.split_work_unit(items, args.ncores)
+        with multiprocessing.Pool(processes=len(parts)) as pool:
+            results = pool.starmap(fill_work_items, [(args, part) for part in parts])
+        hists = results[0]
+        for res in results[1:]:
+            hists.merge(res)
+    else:
+        hists = fill_work_items(args, items)
+
+    write_histograms(args, outdir, hists, items[0][0], file_id)
+
 # Parse input arguments
-parser = argparse.ArgumentParser(description='Producer trigger histograms.')
-
-parser.add_argument('--binedges_fname', required=True, help='where the bin edges are stored')
-parser.add_argument('--outdir', required=True, help='output directory')
-parser.add_argument('--dataset', required=True,
-                    help='Dataset name as provided by the user: MET, EG, ...')
-parser.add_argument('--sample', required=True,
-                    help='Process name as in SKIM directory')
-parser.add_argument('--isdata', required=True, type=int, help='Whether it is data or MC')
-parser.add_argument('--file', dest='infile', required=True, help='Full path of ROOT input file')
-parser.add_argument('--year', required=True, type=str, choices=('2016', '2016APV', '2017', '2018'),
-                    help='Data year: impact thresholds and selections.')
-parser.add_argument('--subtag', required=True,
-                    help='Additional (sub)tag to differentiate similar runs within the same tag.')
-parser.add_argument('--tprefix', required=True, help='Targets name prefix.')
-parser.add_argument('--channels', required=True, nargs='+', type=str,  
-                    help='Select the channels over which the workflow will be run.' )
-parser.add_argument('--variables', required=True, nargs='+', type=str,
-                    help='Select the variables over which the workflow will be run.' )
-parser.add_argument('--intersection_str', required=False, default=main.inters_str,
-                    help='String used to represent set intersection between triggers.')
-parser.add_argument('--nocut_dummy_str', required=True,
-                    help='Dummy string associated to trigger histograms were no cuts are applied.')
-parser.add_argument('--configuration', required=True,
-                    help='Name of the configuration module to use.')
-args = utils.parse_args(parser)
-
-build_histograms(args)
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Producer trigger histograms.')
+
+    parser.add_argument('--binedges_fname', required=True, help='where the bin edges are stored')
+    parser.add_argument('--outdir', required=True, help='output directory')
+    parser.add_argument('--dataset', required=True,
+                        help='Dataset name as provided by the user: MET, EG, ...')
+    parser.add_argument('--sample', required=True,
+                        help='Process name as in SKIM directory')
+    parser.add_argument('--isdata', required=True, type=int, help='Whether it is data or MC')
+    inputs = parser.add_mutually_exclusive_group(required=True)
+    inputs.add_argument('--file', dest='infile', default=None, help='Full path of ROOT input file')
+    inputs.add_argument('--unit', default=None,
+                        help='Name of the work unit to process, as stored in `--units_index`.')
+    parser.add_argument('--units_index', required=False, default=None,
+                        help='JSON index with the work units of the sample (see `utils.plan_work_units`).')
+    parser.add_argument('--year', required=True, type=str, choices=('2016', '2016APV', '2017', '2018'),
+                        help='Data year: impact thresholds and selections.')
+    parser.add_argument('--subtag', required=True,
+                        help='Additional (sub)tag to differentiate similar runs within the same tag.')
+    parser.add_argument('--tprefix', required=True, help='Targets name prefix.')
+    parser.add_argument('--channels', required=True, nargs='+', type=str,  
+                        help='Select the channels over which the workflow will be run.' )
+    parser.add_argument('--variables', required=True, nargs='+', type=str,
+                        help='Select the variables over which the workflow will be run.' )
+    parser.add_argument('--intersection_str', required=False, default=main.inters_str,
+                        help='String used to represent set intersection between triggers.')
+    parser.add_argument('--nocut_dummy_str', required=True,
+                        help='Dummy string associated to trigger histograms were no cuts are applied.')
+    parser.add_argument('--configuration', required=True,
+                        help='Name of the configuration module to use.')
+    parser.add_argument('--engine', required=False, default='root', choices=('root', 'columnar'),
+                        help='Per-event PyROOT loop or chunked uproot/NumPy processing.')
+    parser.add_argument('--step_size', required=False, default='100 MB',
+                        help='Size of the chunks read by the columnar engine.')
+    parser.add_argument('--sumw_index', required=False, default=None,
+                        help='JSON index with the sum of weights of the MC samples.')
+    parser.add_argument('--ncores', required=False, default=1, type=int,
+                        help='Number of processes sharing the entries of the job.')
+    args = utils.parse_args(parser)
+
+    build_histograms(args)
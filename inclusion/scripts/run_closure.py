@@ -8,6 +8,7 @@ parent_dir = os.path.abspath(__file__ + 3 * '/..')
 sys.path.insert(0, parent_dir)
 
 import inclusion
+from inclusion import scale_factors, accumulators
 from inclusion.utils import utils
 from inclusion.config import main
 
@@ -15,6 +16,7 @@ import json
 import glob
 import h5py
 import argparse
+import importlib
 import ctypes
 import numpy as np
 import array
@@ -47,42 +49,62 @@ def get_div_error_propagation(num, den, enum, eden):
     val = num/den
     return val * TMath.Sqrt(first + second)
 
-def get_ref_obj( indir_union, channel, var, weightvar,
-                 nbins, edges, prefix,
-                 subtag ):
+def to_graph(edges, arr):
+    """Efficiencies stored as (value, low, up) arrays converted to a TGraphAsymmErrors."""
+    xvals = (edges[1:] + edges[:-1]) / 2
+    exvals = (edges[1:] - edges[:-1]) / 2
+    return TGraphAsymmErrors( len(xvals),
+                              array.array('d', xvals),
+                              array.array('d', arr[0]),
+                              array.array('d', exvals),
+                              array.array('d', exvals),
+                              array.array('d', arr[1]),
+                              array.array('d', arr[2]) )
+
+def reduce_union_outputs(indir_union, channel, prefix, subtag, mc_processes, single_trigger):
+    """
+    Per bin moments of the probability ratios written by `run_union_calculator.py`,
+    for all variables and weight variables of the channel, merged over the files of all
+    MC processes. Each file is opened once.
+    Returns a dictionary keyed by (variable, weight variable) and the names of the rows.
+    """
     globfiles = []
-    for proc in args.mc_processes:
-        name_mc = os.path.join(indir_union, proc, 'Closure_' + args.closure_single_trigger[0],
+    for proc in mc_processes:
+        name_mc = os.path.join(indir_union, proc, 'Closure_' + single_trigger,
                                prefix + '*' + subtag + '.hdf5')
         globfiles.extend( glob.glob(name_mc) )
 
-    values = {}
-    for i in range(nbins):
-        values[str(i)] = []
-
+    moments, rows = {}, None
     for globf in globfiles:
-        indata = h5py.File(globf, mode='r')
-        for i in range(nbins):
-            values[str(i)].extend( indata[channel][var][weightvar][str(i)]['ref_prob_ratios'][:] )
-
+        with h5py.File(globf, mode='r') as indata:
+            if channel not in indata:
+                continue
+            for var, vgroup in indata[channel].items():
+                for weightvar, group in vgroup.items():
+                    new = accumulators.read_moments(group)
+                    rows = [x.decode() for x in group.attrs['rows']]
+                    if (var, weightvar) in moments:
+                        moments[var, weightvar].add(new)
+                    else:
+                        moments[var, weightvar] = new
+    return moments, rows
+
+def get_ref_obj( acc, nbins, edges ):
     # Check if everything is empty
-    flag = True
-    for i in range(nbins):
-        flag = flag and len(values[str(i)])==0
-    if flag:
+    if acc is None or acc.entries[0].sum() == 0:
         return False
+    sums = acc.sum()[0]
 
     graph_xvals, graph_yvals = ([] for _ in range(2))
     graph_exvals_low, graph_exvals_high = ([] for _ in range(2))
     graph_eyvals_low, graph_eyvals_high = ([] for _ in range(2))
     for ix in range(nbins):
-        yvals = values[str(ix)]
         fake_xval = (edges[ix]+edges[ix+1])/2 #used only for filling the correct bin
         graph_xvals.append( fake_xval )
         graph_exvals_low.append( abs(fake_xval-edges[ix]) )
         graph_exvals_high.append( abs(fake_xval-edges[ix+1]) )
-        if len(yvals)>0:
-            yvals_sum = sum(yvals)
+        if acc.entries[0][ix]>0:
+            yvals_sum = sums[ix]
             graph_yvals.append( yvals_sum )
             graph_eyvals_low.append( TMath.Sqrt(yvals_sum)/2 )
             graph_eyvals_high.append( TMath.Sqrt(yvals_sum)/2 )
@@ -102,41 +124,24 @@ def get_ref_obj( indir_union, channel, var, weightvar,
     return eff1d_ref
 
 
-def draw_single_eff( ref_obj, indir_union, indir_eff, channel, var, weightvar, trig,
-                     nbins, edges, in_prefix, eff_prefix, data_name, mc_name,
-                     weights2d_names, prof_names, ref_names, subtag, debug ):
-    #potentially many MC processes
-    globfiles = []
-    for proc in args.mc_processes:
-        name_mc = os.path.join(indir_union, proc, 'Closure_' + args.closure_single_trigger[0],
-                               in_prefix + '*' + subtag + '.hdf5')
-        globfiles.extend( glob.glob(name_mc) )
-
-    nbins_eff = 5*nbins
-    values = {}
-    for i in range(nbins):
-        values[str(i)] = []
-
-    for globf in globfiles:
-        indata = h5py.File(globf, mode='r')
-        for i in range(nbins):
-            values[str(i)].extend( indata[channel][var][weightvar][trig][str(i)]['prob_ratios'][:] )
-
+def draw_single_eff( ref_obj, acc, rows, effs, channel, var, weightvar, trig,
+                     nbins, edges, in_prefix,
+                     weights2d_names, prof_names, ref_names, debug ):
     # Check if everything is empty
-    flag = True
-    for i in range(nbins):
-        flag = flag and len(values[str(i)])==0
-    if flag:
+    if acc is None or acc.entries[rows.index(trig)].sum() == 0:
         return False
+    row = rows.index(trig)
+    entries = acc.entries[row]
+    medians = acc.quantile(0.5)[row] #avoid the binning in the TProfile
 
     # get Y max and min edges
-    ymax, ymin = -1., 2.
-    for i in range(nbins):
-        if len(values[str(i)]) > 0:
-            if max(values[str(i)]) > ymax:
-                ymax = max(values[str(i)])
-            if min(values[str(i)]) < ymin:
-                ymin = min(values[str(i)])
+    ymax, ymin = acc.max[row][entries>0].max(), acc.min[row][entries>0].min()
+    nclip = acc.outside[row].sum()
+    if nclip > 0:
+        print('WARNING: {} probability ratios of trigger {} are outside [{}, {}] (observed range [{}, {}]) '
+              'and were clipped into the edge bins: the medians are biased. Consider a wider ratio range.'
+              .format(nclip, trig, acc.value_edges[0], acc.value_edges[-1], ymin, ymax))
+        ymin, ymax = max(ymin, acc.value_edges[0]), min(ymax, acc.value_edges[-1])
 
     histo_name = in_prefix + '_' + channel + '_' + var + '_' + weightvar + '_' + trig
     graph_xvals, graph_yvals = ([] for _ in range(2))
@@ -145,25 +150,22 @@ def draw_single_eff( ref_obj, indir_union, indir_eff, channel, var, weightvar, t
 
     weights2d_mc = TH2D( histo_name + '_weights', histo_name + '_weights',
                          nbins, array.array('d', edges),
-                         nbins_eff, ymin, ymax )
+                         len(acc.value_edges)-1, array.array('d', acc.value_edges) )
     
     for ix in range(nbins):
-        yvals = values[str(ix)]
-        yvals_count = len(yvals)
         fake_xval = (edges[ix]+edges[ix+1])/2 #used only for filling the correct bin
         graph_xvals.append( fake_xval )
         graph_exvals_low.append( abs(fake_xval-edges[ix]) )
         graph_exvals_high.append( abs(fake_xval-edges[ix+1]) )
-        if yvals_count>0:
-            yvals_median = np.median(yvals) #avoid the binning in the TProfile
-            graph_yvals.append(yvals_median)
+        if entries[ix]>0:
+            graph_yvals.append(medians[ix])
 
             # Currently assuming zero error for the median of P_{Data}/P_{MC}. CHANGE!!!!!!!!!!!
             graph_eyvals_low.append( 0. )
             graph_eyvals_high.append( 0. )
 
-            for yval in yvals:
-                weights2d_mc.Fill(fake_xval, yval)
+            for iy, content in enumerate(acc.hist[row, ix]):
+                weights2d_mc.SetBinContent(ix+1, iy+1, content)
         else:
             graph_yvals.append(0.)
             graph_eyvals_low.append(0.)
@@ -237,8 +239,9 @@ def draw_single_eff( ref_obj, indir_union, indir_eff, channel, var, weightvar, t
     weights2d_canvas.cd()
 
     weights2d_mc.GetYaxis().SetTitle('P_{Data} / P_{MC}')
+    weights2d_mc.GetYaxis().SetRangeUser(ymin, ymax)
     weights2d_mc.GetYaxis().SetTitleOffset(.7)
-    weights2d_mc.GetXaxis().SetTitle( get_display_variable_name(channel, var) )
+    weights2d_mc.GetXaxis().SetTitle( utils.get_display_variable_name(channel, var) )
     weights2d_mc.GetXaxis().SetLabelOffset(0.)
     weights2d_mc.SetLineColor(1)
     weights2d_mc.SetLineWidth(2)
@@ -271,16 +274,12 @@ def draw_single_eff( ref_obj, indir_union, indir_eff, channel, var, weightvar, t
     prof_canvas = TCanvas( prof_canvas_name, prof_canvas_name, 600, 600 )
     prof_canvas.cd()
 
-    eff1d_name = eff_prefix + data_name + '_' + mc_name + '_' + channel + '_' + var + '_' + trig + subtag + '*root'    
-    eff1d_name = os.path.join(indir_eff, channel, var, eff1d_name)
-    glob_name = glob.glob(eff1d_name)
-    assert len(glob_name) > 0
     # CHANGE!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
-    eff1d_name = min(glob_name, key=len) #select the shortest string (NoCut)
-    eff1d_file = TFile.Open(eff1d_name)
+    cuts = [c for v,t,c in effs.keys() if v == var and t == trig]
+    assert len(cuts) > 0
+    eff1d = effs.get(var, trig, min(cuts, key=len)) #select the shortest string (NoCut)
 
-    eff1d_data = utils.get_root_object('Data', eff1d_file)
-    eff1d_mc = utils.get_root_object('MC', eff1d_file)
+    eff1d_data, eff1d_mc = (to_graph(eff1d['edges'][0], eff1d[k]) for k in ('eff_data', 'eff_mc'))
 
     for point in range(nbins):
         orig_yvalue = eff_prof.GetPointY(point)
@@ -418,7 +417,7 @@ def draw_single_eff( ref_obj, indir_union, indir_eff, channel, var, weightvar, t
         eu_mc.append( eff1d_mc.GetErrorYhigh(i) )
         ed_mc.append( eff1d_mc.GetErrorYlow(i) )
         if debug:
-            print('xp[{}] = {} - yp[{}] = {} +{}/-{}\n'.format(i,x_mc[i],iy_mc[i],eu_mc[i],ed_mc[i]))
+            print('xp[{}] = {} - yp[{}] = {} +{}/-{}\n'.format(i,x_mc[i],i,y_mc[i],eu_mc[i],ed_mc[i]))
 
         x_prof.append( ctypes.c_double(0.) )
         y_prof.append( ctypes.c_double(0.) )
@@ -569,12 +568,12 @@ def _get_plot_name(chn, var, wvar, trig, subtag, prefix):
     add = chn + '_' + var + '_' + wvar + '_' + trig
     prefix = 'Closure' + prefix + '_'
     n = prefix + add + subtag
-    n += lc._placeholder_cuts
+    n += main.placeholder_cuts
     return n
 
 #@set_pure_input_namespace
 def run_closure_outputs(outdir, channel, variables, weightvars, triggers, subtag):
-    outputs = [[] for _ in range(len(lc._extensions[:-1]))]
+    outputs = [[] for _ in range(len(main.extensions[:-1]))]
     outdict = {} #redundant but convenient
 
     for var in variables:
@@ -592,7 +591,7 @@ def run_closure_outputs(outdir, channel, variables, weightvars, triggers, subtag
                 thisbase = os.path.join(outdir, channel, var, 'Closure')
                 utils.create_single_dir( thisbase )
 
-                for ext,out in zip(lc._extensions[:-1], outputs):
+                for ext,out in zip(main.extensions[:-1], outputs):
                     outdict[var][weightvar][trig][ext] = {}
 
                     weights2d_full = os.path.join( thisbase, weights2d_name + '.' + ext )
@@ -610,86 +609,100 @@ def run_closure_outputs(outdir, channel, variables, weightvars, triggers, subtag
 
 def run_closure( indir_union,
                  indir_eff,
+                 indir_json,
                  outdir,
+                 binedges_fname,
                  channel,
                  variables,
                  triggers,
+                 mc_processes,
                  subtag,
                  in_prefix,
-                 eff_prefix,
                  data_name,
                  mc_name,
+                 configuration,
                  debug ):
     gStyle.SetOptStat(0)
     gStyle.SetOptTitle(0)
     gStyle.SetPaintTextFormat("4.4f");
 
-    edges, nbins = utils.load_binning(afile=args.binedges_fname, key=args.subtag,
-                                      variables=args.variables, channels=[channel])
+    config_module = importlib.import_module(configuration)
+    edges, nbins = utils.load_binning(afile=binedges_fname, key=subtag,
+                                      variables=variables, channels=[channel])
 
     # load efficiency variables obtained previously
     effvars = {}
-    json_name = os.path.join(args.indir_json,
+    json_name = os.path.join(indir_json,
                              'runVariableImportanceDiscriminator_{}.json'.format(channel))
     with open(json_name, 'r') as f:
         effvars[channel] = json.load(f)
-    weightvars = effvars[channel][utils.generate_trigger_combinations(channel, triggers)[0][0]][0]
+    first = utils.join_name_trigger_intersection(
+        utils.generate_trigger_combinations(channel, triggers, config_module.exclusive)[0])
+    weightvars = effvars[channel][first][0] #any trigger works for the constant list
     
     _, outs = run_closure_outputs(outdir, channel, variables, weightvars, triggers, subtag)
-    
-    for ivar,var in enumerate(lc._variables_unionweights):
-        #any trigger works for the constant list
-        for weightvar in weightvars:
-            ref_obj = get_ref_obj( indir_union, channel, var, weightvar,
-                                   nbins[var][channel], edges[var][channel], in_prefix,
-                                   subtag )
 
-            for trig in triggers:
-                weights2d_names  = [ outs[var][weightvar][trig][x]['weights2d']  for x in lc._extensions[:-1] ]
-                prof_names = [ outs[var][weightvar][trig][x]['prof'] for x in lc._extensions[:-1] ]
-                ref_names = [ outs[var][weightvar][trig][x]['ref'] for x in lc._extensions[:-1] ]
-                draw_single_eff( ref_obj, indir_union, indir_eff, channel, var, weightvar, trig,
-                                 nbins[var][channel], edges[var][channel],
-                                 in_prefix, eff_prefix,
-                                 data_name, mc_name,
-                                 weights2d_names, prof_names, ref_names,
-                                 subtag, debug )
-
-parser = argparse.ArgumentParser(description='Draw trigger scale factors')
-
-parser.add_argument('--binedges_fname', dest='binedges_fname', required=True, help='where the bin edges are stored')
-parser.add_argument('--indir_eff', required=True,
-                    help='Input directory for data and unweighted MC efficiencies')
-parser.add_argument('--indir_union', required=True,
-                    help='Input directory for MC corrected efficiencies')
-parser.add_argument('--indir_json'
-                    , help='Input directory where discriminator JSON files are stored',
-                    required=True)
-parser.add_argument('--in_prefix', dest='in_prefix', required=True,
-                    help='Closure data prefix.')
-parser.add_argument('--eff_prefix', dest='eff_prefix', required=True,
-                    help='Data and unweighted MC efficiencies prefix.')
-parser.add_argument('--mc_processes', dest='mc_processes', required=True, nargs='+', type=str,
-                    help='Different MC processes considered.')
-parser.add_argument('--outdir', help='Output directory', required=True, )
-parser.add_argument('--channel', dest='channel', required=True,
-                    help='Select the channels over which the workflow will be run.' )
-parser.add_argument('--variables', dest='variables', required=True, nargs='+', type=str,
-                    help='Select the variables over which the workflow will be run.' )
-parser.add_argument('--closure_single_trigger', dest='closure_single_trigger', nargs='+',
-                    type=str, required=True,
-                    help='Triggers considered for the closure. Originally used to find the expected perfect closure for a single trigger efficiency.')
-parser.add_argument('--subtag', dest='subtag', required=True, help='subtag')
-parser.add_argument('--data_name', dest='data_name', required=True, help='Data sample name')
-parser.add_argument('--mc_name', dest='mc_name', required=True, help='MC sample name')
-
-parser.add_argument('--debug', action='store_true', help='debug verbosity')
-args = utils.parse_args(parser)
-
-run_closure( args.indir_union, args.indir_eff,
-             args.outdir,
-             args.channel, args.variables, args.closure_single_trigger,
-             args.subtag,
-             args.in_prefix, args.eff_prefix,
-             args.data_name, args.mc_name,
-             args.debug )
+    # single pass over the union outputs, for all plots
+    moments, rows = reduce_union_outputs(indir_union, channel, in_prefix, subtag,
+                                         mc_processes, triggers[0])
+
+    store = scale_factors.store_path(indir_eff, data_name, mc_name, channel, subtag)
+    with scale_factors.EfficiencyStore(store) as effs:
+        for var in [x for x in main.var_unionweights if x in variables]:
+            #any trigger works for the constant list
+            for weightvar in weightvars:
+                acc = moments.get((var, weightvar))
+                ref_obj = get_ref_obj( acc, nbins[var][channel], edges[var][channel] )
+
+                for trig in triggers:
+                    weights2d_names  = [ outs[var][weightvar][trig][x]['weights2d']  for x in main.extensions[:-1] ]
+                    prof_names = [ outs[var][weightvar][trig][x]['prof'] for x in main.extensions[:-1] ]
+                    ref_names = [ outs[var][weightvar][trig][x]['ref'] for x in main.extensions[:-1] ]
+                    draw_single_eff( ref_obj, acc, rows, effs, channel, var, weightvar, trig,
+                                     nbins[var][channel], edges[var][channel],
+                                     in_prefix,
+                                     weights2d_names, prof_names, ref_names,
+                                     debug )
+
+# -- Parse options
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Draw trigger scale factors')
+
+    parser.add_argument('--binedges_fname', dest='binedges_fname', required=True, help='where the bin edges are stored')
+    parser.add_argument('--indir_eff', required=True,
+                        help='Input directory for data and unweighted MC efficiencies')
+    parser.add_argument('--indir_union', required=True,
+                        help='Input directory for MC corrected efficiencies')
+    parser.add_argument('--indir_json'
+                        , help='Input directory where discriminator JSON files are stored',
+                        required=True)
+    parser.add_argument('--in_prefix', dest='in_prefix', required=True,
+                        help='Closure data prefix.')
+    parser.add_argument('--mc_processes', dest='mc_processes', required=True, nargs='+', type=str,
+                        help='Different MC processes considered.')
+    parser.add_argument('--outdir', help='Output directory', required=True, )
+    parser.add_argument('--channel', dest='channel', required=True,
+                        help='Select the channels over which the workflow will be run.' )
+    parser.add_argument('--variables', dest='variables', required=True, nargs='+', type=str,
+                        help='Select the variables over which the workflow will be run.' )
+    parser.add_argument('--closure_single_trigger', dest='closure_single_trigger', nargs='+',
+                        type=str, required=True,
+                        help='Triggers considered for the closure. Originally used to find the expected perfect closure for a single trigger efficiency.')
+    parser.add_argument('--subtag', dest='subtag', required=True, help='subtag')
+    parser.add_argument('--data_name', dest='data_name', required=True, help='Data sample name')
+    parser.add_argument('--mc_name', dest='mc_name', required=True, help='MC sample name')
+    parser.add_argument('--configuration', dest='configuration', required=True,
+                        help='Name of the configuration module to use.')
+
+    parser.add_argument('--debug', action='store_true', help='debug verbosity')
+    args = utils.parse_args(parser)
+
+    run_closure( args.indir_union, args.indir_eff, args.indir_json,
+                 args.outdir, args.binedges_fname,
+                 args.channel, args.variables, args.closure_single_trigger,
+                 args.mc_processes,
+                 args.subtag,
+                 args.in_prefix,
+                 args.data_name, args.mc_name,
+                 args.configuration,
+                 args.debug )
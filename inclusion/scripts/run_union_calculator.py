@@ -10,133 +10,61 @@ parent_dir = os.path.abspath(__file__ + 3 * '/..')
 sys.path.insert(0, parent_dir)
 
 import inclusion
-from inclusion import selection
-from inclusion import config.main
+from inclusion import selection, union, accumulators
+from inclusion.config import main
 from inclusion.utils import utils
-from inclusion.utils.utils import join_name_trigger_intersection as joinNTC
-from inclusion.utils.utils import generate_trigger_combinations as gtc
 
 import h5py
 import re
-import glob
 import json
 import argparse
 import numpy as np
 import importlib
+import uproot as up
 
-import ROOT
-ROOT.gROOT.SetBatch(True)
+# compact histogram of the probability ratios (data/MC) kept per bin, within `--ratio_range`
+ratio_nbins = 200
 
-def eff_extractor(args, triggers, chn, effvars, nbins):
+def union_tables(args, triggers, chn, weightvars):
     """
-    Extracts the efficiencies for data and MC to be used as scale factors
-    Returns a dictionary with al efficiencies.
+    Union efficiencies for data and MC of all subsets of `triggers`, per bin of each weight
+    variable, with shape (nbins, 2**ntriggers), and the bin edges.
+    Each subset is indexed by a mask where bit `i` stands for `triggers[i]`.
+    The intersection efficiencies are memory-mapped from the lookup table of the channel.
     """
-    efficiencies_data, efficiencies_data_ehigh, efficiencies_data_elow = ({} for _ in range(3))
-    efficiencies_mc, efficiencies_mc_ehigh, efficiencies_mc_elow = ({} for _ in range(3)) 
-        
-    for tcomb in gtc(chn, triggers):
-        tcstr = joinNTC(tcomb)
-        comb_vars = effvars[tcstr][0]
+    lut = union.LookupTable(union.lookup_path(args.indir_eff, args.data_name, args.mc_name,
+                                              chn, args.subtag))
+    if lut.triggers != tuple(triggers):
+        raise ValueError('The lookup table was built for triggers {}, not {}.'.format(lut.triggers, triggers))
+    return {var: (lut.edges(var),) + lut.unions(var) for var in weightvars}
 
-        assert len(comb_vars)==4
-
-        for var in comb_vars:        
-            in_base_name = ( '_'.join(args.data_name, args.mc_name, chn, var, 'TRG', tcstr, 'CUTS*') +
-                             args.subtag + '.root' )
-            in_name = os.path.join(args.indir_eff, chn, var, in_base_name)
-            glob_name = glob.glob(in_name)
-
-            if len(glob_name) != 0: #some triggers do not fire for some channels: Ele32 for mutau (for example)
-                efficiencies_data.setdefault(tcstr, {})
-                efficiencies_data[tcstr][var] = []
-                efficiencies_data_elow.setdefault(tcstr, {})
-                efficiencies_data_elow[tcstr][var] = []
-                efficiencies_data_ehigh.setdefault(tcstr, {})
-                efficiencies_data_ehigh[tcstr][var] = []
-
-                efficiencies_mc.setdefault(tcstr, {})
-                efficiencies_mc[tcstr][var] = []
-                efficiencies_mc_elow.setdefault(tcstr, {})
-                efficiencies_mc_elow[tcstr][var] = []
-                efficiencies_mc_ehigh.setdefault(tcstr, {})
-                efficiencies_mc_ehigh[tcstr][var] = []
-                
-                # CHANGE!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
-                in_file_name = min(glob_name, key=len) #select the shortest string (NoCut)
-
-                in_file = ROOT.TFile.Open(in_file_name, 'READ')
-                key_list = ROOT.TIter(in_file.GetListOfKeys())
-                for key in key_list:
-                    obj = key.ReadObj()
-                    
-                    if obj.GetName() == 'Data1D':
-                        for datapoint in range(obj.GetN()):
-                            efficiencies_data[tcstr][var].append( obj.GetPointY(datapoint) )
-                            efficiencies_data_elow[tcstr][var].append( obj.GetErrorYlow(datapoint) )
-                            efficiencies_data_ehigh[tcstr][var].append( obj.GetErrorYhigh(datapoint) )               
-                    elif obj.GetName() == 'MC1D':
-                        for datapoint in range(obj.GetN()):
-                            efficiencies_mc[tcstr][var].append( obj.GetPointY(datapoint) )
-                            efficiencies_mc_elow[tcstr][var].append( obj.GetErrorYlow(datapoint) )
-                            efficiencies_mc_ehigh[tcstr][var].append( obj.GetErrorYhigh(datapoint) )
-                    elif obj.GetName() == 'SF1D':
-                        pass
-                    else:
-                        raise ValueError('It must be either Data or MC. It was {}.'.format(obj.GetName()))
-                assert len(efficiencies_data[tcstr][var]) > 0
-                assert len(efficiencies_mc[tcstr][var]) > 0
-
-    return ( (efficiencies_data, efficiencies_data_ehigh, efficiencies_data_elow),
-             (efficiencies_mc,   efficiencies_mc_ehigh,   efficiencies_mc_elow) )
-
-
-def prob_calculator(efficiencies, effvars, entries, channel, closure_single_trigger, binedges):
+def prob_calculator(tables, entries, mask):
     """
-    Calculates the probabilities of this event to fire at least one of the triggers under study.
+    Calculates the probabilities of the events to fire at least one of the triggers in `mask`,
+    for data and MC, with shape (nweightvars, nevents), and the number of values
+    of each weight variable below and above its bin edges (see `utils.find_bins`).
+    The union of the intersection efficiencies is evaluated once per bin by `union.union_probabilities`,
+    and each event reads the bin of its weight variable.
 
     Section 4.3.4 of the following paper:
     Lendermann V et al. Combining Triggers in HEP data analysis.
-    Nucl Instruments Methods Phys Res Sect A Accel Spectrometers, 
+    Nucl Instruments Methods Phys Res Sect A Accel Spectrometers,
     Detect Assoc Equip. 2009;604(3):707-718.
     doi:10.1016/j.nima.2009.03.173
     """
-    nweight_vars = 4 #dau1_pt, dau1_eta, dau2_pt, dau2_eta
-    prob_data, prob_mc = ([0 for _ in range(nweight_vars)] for _ in range(2))
-
-    for tcomb in gtc(channel, closure_single_trigger):
-        joincomb = joinNTC(tcomb)
-
-        if joincomb in efficiencies[1][0] and joincomb not in efficiencies[0][0]:
-            raise ValueError('This should never happen. Cannot be in MC but not in data.')
-
-        #some triggers do not fire for some channels: Ele32 for mutau (for example)
-        if joincomb in efficiencies[0][0]:
-            variables = effvars[joincomb][0] #constant 1D variables, check [1] and [2] for changing ones
-            values = [ entries[x] for x in variables ]
-            assert len(variables) == 4 #Change according to the variable discriminator
-            assert len(variables) == nweight_vars
-
-            for iw,weightvar in enumerate(variables):
-                # The following is 1D only CHANGE!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
-                binid = utils.find_bin(binedges[weightvar][channel], values[iw], weightvar)
-                term_data = efficiencies[0][0][joincomb][weightvar][binid-1]
-                term_mc   = efficiencies[1][0][joincomb][weightvar][binid-1]
-
-                if len(tcomb)%2==0:
-                    prob_data[iw] -= term_data
-                    prob_mc[iw]   -= term_mc
-                else:
-                    prob_data[iw] += term_data
-                    prob_mc[iw]   += term_mc
-
-    return prob_data, prob_mc
+    prob_data, prob_mc, outside = [], [], {}
+    for weightvar, (edges, table_data, table_mc) in tables.items():
+        bins, outside[weightvar] = utils.find_bins(edges, entries[weightvar])
+        bins -= 1
+        prob_data.append(table_data[bins, mask])
+        prob_mc.append(table_mc[bins, mask])
+    return np.array(prob_data), np.array(prob_mc), outside
 
 def run_union_weights_calculator_outputs(args, proc):
     outputs = []
 
     exp = re.compile('output(_[0-9]{1,5}).root')
-    inputs, _ = utils.get_root_input_files(proc, [args.indir_root])
+    inputs, _ = utils.get_root_inputs(proc, [args.indir_root])
     folder = os.path.join( args.outdir, proc, 'Closure_' + args.closure_single_trigger[0] )
     os.system('mkdir -p {}'.format(folder))
     
@@ -159,122 +87,107 @@ def run_union_weights_calculator(args, single_trigger_closure=False):
 
     binedges, nbins = utils.load_binning(afile=args.binedges_fname, key=args.subtag,
                                          variables=args.variables, channels=args.channels)
-    # open input ROOT file
+    config_module = importlib.import_module(args.configuration)
+    triggers = tuple(config_module.triggers)
+    # all triggers enter the master formula
+    all_mask = (1 << len(triggers)) - 1
+
+    # input ROOT file
     fname = os.path.join(args.indir_root, args.sample, args.file_name)
     if not os.path.exists(fname):
         raise ValueError('[' + os.path.basename(__file__) + '] {} does not exist.'.format(fname))
-    f_in = ROOT.TFile( fname )
-    t_in = f_in.Get('HTauTauTree')
 
-    outdata = h5py.File(output, mode='w')
-    prob_ratios, ref_prob_ratios = ({} for _ in range(2))
-    effvars = {}
-    efficiencies = {}
+    effvars, tables, moments = {}, {}, {}
+    ratio_edges = np.linspace(*args.ratio_range, ratio_nbins+1)
+    # values below and above the bin edges, of the binning and weight variables
+    nout_var = {chn: {var: np.zeros(2, dtype=np.int64) for var in main.var_unionweights}
+                for chn in args.channels}
+    nout_weight = {}
     for chn in args.channels:
-        outdata.create_group(chn)
-        prob_ratios[chn], ref_prob_ratios[chn] = ({} for _ in range(2))
-        
         # load efficiency variables obtained previously
         json_name = os.path.join(args.indir_json,
                                  'runVariableImportanceDiscriminator_{}.json'.format(chn))
         with open(json_name, 'r') as f:
             effvars[chn] = json.load(f)
+        first = utils.join_name_trigger_intersection(
+            utils.generate_trigger_combinations(chn, triggers, config_module.exclusive)[0])
+        weightvars = effvars[chn][first][0] #any trigger works for the constant list
+        assert len(weightvars) == 4 #dau1_pt, dau1_eta, dau2_pt, dau2_eta
+
+        tables[chn] = union_tables(args, triggers, chn, weightvars)
+        nout_weight[chn] = {wv: np.zeros(2, dtype=np.int64) for wv in weightvars}
+        # first row for all events (reference), then one row per trigger
+        moments[chn] = {var: {wv: accumulators.BinnedMoments((1+len(triggers), nbins[var][chn]), ratio_edges)
+                              for wv in weightvars}
+                        for var in main.var_unionweights}
+
+    _entries = utils.define_used_tree_variables(config_module.custom_cut)
+    _entries += tuple(args.variables) + main.var_unionweights
+    _entries = sorted(set(_entries))
+
+    nentries = 0
+    t_in = up.open(fname + ':HTauTauTree')
+    for entries in t_in.iterate(_entries, library='np'):
+        nentries += len(entries['triggerbit'])
+        print('Processed {} entries.'.format(nentries))
+
+        sel = selection.EventSelectionArray(entries, isdata=False, year=args.year,
+                                            configuration=config_module)
 
-        config_module = importlib.import_module(args.configuration)
-        
-        # load efficiencies
-        efficiencies[chn] = eff_extractor(args, config_module.triggers, chn, effvars[chn], nbins)
-        
-        # initialization
-        for var in main.var_unionweights:
-            outdata[chn].create_group(var)
-            prob_ratios[chn][var] = {}
-            ref_prob_ratios[chn][var] = {}
-            for weightvar in effvars[chn][utils.gtc(chn, config_module.triggers)[0][0]][0]: #any trigger works for the constant list
-                outdata[chn][var].create_group(weightvar)
-                prob_ratios[chn][var][weightvar] = {}
-                ref_prob_ratios[chn][var][weightvar] = {}
-                for trig in config_module.triggers:
-                    outdata[chn][var][weightvar].create_group(trig)
-                    prob_ratios[chn][var][weightvar][trig] = {}
-                    for ibin in range(nbins[var][chn]):
-                        if trig==config_module.triggers[0]: #reference
-                            outdata[chn][var][weightvar].create_group(str(ibin))
-                        outdata[chn][var][weightvar][trig].create_group(str(ibin))
-                        prob_ratios[chn][var][weightvar][trig][str(ibin)] = []
-                        ref_prob_ratios[chn][var][weightvar].setdefault(str(ibin), [])
-
-    t_in.SetBranchStatus('*', 0)
-    _entries = ('triggerbit', 'RunNumber',
-                'HHKin_mass', 'pairType', 'dau1_eleMVAiso', 'dau1_iso', 'dau1_deepTauVsJet', 'dau2_deepTauVsJet',
-                'nleps', 'nbjetscand', 'tauH_SVFIT_mass', 'bH_mass_raw',)
-    _entries += args.variables
-    _entries += main.var_unionweights
-    for ientry in _entries:
-        t_in.SetBranchStatus(ientry, 1)
-
-    nentries = t_in.GetEntriesFast()
-    for ientry,entry in enumerate(t_in):
-        if ientry%10000==0:
-             print('Processed {} entries out of {}.'.format(ientry, nentries))
-
-        # this is slow: do it once only
-        entries = utils.dot_dict({x: getattr(entry, x) for x in _entries})
-        
-        sel = selection.EventSelection(entries, dataset, isdata, configuration=config_module)
-        
         for chn in args.channels:
-            if not utils.is_channel_consistent(chn, entries.pairType):
+            chn_mask = sel.channel_mask(chn)
+            if not chn_mask.any():
                 continue
+            chn_entries = {k: v[chn_mask] for k,v in entries.items()}
 
-            #triggers_for_master_formula = args.closure_single_trigger if single_trigger_closure else args.triggers
-            triggers_for_master_formula = ['IsoMu24', 'METNoMu120']
-
-            prob_data, prob_mc = prob_calculator(efficiencies[chn],
-                                                 effvars[chn],
-                                                 lfm,
-                                                 chn,
-                                                 triggers_for_master_formula,
-                                                 binedges)
-
-            prob_ratio = []
-            # loop over weight variables: dau1_pt, dau1_eta, dau2_pt, dau2_eta
-            for ivar, (pd,pm) in enumerate(zip(prob_data,prob_mc)):
-                if ivar == 0:
-                    print('First discriminator variable, Channel={}, ProbData={}, ProbMC={}'.format(chn,pd, pm))
-                if pm==0.:
-                    prob_ratio.append( 0. )
-                    print('WARNING: Appending 0 for channel {}.'.format(chn))
-                else:
-                    prob_ratio.append( pd/pm )
-            assert len(effvars[chn][gtc(chn, config_module.triggers)[0][0]][0]) == len(prob_ratio)
-            print('\n')
+            prob_data, prob_mc, outside = prob_calculator(tables[chn], chn_entries, all_mask)
+            for weightvar in outside:
+                nout_weight[chn][weightvar] += outside[weightvar]
+            prob_ratio = np.divide(prob_data, prob_mc, out=np.zeros_like(prob_data), where=prob_mc!=0.)
+            if (prob_mc == 0.).any():
+                print('WARNING: Using 0 for {} null MC probabilities in channel {}.'
+                      .format((prob_mc == 0.).sum(), chn))
 
             if single_trigger_closure:
+                fired = {trig: sel.trigger_bits(trig)[chn_mask] for trig in triggers}
                 for var in main.var_unionweights:
-                    val = entries[var]
-                    binid = utils.find_bin(binedges[var][chn], val, var)
-                    for iw,weightvar in enumerate(effvars[chn][gtc(chn, config_module.triggers)[0][0]][0]): #any trigger works for the constant list
-                        ref_prob_ratios[chn][var][weightvar][str(binid-1)].append(prob_ratio[iw])
-                        for trig in config_module.triggers:
-                            ptb = sel.trigger_bits(trig)
-                            if ptb:
-                                prob_ratios[chn][var][weightvar][trig][str(binid-1)].append(prob_ratio[iw])
+                    binid, outside = utils.find_bins(binedges[var][chn], chn_entries[var])
+                    binid -= 1
+                    nout_var[chn][var] += outside
+                    for iw, weightvar in enumerate(tables[chn]):
+                        acc = moments[chn][var][weightvar]
+                        acc.fill((np.zeros_like(binid), binid), prob_ratio[iw])
+                        for itrig, trig in enumerate(triggers):
+                            acc.fill((np.full(fired[trig].sum(), itrig+1), binid[fired[trig]]),
+                                     prob_ratio[iw][fired[trig]])
+
+    for chn in args.channels:
+        for kind, nout in (('binning', nout_var[chn]), ('weight', nout_weight[chn])):
+            for var, (nunder, nover) in nout.items():
+                if nunder > 0 or nover > 0:
+                    print('WARNING: {} values of the {} variable {} ({} below the first and {} above the last '
+                          'bin edge) were assigned to the edge bins for channel {}.'
+                          .format(nunder + nover, kind, var, nunder, nover, chn))
+        for var in main.var_unionweights:
+            if single_trigger_closure:
+                nclip = sum(acc.outside[0].sum() for acc in moments[chn][var].values())
+                if nclip > 0:
+                    print('WARNING: {} probability ratios outside [{}, {}] for variable {} and channel {} '
+                          'were clipped into the edge bins.'.format(nclip, *args.ratio_range, var, chn))
 
     # no output if the closure will not be calculated
-    if single_trigger_closure:
-        for chn in args.channels:
-            for var in main.var_unionweights:
-                for weightvar in effvars[chn][gtc(chn, config_module.triggers)[0][0]][0]: #any trigger works for the constant list
-                    for trig in config_module.triggers:
-                        for ibin in range(nbins[var][chn]):
-                            outdata[chn][var][weightvar][trig][str(ibin)]['prob_ratios'] = prob_ratios[chn][var][weightvar][trig][str(ibin)]
-                            if trig==config_module.triggers[0]:
-                                outdata[chn][var][weightvar][str(ibin)]['ref_prob_ratios'] = ref_prob_ratios[chn][var][weightvar][str(ibin)]
+    with h5py.File(output, mode='w') as outdata:
+        if single_trigger_closure:
+            for chn in args.channels:
+                for var in main.var_unionweights:
+                    for weightvar in tables[chn]:
+                        group = outdata.create_group('/'.join((chn, var, weightvar)))
+                        moments[chn][var][weightvar].write(group)
+                        group.attrs['rows'] = np.array(('ref',) + triggers, dtype='S')
+
+        outdata.attrs['doc'] = ( 'Moments and histograms of the probability ratios (data/MC) per bin'
+                                 ' for all channels, variables and triggers' )
 
-    outdata.attrs['doc'] = ( 'Probability ratios (data/MC) and counts per bin for all'
-                             ' channels, variables and triggers' )
-                
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Choose the most significant variables to draw the efficiencies.')
 
@@ -291,18 +204,20 @@ if __name__ == '__main__':
     parser.add_argument('--outprefix', dest='outprefix', required=True, help='Out histos prefix.')
     parser.add_argument('--data_name', dest='data_name', required=True, help='Data sample name')
     parser.add_argument('--mc_name', dest='mc_name', required=True, help='MC sample name')
-    parser.add_argument('--triggers', dest='triggers', nargs='+', type=str, required=True,
-                        help='Triggers included in the workflow.')
     parser.add_argument('--closure_single_trigger', dest='closure_single_trigger', nargs='+', type=str, required=True,
                         help='Single trigger considered for the closure.')
     parser.add_argument('--channels',    dest='channels',    required=True, nargs='+', type=str,  
                         help='Select the channels over which the workflow will be run.' )
     parser.add_argument('--variables', dest='variables', required=True, nargs='+', type=str,
                         help='Workflow variables considered.')
+    parser.add_argument('--year', default='2018', type=str,
+                        choices=('2016', '2016APV', '2017', '2018'), help='Period/era.')
     parser.add_argument('-t', '--tag', help='string to differentiate between different workflow runs', required=True)
     parser.add_argument('--subtag', dest='subtag', required=True, help='subtag')
     parser.add_argument('--configuration', dest='configuration', required=True,
                         help='Name of the configuration module to use.')
+    parser.add_argument('--ratio_range', nargs=2, type=float, default=(0., 2.),
+                        help='Range of the stored probability ratios (data/MC); values outside are clipped into the edge bins.')
     parser.add_argument('--debug', action='store_true', help='debug verbosity')
     args = utils.parse_args(parser)
     
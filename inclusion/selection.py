@@ -1,6 +1,6 @@
 # coding: utf-8
 
-_all_ = [ 'EventSelection' ]
+_all_ = [ 'CutCombinations', 'EventSelection', 'EventSelectionArray', 'SelectionPlan' ]
 
 import os
 import sys
@@ -10,13 +10,36 @@ sys.path.insert(0, parent_dir)
 import inclusion
 from inclusion import config
 from inclusion.config import main
+from inclusion.cuts import parse_cut
+from inclusion.triggers import TriggerDecoder, trigger_bit_ranges
 
 import functools
+import operator
 from collections import defaultdict
 import itertools as it
+from types import SimpleNamespace
+import numpy as np
+
+# DeepJet working points (loose, medium)
+deepjet_wp = {'2016'    : (0.048, 0.2489),
+              '2016APV' : (0.0508, 0.2598),
+              '2017'    : (0.0532, 0.3040),
+              '2018'    : (0.0490, 0.2783)}
+
+# Loose / Medium / Tight
+iso_allowed = { 'dau1_ele': 1., 'dau1_mu': 0.15, 'dau2_mu': 0.15,
+                'dau1_tau': 5., 'dau2_tau': 5. }
+
+def cut_flag_name(var, sign, val):
+    """Name of a cut on a trigger variable, for instance 'metnomu_et_>_120p5'."""
+    return ('_'.join([str(x) for x in [var,sign,val]])).replace('.','p')
+
+def cuts_ignored_for(avar, variables):
+    """Whether the cut on `avar` is ignored when displaying `variables` (see `main.cuts_ignored`)."""
+    return any(avar in main.cuts_ignored[k] for k in variables if k in main.cuts_ignored)
 
 class EventSelection:
-    def __init__(self, entries, isdata, year='2018', configuration=None, debug=False):
+    def __init__(self, entries, isdata, year='2018', configuration=None, debug=False, plan=None):
         self.entries = entries
         self.bit = self.entries['triggerbit']
         self.run = self.entries['RunNumber']
@@ -29,10 +52,16 @@ class EventSelection:
         # dependency injection
         self.cfg = configuration
 
-        self.datasets, self.dataset_ref_trigs = self._deduce_datasets(self.cfg.inters_general,
-                                                                      self.cfg.inters)
-        for d in self.datasets:
-            assert d in main.data[self.year]
+        # event-independent decisions, shared by all events of a job (see `SelectionPlan`)
+        self.plan = plan
+        self._reference_cache = {}
+        if self.plan is None:
+            self.datasets, self.dataset_ref_trigs = self._deduce_datasets(self.cfg.inters_general,
+                                                                          self.cfg.inters)
+            for d in self.datasets:
+                assert d in main.data[self.year]
+        else:
+            self.datasets, self.dataset_ref_trigs = plan.datasets, plan.dataset_ref_trigs
 
     def any_trigger(self, trigs):
         """
@@ -214,12 +243,31 @@ class EventSelection:
                 return True
         return False    
 
+    def reference_cuts(self, tcomb, channel):
+        """
+        Whether the event enters the denominator of the `tcomb` efficiency, for the
+        combinations in `self.plan.tcombs(channel)`. Equivalent to `dataset_cuts` and
+        `dataset_triggers`, with their event-independent part precomputed.
+        The decision is shared by all combinations using the same reference.
+        """
+        step = self.plan.steps[channel][tcomb]
+        key = (step.lepton_veto, step.ref_trigs, step.in_lep)
+        if key not in self._reference_cache:
+            self._reference_cache[key] = self._reference_decision(step)
+        return self._reference_cache[key]
+
+    def _reference_decision(self, step):
+        if not self.selection_cuts(lepton_veto=step.lepton_veto,
+                                   bjets_cut=self.cfg.bjets_cut,
+                                   mass_cut=self.cfg.mass_cut,
+                                   custom_cut=self.plan.custom_cut):
+            return False
+        lept = self.entries['isLeptrigger'] if step.in_lep else True
+        return bool(lept and self.pass_triggers(step.ref_trigs))
+
     def sel_category(self, category):
         assert category in self.categories
-        deepJetWP = {'2016'    : (0.048, 0.2489),
-                     '2016APV' : (0.0508, 0.2598),
-                     '2017'    : (0.0532, 0.3040),
-                     '2018'    : (0.0490, 0.2783)}[self.year]
+        deepJetWP = deepjet_wp[self.year]
         btagLL = (self.entries['bjet1_bID_deepFlavor'] > deepJetWP[0] and
                   self.entries['bjet2_bID_deepFlavor'] > deepJetWP[0])
         btagM  = ((self.entries['bjet1_bID_deepFlavor'] > deepJetWP[1]
@@ -233,12 +281,12 @@ class EventSelection:
         #               self.entries['bjet2_bID_deepFlavor'] > deepJetWP[1])
         if category == 'baseline':
             specific = True
-        elif category == 'res1b':
-            specific = self.isBoosted != 1 and btagM
-        elif category == 'res2b':
-            specific = self.isBoosted != 1 and btagMM
-        elif category == 'boosted':
-            specific = self.isBoosted == 1 and btagLL
+        elif category == 's1b1jresolvedMcut':
+            specific = self.entries['isBoosted'] != 1 and btagM
+        elif category == 's2b0jresolvedMcut':
+            specific = self.entries['isBoosted'] != 1 and btagMM
+        elif category == 'sboostedLLMcut':
+            specific = self.entries['isBoosted'] == 1 and btagLL
 
         #return common and specific
         return specific
@@ -258,7 +306,8 @@ class EventSelection:
         #     return False
 
         # custom user-provided cut
-        if custom_cut is not None and not eval(custom_cut):
+        custom_cut = parse_cut(custom_cut)
+        if custom_cut is not None and not custom_cut(self.entries):
             return False
         
         pairtype    = self.entries['pairType']
@@ -279,9 +328,6 @@ class EventSelection:
         if nbjetscand <= 1 and bjets_cut:
             return False
 
-        # Loose / Medium / Tight
-        iso_allowed = { 'dau1_ele': 1., 'dau1_mu': 0.15, 'dau2_mu': 0.15,
-                        'dau1_tau': 5., 'dau2_tau': 5. }
         if any(x not in iso_allowed for x in iso_cuts.keys()):
             mes = 'At least one of the keys is not allowed. '
             mes += 'Keys introduced: {}.'.format(iso_cuts.keys())
@@ -291,8 +337,7 @@ class EventSelection:
             return False
         
         # setting to the defaults in case the user did not specify the values
-        for k, v in iso_allowed.items():
-            if k not in iso_cuts: iso_cuts[k] = v
+        iso_cuts = dict(iso_allowed, **iso_cuts)
         
         bool0 = pairtype==0 and (dau1_muiso >= iso_cuts['dau1_mu'] or
                                  dau2_tauiso < iso_cuts['dau2_tau'])
@@ -324,38 +369,15 @@ class EventSelection:
         """
         The VBF trigger was updated during data taking, adding HPS
         https://twiki.cern.ch/twiki/bin/viewauth/CMS/TauTrigger
+        The bits used for each run are defined in 'main.trig_run_ranges'.
         """
         if trigger not in self.cfg.trig_custom:
-            import inspect
-            currentFunction = inspect.getframeinfo(frame).function
-            raise ValueError('[{}] option not supported.'.format(currentFunction))
-
-        if self.run < 317509 and self.isdata:
-            if trigger == 'VBFTauCustom':
-                bits = self.check_bit(main.trig_map[self.year][trigger]['VBFTau']['data'])
-            elif trigger == 'IsoDoubleTauCustom':
-                bits = ( self.check_bit(main.trig_map[self.year][trigger]['IsoDoubleTau']['data'][0]) or
-                         self.check_bit(main.trig_map[self.year][trigger]['IsoDoubleTau']['data'][1]) or
-                         self.check_bit(main.trig_map[self.year][trigger]['IsoDoubleTau']['data'][2]) )
-            elif trigger == 'IsoMuIsoTauCustom':
-                bits = self.check_bit(main.trig_map[self.year][trigger]['IsoMuIsoTau']['data'])
-            elif trigger == 'EleIsoTauCustom':
-                bits = self.check_bit(main.trig_map[self.year][trigger]['EleIsoTau']['data'])
-            elif trigger == 'IsoTau180':
-                bits = self.check_bit(main.trig_map[self.year][trigger]['IsoTau180']['data'])
+            raise ValueError('[set_custom_trigger_bit] option {} not supported.'.format(trigger))
 
-        else:
-            s = 'data' if self.isdata else 'mc'
-            if trigger == 'VBFTauCustom':
-                bits = self.check_bit(main.trig_map[self.year][trigger]['VBFTauHPS'][s])
-            elif trigger == 'IsoDoubleTauCustom':
-                bits = self.check_bit(main.trig_map[self.year][trigger]['IsoDoubleTauHPS'][s])
-            elif trigger == 'IsoMuIsoTauCustom':
-                bits = self.check_bit(main.trig_map[self.year][trigger]['IsoMuIsoTauHPS'][s])
-            elif trigger == 'EleIsoTauCustom':
-                bits = self.check_bit(main.trig_map[self.year][trigger]['EleIsoTauHPS'][s])
-
-        return bits
+        for first, last, bits in trigger_bit_ranges(self.year, trigger, self.isdata):
+            if (first is None or self.run >= first) and (last is None or self.run < last):
+                return any(self.check_bit(b) for b in bits)
+        return False
 
     def should_apply_lepton_veto(self, tcomb):
         """Whether to apply 3rd lepton veto. The veto is always applied to MC."""
@@ -396,8 +418,6 @@ class EventSelection:
         if self.debug:
             print('Trigger={}; Variables={}'.format(trig, variables))
 
-        flagnameJoin = lambda var,sign,val: ('_'.join([str(x) for x in [var,sign,val]])).replace('.','p')
-    
         dflags = defaultdict(lambda: [])
     
         try:
@@ -410,18 +430,14 @@ class EventSelection:
         for avar,acut in trig_cuts.items():
             # ignore cuts according to the user's definition in '_cuts_ignored'
             # example: do not cut on 'met_et' when displaying 'metnomu_et'
-            ignore = functools.reduce( lambda x, y: x or y,
-                                       [ avar in main.cuts_ignored[k] for k in variables
-                                         if k in main.cuts_ignored ],
-                                      False
-                                      )
+            ignore = cuts_ignored_for(avar, variables)
 
             # additionally, by default do not cut on the variable(s) being plotted
             if avar not in variables and not ignore:
                 value = self.entries[avar]
 
                 for c in acut[1]:
-                    flagname = flagnameJoin(avar, acut[0], c)
+                    flagname = cut_flag_name(avar, acut[0], c)
 
                     if self.debug:
                         print('Cut: {} {} {}'.format(avar, acut[0], c))
@@ -448,7 +464,8 @@ class EventSelection:
                 print('----------------------------------------------------')
             
             for comb in combinations:
-                joinFlag = functools.reduce( lambda x,y: x and y, [k[1] for k in comb] )
+                # bitwise AND also supports boolean masks (see `EventSelectionArray`)
+                joinFlag = functools.reduce( lambda x,y: x & y, [k[1] for k in comb] )
                 tmp[ (main.inters_str).join([k[0] for k in comb]) ] = joinFlag
 
             return tmp
@@ -459,3 +476,328 @@ class EventSelection:
             res = {nocut_dummy_str: True}
 
         return res
+
+class EventSelectionArray(EventSelection):
+    """
+    Batch counterpart of `EventSelection`.
+    `entries` is a dictionary of NumPy arrays with one element per event, as
+    returned by `uproot.iterate(..., library='np')`. The methods depending on
+    the event content return boolean masks, while the event-independent ones
+    (datasets, references, ...) are inherited unchanged.
+    """
+    def __init__(self, entries, isdata, year='2018', configuration=None, debug=False, plan=None):
+        super().__init__(entries, isdata, year=year, configuration=configuration, debug=debug, plan=plan)
+        self.nevents = len(self.bit)
+
+        self.decoder = TriggerDecoder(self.cfg.triggers, self.year, self.isdata)
+        self.trigger_matrix = self.decoder.decode(self.bit, self.run)
+        self.trigger_words = self.decoder.pack(self.trigger_matrix)
+
+    def _as_mask(self, value):
+        """Broadcasts scalar decisions to the number of events."""
+        return np.broadcast_to(np.asarray(value, dtype=bool), (self.nevents,))
+
+    def channel_mask(self, channel):
+        """Array equivalent of `utils.is_channel_consistent`."""
+        opdict = { '<':  operator.lt,
+                   '>':  operator.gt,
+                   '==': operator.eq }
+        op, val = main.sel[channel]['pairType']
+        return opdict[op](self.entries['pairType'], val)
+
+    def check_bit(self, bitpos):
+        return ((self.bit >> bitpos) & 1).astype(bool)
+
+    def dataset_cuts(self, tcomb, channel):
+        reference = self.find_inters_for_reference(tcomb, channel)
+        if reference is None:
+            return np.zeros(self.nevents, dtype=bool)
+
+        if not any(x in reference for x in self.datasets):
+            m = "Only datasets {} are supported. You tried using '{}'.".format(self.datasets, reference)
+            raise ValueError(m)
+
+        lepton_veto = self.should_apply_lepton_veto(tcomb)
+
+        return self.selection_cuts(lepton_veto=lepton_veto,
+                                   bjets_cut=self.cfg.bjets_cut,
+                                   mass_cut=self.cfg.mass_cut,
+                                   custom_cut=self.cfg.custom_cut)
+
+    def dataset_triggers(self, tcomb, channel, trigs, dataset):
+        this_processed_dataset = self.dataset_name(dataset)
+        for vals in self.dataset_ref_trigs.values():
+            for v in vals:
+                if v not in trigs:
+                    mes = 'Reference trigger {} is not part of triggers {}.'
+                    raise ValueError(mes.format(v,trigs))
+
+        reference = self.find_inters_for_reference(tcomb, channel)
+        if reference is None:
+            raise OverflowError('Intersection is too long.')
+
+        in_lep = all(x in main.lep_triggers for x in self.dataset_ref_trigs[reference])
+        lept = self._as_mask(self.entries['isLeptrigger'] if in_lep else True)
+        pass_trg = lept & self.pass_triggers(self.dataset_ref_trigs[reference])
+        return pass_trg, self.dataset_ref_trigs[reference]
+
+    def pass_triggers(self, trigs):
+        mask = np.zeros(self.nevents, dtype=bool)
+        for trig in trigs:
+            mask |= self.trigger_bits(trig)
+        return mask
+
+    def _reference_decision(self, step):
+        lept = self._as_mask(self.entries['isLeptrigger'] if step.in_lep else True)
+        return ( self.selection_cuts(lepton_veto=step.lepton_veto,
+                                     bjets_cut=self.cfg.bjets_cut,
+                                     mass_cut=self.cfg.mass_cut,
+                                     custom_cut=self.plan.custom_cut) &
+                 lept & self.pass_triggers(step.ref_trigs) )
+
+    def reference_mask(self, tcomb, channel, trigs, dataset, mask=None):
+        """
+        Events entering the denominator of the `tcomb` efficiency: they pass the
+        selection cuts and the reference triggers of the dataset measuring `tcomb`.
+        Combines `check_inters_with_dataset`, `dataset_cuts` and `dataset_triggers`
+        as the per-event loops do, and returns `None` when `tcomb` is measured
+        with another dataset. `mask` restricts the events being considered.
+        """
+        if not self.check_inters_with_dataset(tcomb, channel, dataset):
+            return None
+
+        ref = self.dataset_cuts(tcomb, channel)
+        if mask is not None:
+            ref = ref & mask
+        if not ref.any(): # `dataset_triggers` is never reached event by event
+            return ref
+        return ref & self.dataset_triggers(tcomb, channel, trigs, dataset)[0]
+
+    def sel_category(self, category):
+        assert category in self.categories
+        deepJetWP = deepjet_wp[self.year]
+        bjet1 = self.entries['bjet1_bID_deepFlavor']
+        bjet2 = self.entries['bjet2_bID_deepFlavor']
+        btagLL = (bjet1 > deepJetWP[0]) & (bjet2 > deepJetWP[0])
+        btagM  = (((bjet1 > deepJetWP[1]) & (bjet2 < deepJetWP[1])) |
+                  ((bjet1 < deepJetWP[1]) & (bjet2 > deepJetWP[1])))
+        btagMM = (bjet1 > deepJetWP[1]) & (bjet2 > deepJetWP[1])
+
+        if category == 'baseline':
+            return np.ones(self.nevents, dtype=bool)
+        elif category == 's1b1jresolvedMcut':
+            return (self.entries['isBoosted'] != 1) & btagM
+        elif category == 's2b0jresolvedMcut':
+            return (self.entries['isBoosted'] != 1) & btagMM
+        elif category == 'sboostedLLMcut':
+            return (self.entries['isBoosted'] == 1) & btagLL
+
+    def selection_cuts(self, iso_cuts=dict(), lepton_veto=True, bjets_cut=True,
+                       mass_cut='inverted', custom_cut=None):
+        """
+        Applies selection cuts to all events.
+        Returns a mask which is `True` only where all selection cuts pass.
+        """
+        mask = np.ones(self.nevents, dtype=bool)
+        custom_cut = parse_cut(custom_cut)
+        if custom_cut is not None:
+            mask &= custom_cut.mask(self.entries)
+
+        pairtype    = self.entries['pairType']
+        dau1_eleiso = self.entries['dau1_eleMVAiso']
+        dau1_muiso  = self.entries['dau1_iso']
+        dau2_muiso  = self.entries['dau2_iso']
+        dau1_tauiso = self.entries['dau1_deepTauVsJet']
+        dau2_tauiso = self.entries['dau2_deepTauVsJet']
+
+        # third lepton veto
+        if lepton_veto:
+            mask &= ~(self.entries['nleps'] > 0)
+
+        # require at least two b jet candidates
+        if bjets_cut:
+            mask &= ~(self.entries['nbjetscand'] <= 1)
+
+        if any(x not in iso_allowed for x in iso_cuts.keys()):
+            mes = 'At least one of the keys is not allowed. '
+            mes += 'Keys introduced: {}.'.format(iso_cuts.keys())
+            raise ValueError(mes)
+
+        mask &= self.entries['isOS'].astype(bool)
+
+        # setting to the defaults in case the user did not specify the values
+        iso_cuts = dict(iso_allowed, **iso_cuts)
+
+        bool0 = (pairtype==0) & ((dau1_muiso >= iso_cuts['dau1_mu']) |
+                                 (dau2_tauiso < iso_cuts['dau2_tau']))
+        bool1 = (pairtype==1) & ((dau1_eleiso != iso_cuts['dau1_ele']) |
+                                 (dau2_tauiso < iso_cuts['dau2_tau']))
+        bool2 = (pairtype==2) & ((dau1_tauiso < iso_cuts['dau1_tau']) |
+                                 (dau2_tauiso < iso_cuts['dau2_tau']))
+        bool3 = (pairtype==3) & ((dau1_muiso >= iso_cuts['dau1_mu']) &
+                                 (dau2_muiso >= iso_cuts['dau2_mu']))
+        mask &= ~(bool0 | bool1 | bool2 | bool3)
+
+        tauH_mass = self.entries['tauH_mass']
+        bH_mass   = self.entries['bH_mass']
+        mcut = (bH_mass > 50) & (bH_mass < 270) & (tauH_mass > 20) & (tauH_mass < 130)
+        mcutinv = (bH_mass < 50) | (bH_mass > 270) | (tauH_mass < 20) | (tauH_mass > 130)
+        opt = ('standard', 'inverted')
+        if mass_cut == opt[0]:
+            mask &= ~mcutinv
+        elif mass_cut == opt[1]:
+            mask &= ~mcut
+        elif mass_cut is not None:
+            mes = 'Mass cut option {} is not supported!'.format(mass_cut)
+            raise ValueError(mes)
+
+        return mask
+
+    def set_custom_trigger_bit(self, trigger):
+        if trigger not in self.cfg.trig_custom:
+            raise ValueError('[set_custom_trigger_bit] option {} not supported.'.format(trigger))
+        return self.trigger_bits(trigger)
+
+    def trigger_bits(self, trig):
+        if trig in self.decoder.index:
+            return self.trigger_matrix[:, self.decoder.index[trig]]
+        return self.decoder.decode_trigger(trig, self.bit, self.run)
+
+    def trigger_intersection(self, tcomb):
+        """Events firing all triggers of the combination."""
+        return self.decoder.passes(self.trigger_words, tcomb)
+
+    def var_cuts(self, trig, variables, nocut_dummy_str):
+        res = super().var_cuts(trig, variables, nocut_dummy_str)
+        return {k: self._as_mask(v) for k,v in res.items()}
+
+class SelectionPlan:
+    """
+    Event-independent part of the selection, computed once per job.
+    For each channel, stores the trigger combinations measured with the dataset
+    being processed (see `EventSelection.check_inters_with_dataset`), together with
+    the lepton veto and the reference triggers of their reference dataset.
+    The reference triggers are validated and the custom cut parsed only once.
+    The cut combinations on the trigger variables are stored in `cuts`.
+    """
+    def __init__(self, isdata, year, configuration, triggercomb, trigs, dataset,
+                 nocut_dummy_str=main.nocut_dummy, intersection_str=main.inters_str):
+        sel = EventSelection({'triggerbit': 0, 'RunNumber': 0}, isdata, year=year,
+                             configuration=configuration)
+        self.datasets = sel.datasets
+        self.dataset_ref_trigs = sel.dataset_ref_trigs
+        sel.dataset_name(dataset)
+        for vals in self.dataset_ref_trigs.values():
+            for v in vals:
+                if v not in trigs:
+                    mes = 'Reference trigger {} is not part of triggers {}.'
+                    raise ValueError(mes.format(v,trigs))
+
+        self.custom_cut = parse_cut(configuration.custom_cut)
+        self.cuts = CutCombinations(configuration, nocut_dummy_str, intersection_str)
+
+        self.steps = {}
+        for chn, tcombs in triggercomb.items():
+            self.steps[chn] = {}
+            for tcomb in tcombs:
+                if not sel.check_inters_with_dataset(tcomb, chn, dataset):
+                    continue
+                reference = sel.find_inters_for_reference(tcomb, chn)
+                if reference is None: # `dataset_cuts` never passes
+                    continue
+                if not any(x in reference for x in self.datasets):
+                    m = "Only datasets {} are supported. You tried using '{}'.".format(self.datasets, reference)
+                    raise ValueError(m)
+
+                ref_trigs = self.dataset_ref_trigs[reference]
+                self.steps[chn][tcomb] = SimpleNamespace(
+                    lepton_veto=sel.should_apply_lepton_veto(tcomb),
+                    ref_trigs=ref_trigs,
+                    in_lep=all(x in main.lep_triggers for x in ref_trigs))
+
+    def tcombs(self, channel):
+        """Trigger combinations to process, in the original order."""
+        return tuple(self.steps[channel].keys())
+
+class CutCombinations:
+    """
+    Cut combinations on trigger variables (see `EventSelection.var_cuts`), enumerated once per job.
+    Each threshold in `cfg.cuts` is assigned one bit, set by `bits` when an event passes it.
+    For a trigger combination and the variables being displayed, `combinations` returns the
+    histogram keys and the bits each cut combination requires, in the order of `var_cuts`.
+    `passes` then tells which combinations an event (or array of events) passes.
+    """
+    def __init__(self, configuration, nocut_dummy_str=main.nocut_dummy,
+                 intersection_str=main.inters_str):
+        self.cfg = configuration
+        self.nocut_dummy_str = nocut_dummy_str
+        self.intersection_str = intersection_str
+
+        self.flags = []
+        for trig_cuts in self.cfg.cuts.values():
+            for avar,acut in trig_cuts.items():
+                if acut[0] not in ('>', '<'):
+                    mes = 'The operator for the cut is currently not supported: Use `>` or `<`.'
+                    raise ValueError(mes)
+                for c in acut[1]:
+                    if (avar, acut[0], c) not in self.flags:
+                        self.flags.append((avar, acut[0], c))
+        if len(self.flags) > 64:
+            mes = 'At most 64 cut thresholds are supported, {} were given.'
+            raise ValueError(mes.format(len(self.flags)))
+        self.index = {f: i for i,f in enumerate(self.flags)}
+
+        self._trig_combs, self._combs = ({} for _ in range(2))
+
+    def bits(self, entries):
+        """Bits of the cuts passed by each event, as np.uint64."""
+        res = np.zeros(np.shape(entries['triggerbit']), dtype=np.uint64)
+        for i,(avar,sign,c) in enumerate(self.flags):
+            passed = entries[avar] > c if sign == '>' else entries[avar] < c
+            res = res | (np.asarray(passed).astype(np.uint64) << np.uint64(i))
+        return res
+
+    def trigger_combinations(self, trig, variables):
+        """Cut combinations of a single trigger as ((key, required_bits), ...)."""
+        variables = tuple(variables)
+        if (trig, variables) in self._trig_combs:
+            return self._trig_combs[(trig, variables)]
+
+        dflags = {}
+        for avar,acut in self.cfg.cuts.get(trig, {}).items():
+            # by default do not cut on the variable(s) being plotted
+            if avar in variables or cuts_ignored_for(avar, variables):
+                continue
+            dflags[avar] = [ (cut_flag_name(avar, acut[0], c), 1 << self.index[(avar, acut[0], c)])
+                             for c in acut[1] ]
+
+        if dflags:
+            res = tuple( ((main.inters_str).join(k[0] for k in comb), sum(k[1] for k in comb))
+                         for comb in it.product(*(dflags[name] for name in sorted(dflags))) )
+        else:
+            res = ((self.nocut_dummy_str, 0),)
+
+        self._trig_combs[(trig, variables)] = res
+        return res
+
+    def combinations(self, tcomb, variables):
+        """
+        Keys and required bits of all cut combinations of a trigger combination.
+        The keys match the ones previously built per event from `var_cuts`.
+        """
+        variables = tuple(variables)
+        if (tcomb, variables) not in self._combs:
+            combs = list(it.product(*(self.trigger_combinations(t, variables) for t in tcomb)))
+            keys = tuple( (self.intersection_str).join(e[0] for e in elem) for elem in combs )
+            required = np.array([functools.reduce(operator.or_, (e[1] for e in elem))
+                                 for elem in combs], dtype=np.uint64)
+            self._combs[(tcomb, variables)] = keys, required
+        return self._combs[(tcomb, variables)]
+
+    def passes(self, bits, tcomb, variables):
+        """
+        Boolean array with the cut combinations passed, with shape (ncombinations,)
+        for one event and (nevents, ncombinations) for an array of events.
+        """
+        required = self.combinations(tcomb, variables)[1]
+        return (np.asarray(bits, dtype=np.uint64)[..., None] & required) == required
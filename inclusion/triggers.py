@@ -0,0 +1,95 @@
+# coding: utf-8
+
+_all_ = [ 'TriggerDecoder', 'trigger_bit_ranges' ]
+
+import os
+import sys
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, parent_dir)
+
+import inclusion
+from inclusion.config import main
+
+import numpy as np
+
+def _as_tuple(bits):
+    return tuple(bits) if isinstance(bits, (tuple,list)) else (bits,)
+
+def trigger_bit_ranges(year, trigger, isdata):
+    """
+    Returns the 'triggerbit' bits of a trigger as a tuple of (first_run, last_run, bits).
+    The bits apply to runs in [first_run, last_run), `None` meaning there is no bound.
+    A trigger fires when at least one of its bits is set.
+    Only run-dependent triggers (see 'main.trig_run_ranges') have more than one range.
+    """
+    tmap = main.trig_map[year][trigger]
+    ranges = main.trig_run_ranges[year]
+    if trigger in ranges:
+        if not isdata:
+            return ((None, None, _as_tuple(tmap[ranges[trigger][-1][2]]['mc'])),)
+        return tuple((first, last, _as_tuple(tmap[path]['data']))
+                     for first, last, path in ranges[trigger])
+
+    s = 'data' if isdata else 'mc'
+    try:
+        return ((None, None, _as_tuple(tmap[s])),)
+    except KeyError:
+        print('You likely forgot to add your run-dependent trigger to `main.trig_run_ranges`.')
+        raise
+
+class TriggerDecoder:
+    """
+    Decodes the 'triggerbit' leaf of a chunk of events into trigger decisions.
+    `decode` returns an (nevents x ntriggers) boolean matrix, and `pack` turns it
+    into uint64 words where bit `i` is set when `triggers[i]` fired.
+    The intersection of a trigger combination is then a single bitwise comparison.
+    """
+    def __init__(self, triggers, year, isdata):
+        if len(triggers) > 64:
+            raise ValueError('At most 64 triggers can be packed, {} were given.'.format(len(triggers)))
+        self.triggers = tuple(triggers)
+        self.index = {t: i for i, t in enumerate(self.triggers)}
+        self.year = year
+        self.isdata = isdata
+        self.ranges = {}
+
+    def _ranges(self, trigger):
+        """Bit ranges of a trigger with the bits converted to a single mask."""
+        if trigger not in self.ranges:
+            self.ranges[trigger] = tuple(
+                (first, last, np.uint64(sum(1 << b for b in bits)))
+                for first, last, bits in trigger_bit_ranges(self.year, trigger, self.isdata) )
+        return self.ranges[trigger]
+
+    def combination_mask(self, tcomb):
+        """Word with the bits of all triggers in the combination set."""
+        return np.uint64(sum(1 << self.index[t] for t in tcomb))
+
+    def decode(self, triggerbit, run):
+        matrix = np.zeros((len(triggerbit), len(self.triggers)), dtype=bool)
+        for i, trig in enumerate(self.triggers):
+            matrix[:, i] = self.decode_trigger(trig, triggerbit, run)
+        return matrix
+
+    def decode_trigger(self, trigger, triggerbit, run):
+        """Boolean mask of the events firing `trigger`."""
+        words = np.asarray(triggerbit).astype(np.uint64)
+        res = np.zeros(len(words), dtype=bool)
+        for first, last, mask in self._ranges(trigger):
+            fired = (words & mask) != 0
+            if first is not None:
+                fired &= run >= first
+            if last is not None:
+                fired &= run < last
+            res |= fired
+        return res
+
+    def pack(self, matrix):
+        shifts = np.arange(matrix.shape[1], dtype=np.uint64)
+        return np.bitwise_or.reduce(matrix.astype(np.uint64) << shifts, axis=1,
+                                    initial=np.uint64(0))
+
+    def passes(self, words, tcomb):
+        """Whether all triggers in the combination fired."""
+        mask = self.combination_mask(tcomb)
+        return (words & mask) == mask
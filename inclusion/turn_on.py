@@ -0,0 +1,111 @@
+# coding: utf-8
+
+_all_ = [ 'sigmoid', 'initial_parameters', 'fit_sigmoid', 'fit_turn_ons', 'fit_all' ]
+
+import multiprocessing
+import numpy as np
+from scipy.optimize import least_squares
+
+# starting slopes, as used with the former TF1 fits
+default_slopes = {'data': 0.03, 'mc': 0.05}
+
+def sigmoid(x, pars):
+    """
+    Turn-on curve `[2]/(1+exp(-[0]*(x-[1])))`, with the parameters along the last axis.
+    Several parameter sets can be evaluated at once, with shape (..., 3).
+    """
+    pars = np.asarray(pars, dtype=np.float64)
+    x = np.asarray(x, dtype=np.float64)
+    slope, thresh, plateau = [pars[..., i, np.newaxis] for i in range(3)]
+    with np.errstate(over='ignore'):
+        return plateau / (1. + np.exp(-slope * (x - thresh)))
+
+def _jacobian(x, pars):
+    slope, thresh, plateau = pars
+    with np.errstate(over='ignore', invalid='ignore'):
+        e = np.exp(-slope * (x - thresh))
+        den = 1. / (1. + e)
+        dfac = np.nan_to_num(e * den**2)
+    return np.stack((plateau * dfac * (x - thresh), -plateau * dfac * slope, den), axis=-1)
+
+def _bounds(frange):
+    """Positive slope, threshold within one range width of the fit range and plateau up to 1.1."""
+    width = frange[1] - frange[0]
+    return ((0., frange[0] - width, 0.), (np.inf, frange[1] + width, 1.1))
+
+def initial_parameters(x, eff, slope):
+    """
+    Data-driven starting values: the plateau is the largest efficiency,
+    and the threshold the first point above half of it.
+    """
+    plateau = min(max(eff.max(), 0.05), 1.)
+    thresh = x[np.argmax(eff >= plateau / 2.)]
+    return np.array((slope, thresh, plateau))
+
+def fit_sigmoid(x, eff, frange, p0):
+    """
+    Bounded least squares fit of a single turn-on to the (value, low, up) efficiencies `eff`,
+    restricted to the points in `frange`.
+    As for `TGraphAsymmErrors` fits, each residual uses the error on the side of the function;
+    the other side is used when that error is zero, and points without errors are ignored.
+    Returns the parameters, their covariance and whether the fit converged.
+    """
+    val, low, up = eff
+    sel = (x >= frange[0]) & (x <= frange[1]) & ((low > 0) | (up > 0))
+    x, val, low, up = x[sel], val[sel], low[sel], up[sel]
+    if len(x) < len(p0):
+        return np.full(3, np.nan), np.full((3, 3), np.nan), False
+
+    def errors(pars):
+        above = sigmoid(x, pars) > val
+        err = np.where(above, up, low)
+        return np.where(err > 0, err, np.where(above, low, up))
+
+    lb, ub = _bounds(frange)
+    p0 = np.clip(p0, lb, np.nextafter(ub, -np.inf))
+    fit = least_squares(lambda p: (val - sigmoid(x, p)) / errors(p), p0,
+                        jac=lambda p: -_jacobian(x, p) / errors(p)[:, np.newaxis],
+                        bounds=(lb, ub), method='trf', x_scale='jac')
+
+    # the chi2 is not rescaled, as done by ROOT
+    cov = np.linalg.pinv(fit.jac.T @ fit.jac)
+    return fit.x, cov, fit.success
+
+def fit_turn_ons(x, effs, frange, slope, start=None):
+    """
+    Fits the turn-ons of consecutive cuts, with efficiencies shaped (3, ncuts, nbins).
+    Each fit starts from the result of the previous cut, which is usually close, and the first
+    from `start` when given. Data-driven starting values are used otherwise, or after a failed fit.
+    Returns the parameters (ncuts, 3), covariances (ncuts, 3, 3) and the fit status (ncuts,).
+    """
+    ncuts = effs.shape[1]
+    pars, covs = np.zeros((ncuts, 3)), np.zeros((ncuts, 3, 3))
+    status = np.zeros(ncuts, dtype=bool)
+    for icut in range(ncuts):
+        eff = effs[:, icut]
+        if start is None:
+            start = initial_parameters(x, eff[0], slope)
+        pars[icut], covs[icut], status[icut] = fit_sigmoid(x, eff, frange, start)
+        start = pars[icut] if status[icut] else None
+    return pars, covs, status
+
+def _fit_task(task):
+    key, series, frange, slope = task
+    out, start = [], None
+    for x, effs in series:
+        out.append(fit_turn_ons(x, effs, frange, slope, start))
+        start = out[-1][0][0] if out[-1][2][0] else None
+    return key, out
+
+def fit_all(tasks, nworkers=1):
+    """
+    Fits several independent series of turn-ons, given as (key, series, range, slope), where
+    each series is a list of (bin centers, efficiencies) of neighbouring trigger combinations.
+    The first cut of each combination starts from the first cut of the previous one.
+    The series are fitted in a pool of `nworkers` processes.
+    Returns a dictionary with the list of `fit_turn_ons` outputs per key.
+    """
+    if nworkers > 1:
+        with multiprocessing.Pool(nworkers) as pool:
+            return dict(pool.imap_unordered(_fit_task, tasks))
+    return dict(_fit_task(t) for t in tasks)
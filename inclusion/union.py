@@ -0,0 +1,159 @@
+# coding: utf-8
+
+_all_ = [ 'combination_mask', 'popcount', 'zeta_transform', 'mobius_transform',
+          'union_probabilities', 'intersection_table', 'lookup_path', 'write_lookup_table',
+          'LookupTable' ]
+
+import os
+import h5py
+import numpy as np
+
+from inclusion.utils import utils
+
+def combination_mask(tcomb, triggers):
+    """Subset index of a trigger combination: bit `i` is set when `triggers[i]` is included."""
+    index = {t: i for i, t in enumerate(triggers)}
+    return sum(1 << index[t] for t in tcomb)
+
+def popcount(ntriggers):
+    """Number of triggers in each of the 2**ntriggers subsets."""
+    counts = np.zeros(1, dtype=np.int64)
+    for _ in range(ntriggers):
+        counts = np.concatenate((counts, counts + 1))
+    return counts
+
+def _split_bits(f):
+    """View of the last axis, of length 2**n, as n axes of length 2, the last one being bit 0."""
+    nbits = f.shape[-1].bit_length() - 1
+    if f.shape[-1] != 1 << nbits:
+        raise ValueError('The last axis must have a power of two length, got {}.'.format(f.shape[-1]))
+    return f.reshape(f.shape[:-1] + (2,) * nbits), nbits
+
+def zeta_transform(f):
+    """
+    Subset sums g(U) = sum_{S in U} f(S), along the last axis indexed by subset masks.
+    Runs in O(n 2**n) operations, with one cumulative sum per bit.
+    """
+    g, nbits = _split_bits(np.array(f, dtype=np.float64))
+    for axis in range(g.ndim - nbits, g.ndim):
+        g = np.cumsum(g, axis=axis)
+    return g.reshape(np.shape(f))
+
+def mobius_transform(g):
+    """Inverse of `zeta_transform`: f(S) = sum_{U in S} (-1)^{|S|-|U|} g(U)."""
+    f, nbits = _split_bits(np.array(g, dtype=np.float64))
+    for axis in range(f.ndim - nbits, f.ndim):
+        f = np.diff(f, axis=axis, prepend=0.)
+    return f.reshape(np.shape(g))
+
+def union_probabilities(inters):
+    """
+    Probabilities of firing at least one trigger, for every subset of the triggers at once.
+    `inters[..., S]` is the probability of firing all triggers in the subset S (its
+    intersection efficiency); the empty subset is ignored. The inclusion-exclusion formula
+    P(U) = sum_{S in U, S not empty} (-1)^{|S|+1} inters(S) is the subset sum of the signed terms.
+
+    Lendermann V et al. Combining Triggers in HEP data analysis.
+    Nucl Instruments Methods Phys Res Sect A Accel Spectrometers,
+    Detect Assoc Equip. 2009;604(3):707-718. Section 4.3.4.
+    """
+    inters = np.asarray(inters, dtype=np.float64)
+    ntrigs = inters.shape[-1].bit_length() - 1
+    signed = np.where(popcount(ntrigs) % 2 == 1, inters, -inters)
+    signed[..., 0] = 0.
+    return zeta_transform(signed)
+
+def intersection_table(store, variable, channel, triggers, exclusive, key='eff_data'):
+    """
+    Intersection efficiencies of all subsets of `triggers` per bin of `variable`, with shape
+    (nbins, 2**ntriggers), read from an `scale_factors.EfficiencyStore`.
+    The shortest cut of each trigger combination is used (no cut).
+    Subsets without stored efficiencies, for instance including a trigger that never fires
+    in the channel, have zero efficiency.
+    """
+    cuts = {}
+    for v, t, c in store.keys():
+        if v == variable:
+            cuts.setdefault(t, []).append(c)
+
+    table = None
+    for tcomb in utils.generate_trigger_combinations(channel, triggers, exclusive):
+        tcstr = utils.join_name_trigger_intersection(tcomb)
+        if tcstr not in cuts:
+            continue
+        eff = store.get(variable, tcstr, min(cuts[tcstr], key=len))[key][0]
+        if table is None:
+            table = np.zeros((len(eff), 1 << len(triggers)))
+        table[:, combination_mask(tcomb, triggers)] = eff
+    if table is None:
+        raise ValueError('No efficiencies stored for variable {}.'.format(variable))
+    return table
+
+def lookup_path(outdir, data_name, mc_name, channel, subtag):
+    """Intersection efficiency lookup table of one channel, see `write_lookup_table`."""
+    return os.path.join(outdir, 'EffLUT_' + data_name + '_' + mc_name + '_' + channel + subtag + '.hdf5')
+
+def write_lookup_table(fname, store, channel, triggers, exclusive):
+    """
+    Writes the data and MC intersection efficiencies of all one-dimensional variables of a store
+    in a single float array indexed by (data or MC, subset mask, variable, bin), zero padded to
+    the largest number of bins, with the bin edges alongside (NaN padded).
+    The datasets are contiguous and uncompressed, so that `LookupTable` can memory-map them.
+    """
+    first = {}
+    for key in store.keys():
+        first.setdefault(key[0], key)
+    var_edges = {v: store.get(*k)['edges'] for v,k in sorted(first.items())}
+    variables = [v for v,e in var_edges.items() if len(e) == 1]
+    nbins = np.array([len(var_edges[v][0]) - 1 for v in variables], dtype=np.int64)
+    maxbins = max(nbins, default=0)
+
+    effs = np.zeros((2, 1 << len(triggers), len(variables), maxbins))
+    edges = np.full((len(variables), maxbins + 1), np.nan)
+    for ivar, var in enumerate(variables):
+        for isrc, key in enumerate(('eff_data', 'eff_mc')):
+            effs[isrc, :, ivar, :nbins[ivar]] = intersection_table(store, var, channel, triggers,
+                                                                   exclusive, key=key).T
+        edges[ivar, :nbins[ivar]+1] = var_edges[var][0]
+
+    with h5py.File(fname, 'w') as fout:
+        fout.create_dataset('effs', data=effs)
+        fout.create_dataset('edges', data=edges)
+        fout.create_dataset('nbins', data=nbins)
+        fout.create_dataset('triggers', data=np.array(triggers, dtype='S'))
+        fout.create_dataset('variables', data=np.array(variables, dtype='S'))
+
+class LookupTable:
+    """
+    Read-only view of a table written by `write_lookup_table`.
+    The efficiencies are memory-mapped: jobs on the same node share the pages of the file,
+    and only the edges and names are read when opening.
+    """
+    def __init__(self, filename):
+        with h5py.File(filename, 'r') as f:
+            dset = f['effs']
+            offset = dset.id.get_offset()
+            if offset is None: # empty table
+                self.effs = np.zeros(dset.shape)
+            else:
+                self.effs = np.memmap(filename, dtype=dset.dtype, mode='r', offset=offset, shape=dset.shape)
+            self.triggers = tuple(x.decode() for x in f['triggers'][:])
+            variables = tuple(x.decode() for x in f['variables'][:])
+            self.nbins = dict(zip(variables, f['nbins'][:]))
+            self._edges = f['edges'][:]
+        self.index = {v: i for i, v in enumerate(variables)}
+
+    def __contains__(self, variable):
+        return variable in self.index
+
+    def edges(self, variable):
+        return self._edges[self.index[variable], :self.nbins[variable]+1]
+
+    def intersections(self, variable, data=True):
+        """Intersection efficiencies with shape (nbins, 2**ntriggers), see `intersection_table`."""
+        ivar = self.index[variable]
+        return self.effs[0 if data else 1, :, ivar, :self.nbins[variable]].T
+
+    def unions(self, variable):
+        """Data and MC union efficiencies of all trigger subsets, see `union_probabilities`."""
+        return tuple(union_probabilities(self.intersections(variable, data=x)) for x in (True, False))
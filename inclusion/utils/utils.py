@@ -1,16 +1,19 @@
 import os
 import glob
 import inspect
+import json
 import re
 import operator
 import argparse
 import functools
 import itertools as it
+import multiprocessing
 import numpy as np
 import h5py
 from types import SimpleNamespace
 
 import inclusion
+from inclusion import cuts
 from inclusion.config import main
 from inclusion.utils import utils
 
@@ -178,13 +181,11 @@ def define_used_tree_variables(cut):
                 'MC_weight', 'IdSF_deep_2d', 'PUReweight', 'L1pref_weight', 'trigSF', 'PUjetID_SF', 'bTagweightReshape',
                 'dau1_eleMVAiso', 'dau1_iso', 'dau2_iso', 'dau1_deepTauVsJet', 'dau2_deepTauVsJet',
                 'nleps', 'nbjetscand', 'tauH_mass', 'bH_mass',
-                'bjet1_bID_deepFlavor', 'bjet2_bID_deepFlavor',
+                'bjet1_bID_deepFlavor', 'bjet2_bID_deepFlavor', 'isBoosted',
                 'isTau1real', 'isTau2real')
-    if cut is not None:
-        _regex = tuple(set(re.findall(r'self\.entries\.(.+?)\s', cut)))
-    else:
-        _regex = ()
-    return tuple(set(_entries + _regex))
+    cut = cuts.parse_cut(cut)
+    _cut_vars = cut.branches if cut is not None else ()
+    return tuple(set(_entries + _cut_vars))
     
 class dot_dict(dict):
     """dot.notation access to dictionary attributes"""
@@ -192,26 +193,17 @@ class dot_dict(dict):
     __setattr__ = dict.__setitem__
     __delattr__ = dict.__delitem__
 
-def find_bin(edges, value, var):
+def find_bins(edges, values):
     """
-    Find the bin id corresponding to one value, given the bin edges.
-    Bin 0 stands for underflow.
+    Find the bin ids corresponding to an array of values, given the bin edges.
+    Bin 1 is the first bin: the overflow is included in the last bin and the underflow,
+    which should not happen with well defined binnings, in the first one.
+    Returns the bin ids and the number of values in the underflow and in the overflow.
     """
-    binid = np.digitize(value, edges)
-    if binid == len(edges):
-        binid -= 1 # include overflow
-
-    # check for out-of-bounds
-    if binid==0:
-        print(binid, value, var)
-        print(edges, len(edges))
-        print( '[{}] WARNING: This should never happen in production code. '
-               'Are you sure the binning is well defined?'.format(os.path.basename(__file__)) )
-        binid = 1
-    elif binid>len(edges):
-        raise ValueError('[{}] WARNING: This cannot happen in production code.')
-
-    return binid
+    binids = np.digitize(values, edges)
+    nunder = np.count_nonzero(binids == 0)
+    nover = np.count_nonzero(binids == len(edges))
+    return np.clip(binids, 1, len(edges)-1), (nunder, nover)
 
 def flatten_nested_dict(d):
     """
@@ -589,19 +581,209 @@ def apply_equal_bin_width(old, roundx=2, roundy=2):
         raise ValueError(mess)
     return h
 
-def total_sum_weights(f, isdata):
+def total_sum_weights(f, isdata, index=None):
+    """
+    Sum of the weights of the sample `f` belongs to.
+    If provided, the value is read from the index created by `build_sum_weights_index`,
+    unless the sample's 'goodfiles.txt' changed in the meantime. The listed files are not
+    checked here, to spare the shared filesystem: they are revalidated when the index is built.
+    """
     if isdata:
         return 1.
     else:
         search_str = os.path.join(os.path.dirname(f), 'goodfiles.txt')
+        if index is not None and os.path.exists(index):
+            with open(index, 'r') as afile:
+                entry = json.load(afile).get(search_str)
+            if entry is not None and entry['stamp'] == file_stamp(search_str):
+                return entry['sumw']
+            print('WARNING: {} is not up to date with {}.'.format(index, search_str))
+
         xsec_norm = 0.
         with open(search_str, 'r') as afile:
             for elem in afile:
-                ftmp = ROOT.TFile(elem.replace('\n', ''), "READ")
-                xsec_norm += ftmp.Get('h_eff').GetBinContent(1)     
+                xsec_norm += sum_weights_single_file(elem.replace('\n', ''))
         return xsec_norm
     return None
 
+def sum_weights_single_file(fname):
+    ftmp = ROOT.TFile(fname, "READ")
+    res = ftmp.Get('h_eff').GetBinContent(1)
+    ftmp.Close()
+    return res
+
+def file_stamp(fname):
+    """Modification time and size, used to detect changes in a file."""
+    st = os.stat(fname)
+    return {'mtime': st.st_mtime, 'size': st.st_size}
+
+def sum_weights_index_path(outdir, sample):
+    return os.path.join(outdir, sample, 'sum_weights.json')
+
+def build_sum_weights_index(sample, indir, index, nprocs=8):
+    """
+    Stores the sum of weights of each 'goodfiles.txt' list of a sample in a JSON index,
+    so that jobs do not have to open all the files of the sample.
+    Files already in the index are read again only if their modification time or size
+    changed. The others are read in parallel.
+    """
+    if os.path.exists(index):
+        with open(index, 'r') as afile:
+            old = json.load(afile)
+    else:
+        old = {}
+
+    _, inputdir = get_root_inputs(sample, indir)
+    goodfiles = glob.glob(os.path.join(inputdir, sample + '*/goodfiles.txt'))
+
+    new, missing = {}, set()
+    for gf in goodfiles:
+        with open(gf, 'r') as afile:
+            fnames = [x.replace('\n', '') for x in afile if x.strip() != '']
+        oldfiles = old.get(gf, {}).get('files', {})
+        new[gf] = {'stamp': file_stamp(gf), 'files': {}}
+        for fname in fnames:
+            stamp = file_stamp(fname)
+            if fname in oldfiles and all(oldfiles[fname][k] == v for k,v in stamp.items()):
+                new[gf]['files'][fname] = oldfiles[fname]
+            else:
+                new[gf]['files'][fname] = stamp
+                missing.add(fname)
+
+    if missing:
+        missing = sorted(missing)
+        with multiprocessing.Pool(processes=nprocs) as pool:
+            sumw = dict(zip(missing, pool.map(sum_weights_single_file, missing)))
+        for gf in new:
+            for fname, entry in new[gf]['files'].items():
+                if fname in sumw:
+                    entry['sumw'] = sumw[fname]
+
+    # same summation order as when reading the files sequentially
+    for gf in new:
+        new[gf]['sumw'] = 0.
+        for entry in new[gf]['files'].values():
+            new[gf]['sumw'] += entry['sumw']
+
+    if new != old:
+        create_single_dir(os.path.dirname(index))
+        with open(index, 'w') as afile:
+            json.dump(new, afile, indent=1)
+    return new
+
+def get_file_id(fname):
+    """
+    Identifier of an input file, given by its folder and the digits at the end of its name.
+    The folder distinguishes files with the same name in different folders of a sample.
+    """
+    folder = os.path.basename(os.path.dirname(fname))
+    return folder + '_' + ''.join(c for c in fname[-10:] if c.isdigit())
+
+def work_units_path(outdir, sample):
+    return os.path.join(outdir, sample, 'work_units.json')
+
+def plan_work_units(filelist, unit_size, tree='HTauTauTree'):
+    """
+    Splits the input files of a sample into work units of roughly `unit_size` MB.
+    Consecutive small files from the same folder are grouped, and files larger
+    than `unit_size` are split into entry ranges of similar size.
+    Each unit is a list of [filename, entry_start, entry_stop] (`None` meaning
+    no bound), named after the id of its first file (see `get_file_id`), plus the slice
+    number for split files. A `unit_size` of zero gives one unit per file.
+    """
+    target = unit_size * 1024**2
+    units = {}
+    group, group_size = [], 0
+
+    def add_unit(name, items):
+        if name in units:
+            mes = '[plan_work_units] Work unit {} of {} has the same name as the unit of {}.'.format(
+                name, items[0][0], units[name][0][0])
+            mes += ' Is a file listed twice?'
+            raise ValueError(mes)
+        units[name] = items
+
+    def close_group():
+        if group:
+            add_unit(get_file_id(group[0][0]), list(group))
+        return [], 0
+
+    for fname in filelist:
+        fname = fname.replace('\n', '')
+        if fname.strip() == '':
+            continue
+
+        if target <= 0:
+            add_unit(get_file_id(fname), [[fname, None, None]])
+            continue
+
+        if group and os.path.dirname(group[0][0]) != os.path.dirname(fname):
+            group, group_size = close_group()
+
+        size = os.path.getsize(fname)
+        if size > target:
+            ftmp = ROOT.TFile.Open(fname, 'READ')
+            nentries = ftmp.Get(tree).GetEntries()
+            ftmp.Close()
+            nslices = max(1, min(int(np.ceil(size / target)), nentries))
+            bounds = np.linspace(0, nentries, nslices+1).astype(int)
+            for islice in range(nslices):
+                add_unit('{}_{}'.format(get_file_id(fname), islice),
+                         [[fname, int(bounds[islice]), int(bounds[islice+1])]])
+        else:
+            group.append([fname, None, None])
+            group_size += size
+            if group_size >= target:
+                group, group_size = close_group()
+
+    close_group()
+    return units
+
+def build_work_units(filelist, index, unit_size):
+    """
+    Plans the work units of a sample (see `plan_work_units`) and stores them in a JSON index.
+    Returns the names of the units, one per job.
+    """
+    units = plan_work_units(filelist, unit_size)
+    create_single_dir(os.path.dirname(index))
+    with open(index, 'w') as afile:
+        json.dump({'unit_size': unit_size, 'units': units}, afile, indent=1)
+    return list(units.keys())
+
+def load_work_unit(index, name):
+    """Files and entry ranges of a work unit, as (filename, entry_start, entry_stop)."""
+    with open(index, 'r') as afile:
+        units = json.load(afile)['units']
+    return [tuple(x) for x in units[name]]
+
+def split_work_unit(items, nparts, tree='HTauTauTree'):
+    """
+    Splits the (filename, entry_start, entry_stop) items of a work unit
+    into at most `nparts` lists of items with a similar number of entries.
+    """
+    ranges = []
+    for fname, start, stop in items:
+        if start is None or stop is None:
+            ftmp = ROOT.TFile.Open(fname, 'READ')
+            nentries = ftmp.Get(tree).GetEntries()
+            ftmp.Close()
+            start = 0 if start is None else start
+            stop = nentries if stop is None else stop
+        ranges.append((fname, start, stop))
+
+    total = sum(stop - start for _, start, stop in ranges)
+    bounds = np.linspace(0, total, max(1, nparts)+1).astype(int)
+    parts, offset = [[] for _ in range(len(bounds)-1)], 0
+    for fname, start, stop in ranges:
+        for ipart in range(len(parts)):
+            # intersection of the part with the entries of this file
+            lo = max(bounds[ipart], offset)
+            hi = min(bounds[ipart+1], offset + stop - start)
+            if hi > lo:
+                parts[ipart].append((fname, int(start + lo - offset), int(start + hi - offset)))
+        offset += stop - start
+    return [x for x in parts if x]
+
 def upify(s):
     """capitalizes the first letter of the passed string"""
     return s[0].upper() + s[1:]
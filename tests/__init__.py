@@ -10,3 +10,15 @@ sys.path.append(base)
 
 # import all tests
 from .test_util import *
+from .test_selection import *
+from .test_cuts import *
+from .test_histograms import *
+from .test_counts import *
+from .test_efficiency import *
+from .test_scale_factors import *
+from .test_turn_on import *
+from .test_union import *
+from .test_accumulators import *
+from .test_closure import *
+from .test_local_executor import *
+from .test_engines import *
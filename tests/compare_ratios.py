@@ -6,7 +6,7 @@ import os
 import numpy as np
 import glob
 import argparse
-import uproot as up
+import h5py
 
 import matplotlib
 import matplotlib.pyplot as plt
@@ -17,31 +17,30 @@ mu, tau = '\u03BC','\u03C4'
 dd = {"mumu": mu+mu, "mutau": mu+tau}
 
 def build_path(base, channel, variable):
-    path = os.path.join(base, channel, variable)
-    return os.path.join(path, "eff_Data_Mu_MC_TT_DY_WJets_" + channel + "_" + variable + "_TRG_METNoMu120_CUTS_*.root")
+    return os.path.join(base, "EffSF_Data_Mu_MC_TT_DY_WJets_" + channel + "_default.hdf5")
 
 def get_paths_and_labels(base, mode, channels, variable, year, var_units):
     if mode == "ranges":
         labels = ["full", r"$[180;350[\:\:{}$".format(var_units),
                   r"$[160;350[\:\:{}$".format(var_units), r"$[150;350[\:\:{}$".format(var_units),
                   r"$[140;350[\:\:{}$".format(var_units)]
-        # transfer files with:
-        # cp /data_CMS/cms/alves/TriggerScaleFactors/OpenCADI_18/Outputs/mutau/metnomu_et/eff_Data_Mu_MC_TT_DY_WJets_mutau_metnomu_et_TRG_METNoMu120_CUTS_mhtnomu_et_L_0p0_default.root full_mumu_fit.root
-        paths = ["full_mumu_fit_"+year+".root", "180_mumu_fit_"+year+".root",
-                 "160_mumu_fit_"+year+".root", "150_mumu_fit_"+year+".root",
-                 "140_mumu_fit_"+year+".root"]
+        # transfer the efficiency stores with:
+        # cp /data_CMS/cms/alves/TriggerScaleFactors/OpenCADI_18/Outputs/EffSF_Data_Mu_MC_TT_DY_WJets_mumu_default.hdf5 full_mumu_fit_2018.hdf5
+        paths = ["full_mumu_fit_"+year+".hdf5", "180_mumu_fit_"+year+".hdf5",
+                 "160_mumu_fit_"+year+".hdf5", "150_mumu_fit_"+year+".hdf5",
+                 "140_mumu_fit_"+year+".hdf5"]
     elif mode == "channels":
         labels = (dd["mutau"], dd["mumu"])
-        paths = ("150_mutau_fit_"+year+".root", "150_mumu_fit_"+year+".root")
+        paths = ("150_mutau_fit_"+year+".hdf5", "150_mumu_fit_"+year+".hdf5")
     elif mode == "datasets":
         labels = (dd["mumu"]  + ", SingleMuon", dd["mumu"]  + ", DoubleMuon",
                   dd["mutau"] + ", SingleMuon", dd["mutau"] + ", DoubleMuon")
-        paths = ("full_mumu_fit.root", "full_double_mumu_fit.root",
-                 "full_mutau_fit.root", "full_double_mutau_fit.root")
+        paths = ("full_mumu_fit.hdf5", "full_double_mumu_fit.hdf5",
+                 "full_mutau_fit.hdf5", "full_double_mutau_fit.hdf5")
     elif mode == "years":
         labels = ("UL16", "UL16APV", "UL17", "UL18")
-        paths = ("150_mumu_fit_2016.root", "150_mumu_fit_2016APV.root",
-                 "150_mumu_fit_2017.root", "150_mumu_fit_2018.root")
+        paths = ("150_mumu_fit_2016.hdf5", "150_mumu_fit_2016APV.hdf5",
+                 "150_mumu_fit_2017.hdf5", "150_mumu_fit_2018.hdf5")
 
     ret = {}
     for p,l in zip(paths,labels):
@@ -54,13 +53,24 @@ def get_paths_and_labels(base, mode, channels, variable, year, var_units):
     return ret
 
 def sigmoid(x, params):
-    """
-    Sigmoid function to mimick the TF1 object.
-    Uproot does not yet support TF1 reading.
-    """
+    """Sigmoid function fitted by the efficiency workflow (see `inclusion/turn_on.py`)."""
     return params[2] / (1 + np.exp(-params[0] * (x - params[1])))
 
-def compare_ratios(paths, mode, variable, year, var_units):
+def read_fit(path, variable, tcomb, cut):
+    """
+    Scale factors and fitted sigmoid parameters of a single cut, read from an efficiency store.
+    If `cut` is None the variable and trigger combination must have a single cut.
+    """
+    with h5py.File(path, "r") as f:
+        group = f[variable][tcomb]
+        cuts = [x.decode() for x in group["cuts"][:]]
+        if cut is None and len(cuts) != 1:
+            raise RuntimeError('[ERROR] Store {} has cuts {}: please choose one.'.format(path, cuts))
+        row = 0 if cut is None else cuts.index(cut)
+        return (group["edges_x"][:], group["sf"][:, row],
+                group["fit_data"][row], group["fit_mc"][row], tuple(group["fit_range"][:]))
+
+def compare_ratios(paths, mode, variable, year, var_units, tcomb="METNoMu120", cut=None):
     """
     Compare ratios in two modes.
     - Mode 'ranges': compare change in fit from changing the fit range
@@ -78,15 +88,7 @@ def compare_ratios(paths, mode, variable, year, var_units):
     plt.subplots_adjust(wspace=0, hspace=0)
 
     for ipath, (bpath, blabel) in enumerate(paths.items()):
-        graph_sf = up.open(bpath + ":SF1D")
-        
-        fit_data = up.open(bpath + ":SigmoidFuncData")
-        fit_mc = up.open(bpath + ":SigmoidFuncMC")
-
-        fit_data_pars = fit_data.member('fFormula').member('fClingParameters')[:]
-        fit_mc_pars   = fit_mc.member('fFormula').member('fClingParameters')[:]
-        fit_xrange    = (fit_data.member('fXmin'), fit_data.member('fXmax'))
-        assert fit_xrange == (fit_mc.member('fXmin'), fit_mc.member('fXmax'))
+        edges, sf, fit_data_pars, fit_mc_pars, fit_xrange = read_fit(bpath, variable, tcomb, cut)
 
         fit_xvals = np.linspace(0, 900.1, num=10000)
 
@@ -101,9 +103,8 @@ def compare_ratios(paths, mode, variable, year, var_units):
         # if mode == "ranges" we only want to plot SFs once (all are equal)
         if mode != "ranges" or ipath > 0:
             # plot efficiency values and error bars
-            ax1.errorbar(graph_sf.values(axis="x"), graph_sf.values(axis="y"),
-                         xerr=(graph_sf.errors(axis="x", which="low"), graph_sf.errors(axis="x", which="high")),
-                         yerr=(graph_sf.errors(axis="y", which="low"), graph_sf.errors(axis="y", which="high")),
+            ax1.errorbar((edges[1:] + edges[:-1]) / 2, sf[0],
+                         xerr=(edges[1:] - edges[:-1]) / 2, yerr=(sf[1], sf[2]),
                          fmt='o', color="black" if mode == "ranges" else colors[ipath])
             
         fit_ratios.append(fit_data_yvals / fit_mc_yvals)
@@ -222,6 +223,8 @@ if __name__ == "__main__":
                         help='Which comparison to run.')
     parser.add_argument('--year', default="2018", choices=("2016APV", "2016", "2017", "2018"),
                         help='Which data period to consider.')
+    parser.add_argument('--cut', default=None,
+                        help='Cut of the stored efficiencies. Required if there is more than one.')
     
     FLAGS = parser.parse_args()
     if FLAGS.mode == "channels":
@@ -230,4 +233,5 @@ if __name__ == "__main__":
     base = os.path.join("/data_CMS/cms/alves/TriggerScaleFactors/", FLAGS.tag, "Outputs")
     paths = get_paths_and_labels(base, FLAGS.mode, channels=("mutau", "mumu"),
                                  variable="metnomu_et", year=FLAGS.year, var_units="GeV")
-    compare_ratios(paths, mode=FLAGS.mode, variable="metnomu_et", year=FLAGS.year, var_units="GeV")
+    compare_ratios(paths, mode=FLAGS.mode, variable="metnomu_et", year=FLAGS.year, var_units="GeV",
+                   cut=FLAGS.cut)
@@ -0,0 +1,84 @@
+# coding: utf-8
+
+__all__ = ['TestAccumulators']
+
+import tempfile
+import unittest
+import numpy as np
+import h5py
+
+from inclusion import accumulators
+
+class TestAccumulators(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        self.values = rng.normal(1., 0.2, size=5000)
+        self.weights = rng.uniform(0.5, 1.5, size=5000)
+        self.bins = rng.integers(0, 3, size=5000)
+        self.edges = np.linspace(0., 2., 201)
+
+    def test_chunks(self):
+        acc = accumulators.BinnedMoments((3,), self.edges)
+        other = accumulators.BinnedMoments((3,), self.edges)
+        # two chunks filled in one accumulator, and a third merged from another one
+        for sl, a in ((slice(0, 1000), acc), (slice(1000, 3500), acc), (slice(3500, None), other)):
+            a.fill(self.bins[sl], self.values[sl], self.weights[sl])
+        acc.add(other)
+
+        for ibin in range(3):
+            sel = self.bins == ibin
+            vals, w = self.values[sel], self.weights[sel]
+            mean = np.average(vals, weights=w)
+            self.assertEqual(acc.entries[ibin], sel.sum())
+            np.testing.assert_allclose(acc.sumw[ibin], w.sum())
+            np.testing.assert_allclose(acc.mean[ibin], mean)
+            np.testing.assert_allclose(acc.variance()[ibin], np.average((vals-mean)**2, weights=w))
+            np.testing.assert_allclose(acc.sum()[ibin], (w*vals).sum())
+            self.assertEqual((acc.min[ibin], acc.max[ibin]), (vals.min(), vals.max()))
+            np.testing.assert_allclose(acc.hist[ibin].sum(), w.sum())
+            # the median is interpolated within the histogram bins
+            self.assertLess(abs(acc.quantile(0.5)[ibin] - np.median(vals)), 0.02)
+
+    def test_write(self):
+        acc = accumulators.BinnedMoments((2, 3), self.edges)
+        acc.fill((self.bins % 2, self.bins), self.values)
+        with tempfile.TemporaryFile() as f:
+            with h5py.File(f, 'w') as fout:
+                acc.write(fout.create_group('chn/var'))
+            with h5py.File(f, 'r') as fin:
+                new = accumulators.read_moments(fin['chn/var'])
+        for key in accumulators.BinnedMoments.keys:
+            np.testing.assert_array_equal(getattr(new, key), getattr(acc, key))
+        # empty cells
+        self.assertEqual(new.entries[1, 0], 0)
+        self.assertEqual(new.variance()[1, 0], 0.)
+
+    def test_outside(self):
+        acc = accumulators.BinnedMoments((2,), self.edges)
+        acc.fill(np.array([0, 0, 0, 1, 1]), np.array([-0.5, 0.5, 2., 2.5, 3.]))
+        np.testing.assert_array_equal(acc.outside, [1, 2])
+        # clipped into the edge bins
+        self.assertEqual(acc.hist[1, -1], 2.)
+        self.assertEqual((acc.min[0], acc.max[1]), (-0.5, 3.))
+
+    def test_tdigest(self):
+        values = np.concatenate((self.values, np.random.default_rng(4).exponential(1., 5000)))
+        digests = []
+        for part in np.array_split(values, 8):
+            dig = accumulators.TDigest(compression=100)
+            for chunk in np.array_split(part, 3):
+                dig.update(chunk)
+            digests.append(dig)
+        for dig in digests[1:]:
+            digests[0].add(dig)
+        dig = digests[0]
+
+        self.assertLess(len(dig), 200)
+        self.assertEqual(dig.total(), len(values))
+        q = np.linspace(0., 1., 11)
+        res = dig.quantile(q)
+        self.assertEqual((res[0], res[-1]), (values.min(), values.max()))
+        # rank error
+        ranks = np.searchsorted(np.sort(values), res[1:-1]) / len(values)
+        self.assertLess(np.abs(ranks - q[1:-1]).max(), 0.01)
+        self.assertRaises(ValueError, accumulators.TDigest().quantile, 0.5)
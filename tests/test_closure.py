@@ -0,0 +1,42 @@
+# coding: utf-8
+
+__all__ = ['TestClosure']
+
+import os
+import tempfile
+import unittest
+import numpy as np
+import h5py
+
+from inclusion import accumulators
+from inclusion.scripts import run_closure
+
+class TestClosure(unittest.TestCase):
+    def test_reduce_union_outputs(self):
+        rng = np.random.default_rng(5)
+        edges = np.linspace(0., 2., 21)
+        rows = ('ref', 'IsoTau')
+        accs = []
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for proc in ('TT', 'DY'):
+                folder = os.path.join(tmpdir, proc, 'Closure_IsoTau')
+                os.makedirs(folder)
+                acc = accumulators.BinnedMoments((len(rows), 3), edges)
+                acc.fill((rng.integers(0, 2, 100), rng.integers(0, 3, 100)), rng.uniform(0., 2., 100))
+                accs.append(acc)
+                with h5py.File(os.path.join(folder, 'Closure_' + proc + '_0_default.hdf5'), 'w') as f:
+                    group = f.create_group('etau/dau1_pt/dau2_pt')
+                    acc.write(group)
+                    group.attrs['rows'] = np.array(rows, dtype='S')
+                    # other channels are ignored
+                    acc.write(f.create_group('mutau/dau1_pt/dau2_pt'))
+
+            moments, new_rows = run_closure.reduce_union_outputs(tmpdir, 'etau', 'Closure_', '_default',
+                                                                 ['TT', 'DY'], 'IsoTau')
+
+        self.assertEqual(new_rows, list(rows))
+        self.assertEqual(list(moments), [('dau1_pt', 'dau2_pt')])
+        merged = moments['dau1_pt', 'dau2_pt']
+        np.testing.assert_array_equal(merged.entries, accs[0].entries + accs[1].entries)
+        np.testing.assert_allclose(merged.hist, accs[0].hist + accs[1].hist)
+        np.testing.assert_allclose(merged.sum(), accs[0].sum() + accs[1].sum())
@@ -0,0 +1,47 @@
+# coding: utf-8
+
+__all__ = ['TestCountsTable']
+
+import unittest
+import numpy as np
+
+from inclusion import counts
+
+class TestCountsTable(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(seed=5)
+
+    def random_table(self, n, tcombs):
+        return counts.make_table(self.rng.choice(['etau', 'tautau'], n), self.rng.choice(tcombs, n),
+                                 ['METNoMu120'] * n,
+                                 c_ref=self.rng.integers(0, 100, n),
+                                 c_inters=self.rng.integers(0, 50, n),
+                                 w_ref=self.rng.uniform(0., 2., n))
+
+    def test_group_sum(self):
+        tables = [self.random_table(20, ['IsoTau180', 'IsoMu24']),
+                  self.random_table(30, ['IsoTau180_PLUS_METNoMu120', 'IsoMu24'])]
+        table = counts.concatenate(tables)
+        self.assertEqual(len(table), 50)
+
+        expected = {}
+        for row in table:
+            key = (str(row['channel']), str(row['tcomb']), str(row['reference']))
+            c_ref, w_ref = expected.get(key, (0, 0.))
+            expected[key] = (c_ref + int(row['c_ref']), w_ref + float(row['w_ref']))
+
+        summed = counts.group_sum(table)
+        self.assertEqual(len(summed), len(expected))
+        self.assertEqual(summed['c_ref'].dtype, np.int64)
+        for row in summed:
+            key = (str(row['channel']), str(row['tcomb']), str(row['reference']))
+            self.assertEqual(row['c_ref'], expected[key][0])
+            self.assertAlmostEqual(row['w_ref'], expected[key][1])
+            self.assertEqual(row['w2_inters'], 0.)
+
+        squash = counts.group_sum(table, by=('tcomb',))
+        self.assertEqual(squash['c_ref'].sum(), table['c_ref'].sum())
+        self.assertEqual(set(squash.dtype.names) & {'channel', 'reference'}, set())
+
+if __name__ == '__main__':
+    unittest.main()
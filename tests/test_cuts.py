@@ -0,0 +1,50 @@
+# coding: utf-8
+
+__all__ = ['TestCut']
+
+import unittest
+import numpy as np
+
+from inclusion import cuts
+
+class TestCut(unittest.TestCase):
+    """Checks per-event and per-array cut evaluations agree."""
+    def setUp(self):
+        rng = np.random.default_rng(seed=7)
+        self.entries = {'dau1_pt': rng.uniform(20., 250., 200),
+                        'dau2_pt': rng.uniform(20., 250., 200),
+                        'dau1_eta': rng.uniform(-2.5, 2.5, 200)}
+
+    def compare(self, expr):
+        cut = cuts.parse_cut(expr)
+        mask = cut.mask(self.entries)
+        for i in range(len(mask)):
+            evt = {k: v[i] for k,v in self.entries.items()}
+            self.assertEqual(cut(evt), mask[i])
+        return mask
+
+    def test_expressions(self):
+        e = self.entries
+        mask = self.compare('(dau2_pt < 40 and dau1_pt < 190) or (dau1_pt < 40 and dau2_pt < 190)')
+        exp = ((e['dau2_pt'] < 40) & (e['dau1_pt'] < 190)) | ((e['dau1_pt'] < 40) & (e['dau2_pt'] < 190))
+        np.testing.assert_array_equal(mask, exp)
+
+        mask = self.compare('not 30 < dau1_pt + dau2_pt <= 200 or abs(dau1_eta) > 2.1')
+        tot = e['dau1_pt'] + e['dau2_pt']
+        exp = ~((30 < tot) & (tot <= 200)) | (np.abs(e['dau1_eta']) > 2.1)
+        np.testing.assert_array_equal(mask, exp)
+
+    def test_branches(self):
+        cut = cuts.parse_cut('abs(dau1_eta) < 2.1 and dau1_pt > 2*dau2_pt')
+        self.assertEqual(cut.branches, ('dau1_eta', 'dau1_pt', 'dau2_pt'))
+        self.assertIs(cut, cuts.parse_cut('abs(dau1_eta) < 2.1 and dau1_pt > 2*dau2_pt'))
+        self.assertIsNone(cuts.parse_cut(None))
+
+    def test_rejected(self):
+        for expr in ('self.entries.dau1_pt > 40', '__import__("os")', 'dau1_pt[0] > 3',
+                     'max(dau1_pt, 3) > 4', 'dau1_pt > "a"'):
+            with self.assertRaises(ValueError):
+                cuts.parse_cut(expr)
+
+if __name__ == '__main__':
+    unittest.main()
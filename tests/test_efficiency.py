@@ -0,0 +1,47 @@
+# coding: utf-8
+
+__all__ = ['TestClopperPearson']
+
+import unittest
+import numpy as np
+from scipy.stats import binomtest
+
+from inclusion import efficiency
+
+class TestClopperPearson(unittest.TestCase):
+    def test_intervals(self):
+        npass = np.array([0, 3, 10, 7, 0])
+        ntot = np.array([10, 10, 10, 250, 0])
+        eff, low, up = efficiency.clopper_pearson(npass, ntot)
+        for k, n, e, l, u in zip(npass, ntot, eff, low, up):
+            if n == 0: # same convention as ROOT.TEfficiency
+                self.assertEqual((e, l, u), (0., 0., 1.))
+                continue
+            ci = binomtest(int(k), int(n)).proportion_ci(confidence_level=efficiency.one_sigma,
+                                                         method='exact')
+            self.assertAlmostEqual(e, k / n)
+            self.assertAlmostEqual(e - l, ci.low)
+            self.assertAlmostEqual(e + u, ci.high)
+
+        with self.assertRaises(ValueError):
+            efficiency.clopper_pearson([5], [4])
+
+    def test_weighted(self):
+        npass, ntot = np.array([0., 3., 10.]), np.array([10., 10., 10.])
+        # unit weights: same as the unweighted intervals
+        np.testing.assert_allclose(efficiency.clopper_pearson_weighted(npass, ntot, ntot),
+                                   efficiency.clopper_pearson(npass, ntot))
+
+        # constant weights: the effective counts do not depend on the weight
+        np.testing.assert_allclose(efficiency.clopper_pearson_weighted(2.5*npass, 2.5*ntot, 6.25*ntot),
+                                   efficiency.clopper_pearson(npass, ntot))
+
+        eff, low, up = efficiency.clopper_pearson_weighted([-1., 2.], [5., 0.], [5., 0.])
+        np.testing.assert_allclose(eff, [0., 0.])
+        self.assertTrue((low >= 0.).all() and (up >= 0.).all())
+
+    def test_strings(self):
+        self.assertEqual(efficiency.efficiency_strings([0.5], [0.12345], [0.2]), ['0.5 +0.2 -0.123'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+# coding: utf-8
+
+__all__ = ['TestHistogramEngines', 'TestCountEngines']
+
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+import numpy as np
+import uproot as up
+import h5py
+
+from inclusion.utils import utils
+
+# the event loop engines need a working PyROOT
+try:
+    import ROOT
+    from inclusion.scripts import produce_trig_histos, produce_trig_counts
+    HAS_ROOT = isinstance(ROOT.gROOT.GetVersion(), str)
+except ImportError:
+    HAS_ROOT = False
+
+configuration = 'inclusion.config.sel_only_met_tautau'
+variables = ('dau1_pt', 'dau1_eta', 'metnomu_et', 'mhtnomu_et')
+channels = ('mutau', 'mumu')
+binedges = {'dau1_pt'    : [20., 40., 80., 150.],
+            'dau1_eta'   : [-2.1, 0., 2.1],
+            'metnomu_et' : [0., 100., 150., 250.],
+            'mhtnomu_et' : [0., 100., 150., 250.]}
+
+weight_names = ('MC_weight', 'PUReweight', 'L1pref_weight', 'trigSF',
+                'IdSF_deep_2d', 'PUjetID_SF', 'bTagweightReshape')
+
+def write_tree(fname, nevents, isdata=False, seed=7):
+    """
+    Writes a HTauTauTree with random values of the branches read by the engines.
+    The event weights are one for data and random, with a few NaNs, for MC.
+    """
+    rng = np.random.default_rng(seed=seed)
+    n = nevents
+    entries = {v: rng.uniform(0., 1., n) for v in utils.define_used_tree_variables(None)}
+    for wname in weight_names:
+        if isdata:
+            entries[wname] = np.ones(n)
+        else:
+            entries[wname] = rng.uniform(0.5, 1.5, n)
+            entries[wname][rng.integers(0, n, 10)] = np.nan
+    entries.update({
+        'triggerbit'        : rng.integers(0, 2**45, n, dtype=np.int64),
+        'RunNumber'         : rng.integers(315000, 320000, n),
+        'pairType'          : rng.integers(0, 4, n),
+        'isOS'              : rng.integers(0, 2, n),
+        'isLeptrigger'      : rng.integers(0, 2, n),
+        'isBoosted'         : rng.integers(0, 2, n),
+        'nleps'             : rng.integers(0, 2, n),
+        'nbjetscand'        : rng.integers(0, 4, n),
+        'isTau1real'        : rng.integers(0, 2, n),
+        'isTau2real'        : rng.integers(0, 2, n),
+        'dau1_eleMVAiso'    : rng.integers(0, 2, n),
+        'dau1_iso'          : rng.uniform(0., 0.2, n),
+        'dau2_iso'          : rng.uniform(0., 0.3, n),
+        'dau1_deepTauVsJet' : rng.integers(0, 8, n),
+        'dau2_deepTauVsJet' : rng.integers(0, 8, n),
+        'dau1_pt'           : rng.uniform(10., 250., n),
+        'dau2_pt'           : rng.uniform(10., 60., n),
+        'dau1_eta'          : rng.uniform(-2.5, 2.5, n),
+        'tauH_mass'         : rng.uniform(0., 200., n),
+        'bH_mass'           : rng.uniform(0., 300., n),
+        'metnomu_et'        : rng.uniform(-10., 300., n),
+        'mhtnomu_et'        : rng.uniform(-10., 300., n),
+        })
+    with up.recreate(fname) as f:
+        f['HTauTauTree'] = entries
+
+@unittest.skipUnless(HAS_ROOT, 'PyROOT is not available.')
+class TestHistogramEngines(unittest.TestCase):
+    """
+    Checks the columnar engine fills the same histograms as the
+    PyROOT event loop, on a small tree written with uproot.
+    """
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.infile = os.path.join(tmpdir.name, 'output_1.root')
+        write_tree(self.infile, nevents=3000)
+
+        self.binedges_fname = os.path.join(tmpdir.name, 'binning.hdf5')
+        with h5py.File(self.binedges_fname, 'w') as f:
+            for var in variables:
+                for chn in channels:
+                    f.create_dataset('tag/{}/{}'.format(var, chn), data=binedges[var])
+
+    def fill(self, engine, isdata, items):
+        args = SimpleNamespace(configuration=configuration, binedges_fname=self.binedges_fname,
+                               subtag='tag', variables=variables, channels=channels,
+                               isdata=isdata, year='2018', dataset='Mu' if isdata else 'TT',
+                               nocut_dummy_str='NoCut', intersection_str='_PLUS_',
+                               step_size=400, engine=engine)
+        return produce_trig_histos.fill_work_items(args, items)
+
+    def test_engines(self):
+        for isdata in (False, True):
+            for items in ([(self.infile, None, None)], [(self.infile, 100, 2500)]):
+                hroot = self.fill('root', isdata, items)
+                hcol = self.fill('columnar', isdata, items)
+                self.assertEqual(hroot.families.keys(), hcol.families.keys())
+                self.assertTrue(any(f.entries.any() for f in hroot.families.values()))
+                for name, family in hroot.families.items():
+                    np.testing.assert_allclose(hcol[name].sumw, family.sumw)
+                    np.testing.assert_allclose(hcol[name].sumw2, family.sumw2)
+                    np.testing.assert_array_equal(hcol[name].entries, family.entries)
+
+@unittest.skipUnless(HAS_ROOT, 'PyROOT is not available.')
+class TestCountEngines(unittest.TestCase):
+    """
+    Checks the columnar engine gives the same counts as the
+    PyROOT event loop, on a small tree written with uproot.
+    """
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.infiles = {}
+        for isdata in (False, True):
+            self.infiles[isdata] = os.path.join(tmpdir.name, 'output_{}.root'.format(int(isdata)))
+            write_tree(self.infiles[isdata], nevents=3000, isdata=isdata)
+
+    def count(self, engine, isdata, items):
+        args = SimpleNamespace(configuration=configuration, channels=channels,
+                               isdata=isdata, year='2018', dataset='Mu' if isdata else 'TT',
+                               step_size=400, engine=engine)
+        return produce_trig_counts.count_work_items(args, items)
+
+    def test_engines(self):
+        for isdata in (False, True):
+            infile = self.infiles[isdata]
+            for items in ([(infile, None, None)], [(infile, 100, 2500)]):
+                croot = self.count('root', isdata, items)
+                ccol = self.count('columnar', isdata, items)
+                c_ref, c_inters = croot[:2]
+                self.assertTrue(any(c for chn in c_ref.values() for c in chn.values()))
+                self.assertEqual(ccol[:2], (c_ref, c_inters))
+                for wroot, wcol in zip(croot[2:], ccol[2:]):
+                    for chn in channels:
+                        self.assertEqual(wroot[chn].keys(), wcol[chn].keys())
+                        for tstr in wroot[chn]:
+                            self.assertAlmostEqual(wroot[chn][tstr], wcol[chn][tstr])
@@ -0,0 +1,97 @@
+# coding: utf-8
+
+__all__ = ['TestHistogramFamily']
+
+import os
+import tempfile
+import unittest
+import numpy as np
+
+from inclusion import histograms
+
+class TestHistogramFamily(unittest.TestCase):
+    def setUp(self):
+        self.edges = np.array([0., 10., 20., 50., 100.])
+        self.rng = np.random.default_rng(seed=3)
+
+    def test_fill(self):
+        fam = histograms.HistogramFamily((self.edges,), ('a', 'b'), ('ha', 'hb'))
+        values = self.rng.uniform(-20., 120., 1000)
+        values[:3] = (0., 100., np.nan) # lower edge, upper edge (overflow) and nan (overflow)
+        weights = self.rng.uniform(0.5, 1.5, 1000)
+        rows = self.rng.integers(0, 2, 1000)
+        fam.fill(rows, weights, values)
+        fam.fill(1, 2., 15.) # single event
+        for irow in range(2):
+            sel = rows == irow
+            exp = np.concatenate(([weights[sel & (values < 0.)].sum()],
+                                  np.histogram(values[sel & (values < 100.)], self.edges,
+                                               weights=weights[sel & (values < 100.)])[0],
+                                  [weights[sel & ~(values < 100.)].sum()]))
+            exp[2] += 2. * irow
+            np.testing.assert_allclose(fam.sumw[irow], exp)
+        self.assertEqual(fam.entries.sum(), 1001)
+
+    def test_fill_2d(self):
+        fam = histograms.HistogramFamily((self.edges, self.edges[:3]), ('a',), ('ha',))
+        fam.fill(0, np.array([1., 2.]), np.array([5., 60.]), np.array([15., 30.]))
+        self.assertEqual(fam.sumw.shape, (1, 6, 4))
+        self.assertEqual(fam.sumw[0, 1, 2], 1.)
+        self.assertEqual(fam.sumw[0, 4, 3], 2.)
+        self.assertEqual(fam.sumw2[0, 4, 3], 4.)
+
+    def test_merge(self):
+        values = self.rng.uniform(-20., 120., 300)
+        registries = []
+        for part in (values, values[:100], values[100:]):
+            reg = histograms.HistogramRegistry()
+            reg.book('h', (self.edges,), ('a',), ('ha',)).fill(0, 1., part)
+            registries.append(reg)
+        registries[1].merge(registries[2])
+        np.testing.assert_array_equal(registries[0]['h'].sumw, registries[1]['h'].sumw)
+        np.testing.assert_array_equal(registries[0]['h'].entries, registries[1]['h'].entries)
+
+        other = histograms.HistogramRegistry()
+        other.book('h', (self.edges[:-1],), ('a',), ('ha',))
+        with self.assertRaises(ValueError):
+            registries[0].merge(other)
+
+    def test_negative_bins(self):
+        ref = histograms.HistogramFamily((self.edges,), ('a',), ('ha',))
+        trg = histograms.HistogramFamily((self.edges,), (('a', 'x'), ('a', 'y')), ('hx', 'hy'))
+        ref.fill(0, np.array([3., -1., 2.]), np.array([5., 15., 30.]))
+        trg.fill(np.array([0, 0, 1, 1]), np.array([2., 1., 1., -0.5]), np.array([5., 30., 5., 30.]))
+        integrals = ref.integral(), trg.integral()
+        histograms.remove_negative_bins(ref, trg, [0, 0])
+        np.testing.assert_allclose(ref.integral(), integrals[0])
+        np.testing.assert_allclose(trg.integral(), integrals[1])
+        self.assertTrue((ref.sumw >= 0.).all() and (trg.sumw >= 0.).all())
+
+        trg.fill(0, 10., 5.)
+        with self.assertRaises(AssertionError):
+            histograms.remove_negative_bins(ref, trg, [0, 0])
+
+    def test_uproot_roundtrip(self):
+        import uproot
+        reg = histograms.HistogramRegistry()
+        reg.book('h1', (self.edges,), ('a', 'b'), ('ha', 'hb')).fill(
+            np.array([0, 1]), np.array([1., 2.]), np.array([5., 60.]))
+        reg.book('h2', (self.edges, self.edges[:3]), ('c',), ('hc',)).fill(
+            0, self.rng.uniform(0.5, 1.5, 50), self.rng.uniform(-20., 120., 50),
+            self.rng.uniform(0., 30., 50))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            fname = os.path.join(tmpdir, 'h.root')
+            with uproot.recreate(fname) as f:
+                reg.write_uproot(f)
+            read = histograms.read_histograms(fname)
+
+        self.assertEqual(set(read.families), {'ha', 'hb', 'hc'})
+        for name, row in (('ha', 0), ('hb', 1)):
+            np.testing.assert_allclose(read[name].sumw[0], reg['h1'].sumw[row])
+            np.testing.assert_allclose(read[name].sumw2[0], reg['h1'].sumw2[row])
+            self.assertEqual(read[name].entries[0], reg['h1'].entries[row])
+        np.testing.assert_allclose(read['hc'].sumw[0], reg['h2'].sumw[0])
+        np.testing.assert_allclose(read['hc'].edges[1], self.edges[:3])
+
+if __name__ == '__main__':
+    unittest.main()
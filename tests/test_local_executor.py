@@ -0,0 +1,115 @@
+# coding: utf-8
+
+__all__ = ['TestLocalExecutor']
+
+import io
+import os
+import tempfile
+import unittest
+import contextlib
+
+from inclusion.condor.local_executor import LocalDAGExecutor
+
+def write_submission(fname, executable, items, logdir):
+    with open(fname, 'w') as f:
+        f.write('universe = vanilla\n')
+        f.write('executable = {}\n'.format(executable))
+        f.write('arguments = "$(item) $(extra)"\n')
+        f.write('output = {}/$(Cluster)_$(Process).out\n'.format(logdir))
+        f.write('error = {}/$(Cluster)_$(Process).err\n'.format(logdir))
+        f.write('queue item, extra from (\n')
+        for item in items:
+            f.write('  {}\n'.format(item))
+        f.write(')\n')
+
+def run(executor, **kwargs):
+    """Runs the DAG without printing the log, which is still written to its file."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return executor.run(**kwargs)
+
+class TestLocalExecutor(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.dir = self.tmpdir.name
+        self.order = os.path.join(self.dir, 'order.txt')
+        # appends its arguments to a file, to check the execution order
+        self.script = os.path.join(self.dir, 'record.sh')
+        with open(self.script, 'w') as f:
+            f.write('#!/bin/sh\necho "$@" >> {}\n'.format(self.order))
+        os.chmod(self.script, 0o755)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write_dag(self, nodes, relations):
+        """Nodes as {name: (executable, queue items)}, relations as (parents, children)."""
+        dagfile = os.path.join(self.dir, 'test.dag')
+        with open(dagfile, 'w') as f:
+            for name, (executable, items) in nodes.items():
+                subfile = os.path.join(self.dir, name + '.sub')
+                write_submission(subfile, executable, items, self.dir)
+                f.write('JOB {} {}\n'.format(name, subfile))
+            for parents, children in relations:
+                f.write('PARENT {} CHILD {}\n'.format(' '.join(parents), ' '.join(children)))
+        return dagfile
+
+    def executed(self):
+        if not os.path.exists(self.order):
+            return []
+        with open(self.order, 'r') as f:
+            return [line.split()[0] for line in f]
+
+    def test_parse(self):
+        dagfile = self.write_dag({'A': (self.script, ['a1, x', 'a2 y']), 'B': (self.script, ['b'])},
+                                 [(('A',), ('B',))])
+        nodes, parents = LocalDAGExecutor.parse_dag(dagfile)
+        self.assertEqual(nodes, {x: os.path.join(self.dir, x + '.sub') for x in 'AB'})
+        self.assertEqual(parents, {'A': set(), 'B': {'A'}})
+
+        sub = LocalDAGExecutor.parse_submission(nodes['A'])
+        self.assertEqual(sub['executable'], self.script)
+        self.assertEqual(sub['qvars'], ('item', 'extra'))
+        self.assertEqual(sub['qlines'], ['a1, x', 'a2 y'])
+
+        cmds = LocalDAGExecutor(dagfile).node_commands('A', cluster=3)
+        self.assertEqual(cmds[1], ([self.script, 'a2', 'y'], os.path.join(self.dir, '3_1.out'),
+                                   os.path.join(self.dir, '3_1.err')))
+
+    def test_order(self):
+        # C has no processes, and its child D must still run
+        dagfile = self.write_dag({'A': (self.script, ['a1', 'a2']), 'B': (self.script, ['b']),
+                                  'C': (self.script, []), 'D': (self.script, ['d'])},
+                                 [(('A',), ('B', 'C')), (('C',), ('D',))])
+        self.assertTrue(run(LocalDAGExecutor(dagfile, nworkers=2)))
+        order = self.executed()
+        self.assertEqual(sorted(order), ['a1', 'a2', 'b', 'd'])
+        self.assertEqual(set(order[:2]), {'a1', 'a2'})
+        self.assertFalse(LocalDAGExecutor(dagfile).rescue_files())
+
+    def test_failure_and_rescue(self):
+        nodes = {'A': (self.script, ['a']), 'F': ('false', ['f']),
+                 'B': (self.script, ['b']), 'G': (self.script, ['g'])}
+        dagfile = self.write_dag(nodes, [(('A',), ('F',)), (('F',), ('G',)), (('A',), ('B',))])
+
+        executor = LocalDAGExecutor(dagfile, nworkers=2)
+        self.assertFalse(run(executor))
+        # the child of the failed node is skipped
+        self.assertEqual(sorted(self.executed()), ['a', 'b'])
+        rescues = executor.rescue_files()
+        self.assertEqual(len(rescues), 1)
+        with open(rescues[0], 'r') as f:
+            self.assertEqual(sorted(f.read().split()), ['A', 'B', 'DONE', 'DONE'])
+        with open(executor.logfile, 'r') as f:
+            self.assertIn('1 nodes failed and 1 were skipped', f.read())
+
+        # the next execution resumes from the rescue file, and only reruns the remaining nodes
+        os.remove(self.order)
+        nodes['F'] = ('true', ['f'])
+        dagfile = self.write_dag(nodes, [(('A',), ('F',)), (('F',), ('G',)), (('A',), ('B',))])
+        self.assertTrue(run(LocalDAGExecutor(dagfile)))
+        self.assertEqual(self.executed(), ['g'])
+
+        # unless forced
+        os.remove(self.order)
+        self.assertTrue(run(LocalDAGExecutor(dagfile), force=True))
+        self.assertEqual(sorted(self.executed()), ['a', 'b', 'g'])
@@ -0,0 +1,67 @@
+# coding: utf-8
+
+__all__ = ['TestScaleFactors']
+
+import tempfile
+import unittest
+import numpy as np
+import h5py
+
+from inclusion import efficiency, histograms, scale_factors
+
+def registry(ref, trig, w2scale=1.):
+    """1D reference and trigger histograms with three bins, for two cuts."""
+    hists = histograms.HistogramRegistry()
+    for name, values in [('Ref1D_etau_dau1_pt_IsoTau', ref)] + [
+            ('Trig1D_etau_dau1_pt_IsoTau_CUTS_' + cut, v) for cut, v in trig.items()]:
+        family = hists.book(name, [np.array([0., 1., 2., 3.])], keys=(name,), names=(name,))
+        family.sumw[0, 1:-1] = values
+        family.sumw2[0, 1:-1] = w2scale * np.asarray(values)
+    return hists
+
+class TestScaleFactors(unittest.TestCase):
+    def setUp(self):
+        self.hdata = registry([10., 20., 0.], {'NoCut': [5., 20., 0.], 'cut1': [2., 4., 0.]})
+        self.hmc = registry([8., 10., 4.], {'NoCut': [8., 5., 1.], 'cut1': [4., 0., 0.]}, w2scale=0.5)
+
+    def test_compute(self):
+        res = scale_factors.compute_eff_and_sf(self.hdata, self.hmc, 'etau', 'dau1_pt', 'IsoTau')
+        self.assertEqual(res['cuts'], ['NoCut', 'cut1'])
+        for key in ('eff_data', 'eff_mc', 'sf', 'norm_data', 'norm_mc'):
+            self.assertEqual(res[key].shape, (3, 2, 3))
+
+        expected = efficiency.clopper_pearson([[5., 20., 0.], [2., 4., 0.]], [10., 20., 0.], cl=0.95)
+        np.testing.assert_allclose(res['eff_data'], np.stack(expected))
+
+        # the MC efficiency is zero in the second bin of the second cut
+        sf = res['eff_data'][0] / np.where(res['eff_mc'][0] == 0., np.inf, res['eff_mc'][0])
+        np.testing.assert_allclose(res['sf'][0], sf)
+        self.assertTrue((res['sf'][1:, 1, 1:] == 0.).all())
+        np.testing.assert_allclose(res['norm_data'][0].sum(axis=1), [1., 1.])
+
+        self.assertIsNone(scale_factors.compute_eff_and_sf(self.hdata, self.hmc, 'etau', 'dau1_pt', 'VBFTau'))
+
+    def test_store(self):
+        res = scale_factors.compute_eff_and_sf(self.hdata, self.hmc, 'etau', 'dau1_pt', 'IsoTau')
+        res['fit_data'], res['fit_mc'] = np.ones((2,3)), np.zeros((2,3))
+        res['fit_range'] = np.array([0., 3.])
+        with tempfile.TemporaryDirectory() as tmpdir:
+            fname = scale_factors.store_path(tmpdir, 'Data', 'MC', 'etau', '_default')
+            with h5py.File(fname, 'w') as f:
+                scale_factors.write_results(f.create_group('dau1_pt/IsoTau'), res)
+                scale_factors.write_index(f)
+
+            with scale_factors.EfficiencyStore(fname) as store:
+                self.assertEqual(set(store.keys()), {('dau1_pt', 'IsoTau', 'NoCut'),
+                                                     ('dau1_pt', 'IsoTau', 'cut1')})
+                new = store.results('dau1_pt', 'IsoTau')
+                one = store.get('dau1_pt', 'IsoTau', 'cut1')
+
+        self.assertEqual(new['cuts'], res['cuts'])
+        np.testing.assert_array_equal(new['edges'][0], res['edges'][0])
+        for key in ('eff_data', 'eff_mc', 'sf', 'norm_data', 'norm_mc', 'fit_data', 'fit_range'):
+            np.testing.assert_array_equal(new[key], res[key])
+            if key.startswith('fit'):
+                continue
+            np.testing.assert_array_equal(one[key], res[key][:, 1])
+        np.testing.assert_array_equal(one['fit_mc'], res['fit_mc'][1])
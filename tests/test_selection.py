@@ -0,0 +1,194 @@
+# coding: utf-8
+
+__all__ = ['TestEventSelectionArray']
+
+import unittest
+import itertools as it
+from types import SimpleNamespace
+import numpy as np
+
+from inclusion import selection
+
+class dot_dict(dict):
+    """dot.notation access to dictionary attributes (same as `utils.dot_dict`)"""
+    __getattr__ = dict.get
+
+class TestEventSelectionArray(unittest.TestCase):
+    """
+    Checks the batch selection gives the same per-event decisions as
+    the scalar one, using random events.
+    """
+    nevents = 500
+
+    def setUp(self):
+        rng = np.random.default_rng(seed=42)
+        n = self.nevents
+        self.entries = {
+            'triggerbit'           : rng.integers(0, 2**45, n, dtype=np.int64),
+            'RunNumber'            : rng.integers(315000, 320000, n),
+            'pairType'             : rng.integers(0, 4, n),
+            'isOS'                 : rng.integers(0, 2, n),
+            'isLeptrigger'         : rng.integers(0, 2, n),
+            'isBoosted'            : rng.integers(0, 2, n),
+            'nleps'                : rng.integers(0, 2, n),
+            'nbjetscand'           : rng.integers(0, 4, n),
+            'dau1_eleMVAiso'       : rng.integers(0, 2, n).astype(np.float32),
+            'dau1_iso'             : rng.uniform(0., 0.3, n).astype(np.float32),
+            'dau2_iso'             : rng.uniform(0., 0.3, n).astype(np.float32),
+            'dau1_deepTauVsJet'    : rng.integers(0, 8, n),
+            'dau2_deepTauVsJet'    : rng.integers(0, 8, n),
+            'dau1_pt'              : rng.uniform(20., 250., n).astype(np.float32),
+            'dau2_pt'              : rng.uniform(20., 250., n).astype(np.float32),
+            'tauH_mass'            : rng.uniform(0., 200., n).astype(np.float32),
+            'bH_mass'              : rng.uniform(0., 300., n).astype(np.float32),
+            'bjet1_bID_deepFlavor' : rng.uniform(0., 1., n).astype(np.float32),
+            'bjet2_bID_deepFlavor' : rng.uniform(0., 1., n).astype(np.float32),
+            'metnomu_et'           : rng.uniform(-10., 300., n).astype(np.float32),
+            'mhtnomu_et'           : rng.uniform(-10., 300., n).astype(np.float32),
+            }
+        self.entries['tauH_mass'][:5] = np.nan
+
+        self.cfg = SimpleNamespace(
+            bjets_cut = True,
+            mass_cut = 'standard',
+            custom_cut = ('(dau2_pt < 40 and dau1_pt < 190) or '
+                          '(dau1_pt < 40 and dau2_pt < 190)'),
+            triggers = ('METNoMu120', 'IsoMu24', 'IsoTau180', 'IsoDoubleTauCustom', 'VBFTauCustom'),
+            trig_custom = {'IsoDoubleTauCustom', 'VBFTauCustom'},
+            cuts = {'METNoMu120': {'metnomu_et': ('>', [0., 150.]),
+                                   'mhtnomu_et': ('>', [0.])},
+                    'IsoTau180':  {'dau1_pt': ('>', [190.])}},
+            inters_general = {'MET' : (('METNoMu120',), ('IsoMu24', 'METNoMu120')),
+                              'EG'  : (),
+                              'Mu'  : (('IsoMu24',),),
+                              'Tau' : (('IsoTau180',),)},
+            inters = {'tautau': {'MET' : (('IsoDoubleTauCustom',),
+                                          ('IsoDoubleTauCustom', 'METNoMu120')),
+                                 'EG'  : (),
+                                 'Mu'  : (),
+                                 'Tau' : (('VBFTauCustom',),)}},
+            )
+        self.tcombs = ( self.cfg.inters_general['MET'] + self.cfg.inters_general['Mu'] +
+                        self.cfg.inters_general['Tau'] + self.cfg.inters['tautau']['MET'] +
+                        self.cfg.inters['tautau']['Tau'] )
+
+    def scalar(self, isdata, plan=None):
+        for i in range(self.nevents):
+            evt = dot_dict({k: v[i] for k,v in self.entries.items()})
+            yield i, selection.EventSelection(evt, isdata=isdata, year='2018',
+                                              configuration=self.cfg, plan=plan)
+
+    def batch(self, isdata):
+        return selection.EventSelectionArray(self.entries, isdata=isdata, year='2018',
+                                             configuration=self.cfg)
+
+    def test_triggers(self):
+        for isdata in (False, True):
+            sel = self.batch(isdata)
+            bits = {t: sel.trigger_bits(t) for t in self.cfg.triggers}
+            anytrig = sel.any_trigger(self.cfg.triggers)
+            for i, evt in self.scalar(isdata):
+                for t in self.cfg.triggers:
+                    self.assertEqual(evt.trigger_bits(t), bits[t][i])
+                self.assertEqual(evt.any_trigger(self.cfg.triggers), anytrig[i])
+
+    def test_trigger_intersections(self):
+        for isdata in (False, True):
+            sel = self.batch(isdata)
+            for tcomb in self.tcombs:
+                exp = np.logical_and.reduce([sel.trigger_bits(t) for t in tcomb])
+                np.testing.assert_array_equal(sel.trigger_intersection(tcomb), exp)
+
+    def test_selection_cuts(self):
+        for isdata in (False, True):
+            sel = self.batch(isdata)
+            opts = [dict(mass_cut=m) for m in ('standard', 'inverted', None)]
+            opts += [dict(lepton_veto=False, bjets_cut=False, custom_cut=self.cfg.custom_cut)]
+            masks = [sel.selection_cuts(**o) for o in opts]
+            for i, evt in self.scalar(isdata):
+                for o, m in zip(opts, masks):
+                    self.assertEqual(evt.selection_cuts(iso_cuts=dict(), **o), m[i])
+
+    def test_categories(self):
+        sel = self.batch(False)
+        masks = {c: sel.sel_category(c) for c in sel.categories}
+        for i, evt in self.scalar(False):
+            for c in sel.categories:
+                self.assertEqual(evt.sel_category(c), masks[c][i])
+
+    def test_channels(self):
+        sel = self.batch(False)
+        pairtype = self.entries['pairType']
+        expected = {'mutau': pairtype == 0, 'etau': pairtype == 1, 'tautau': pairtype == 2,
+                    'mumu': pairtype == 3, 'all': pairtype < 3}
+        for chn, exp in expected.items():
+            np.testing.assert_array_equal(sel.channel_mask(chn), exp)
+
+    def test_reference(self):
+        for isdata in (False, True):
+            for dataset in ('MET', 'Mu', 'Tau'):
+                sel = self.batch(isdata)
+                masks = {t: sel.reference_mask(t, 'tautau', self.cfg.triggers, dataset)
+                         for t in self.tcombs}
+                for i, evt in self.scalar(isdata):
+                    for t in self.tcombs:
+                        exp = ( evt.check_inters_with_dataset(t, 'tautau', dataset) and
+                                evt.dataset_cuts(t, 'tautau') and
+                                evt.dataset_triggers(t, 'tautau', self.cfg.triggers, dataset)[0] )
+                        res = False if masks[t] is None else masks[t][i]
+                        self.assertEqual(bool(exp), res)
+
+    def test_plan(self):
+        triggercomb = {'tautau': self.tcombs}
+        for isdata in (False, True):
+            for dataset in ('MET', 'Mu', 'Tau'):
+                plan = selection.SelectionPlan(isdata, '2018', self.cfg, triggercomb,
+                                               self.cfg.triggers, dataset)
+                sel = self.batch(isdata)
+                planned = selection.EventSelectionArray(self.entries, isdata=isdata, year='2018',
+                                                        configuration=self.cfg, plan=plan)
+                for t in self.tcombs:
+                    exp = sel.reference_mask(t, 'tautau', self.cfg.triggers, dataset)
+                    if t not in plan.tcombs('tautau'):
+                        self.assertTrue(exp is None or not exp.any())
+                        continue
+                    np.testing.assert_array_equal(planned.reference_cuts(t, 'tautau'), exp)
+
+                masks = {t: planned.reference_cuts(t, 'tautau') for t in plan.tcombs('tautau')}
+                for i, evt in self.scalar(isdata, plan=plan):
+                    for t in plan.tcombs('tautau'):
+                        self.assertEqual(evt.reference_cuts(t, 'tautau'), masks[t][i])
+
+    def test_var_cuts(self):
+        sel = self.batch(False)
+        for t in self.cfg.triggers:
+            for variables in (['metnomu_et'], ['dau1_pt'], ['metnomu_et', 'mhtnomu_et']):
+                masks = sel.var_cuts(t, variables, 'NoCut')
+                for i, evt in self.scalar(False):
+                    flags = evt.var_cuts(t, variables, 'NoCut')
+                    self.assertEqual(flags.keys(), masks.keys())
+                    for k in flags:
+                        self.assertEqual(flags[k], masks[k][i])
+
+    def test_cut_combinations(self):
+        combs = selection.CutCombinations(self.cfg, 'NoCut', '_PLUS_')
+        sel = self.batch(False)
+        bits = combs.bits(self.entries)
+        for t in self.tcombs:
+            for variables in (('metnomu_et',), ('dau1_pt',), ('metnomu_et', 'mhtnomu_et')):
+                keys, _ = combs.combinations(t, variables)
+                passes = combs.passes(bits, t, variables)
+                flags = [sel.var_cuts(x, variables, 'NoCut').items() for x in t]
+                exp = {'_PLUS_'.join(e[0] for e in elem):
+                       np.logical_and.reduce([np.broadcast_to(e[1], (self.nevents,)) for e in elem])
+                       for elem in it.product(*flags)}
+                self.assertEqual(keys, tuple(exp.keys()))
+                for ikey,key in enumerate(keys):
+                    np.testing.assert_array_equal(passes[:,ikey], exp[key])
+                for i, evt in self.scalar(False):
+                    if i % 50 == 0:
+                        np.testing.assert_array_equal(
+                            combs.passes(combs.bits(evt.entries), t, variables), passes[i])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+# coding: utf-8
+
+__all__ = ['TestTurnOn']
+
+import unittest
+import numpy as np
+
+from inclusion import efficiency, turn_on
+
+class TestTurnOn(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(42)
+        edges = np.linspace(50., 500., 46)
+        self.x = (edges[1:] + edges[:-1]) / 2
+        self.true = np.array([[0.04, 180. + 5*i, 0.97] for i in range(4)])
+        npass = rng.binomial(2000, turn_on.sigmoid(self.x, self.true)).astype(float)
+        self.effs = np.stack(efficiency.clopper_pearson(npass, np.full_like(npass, 2000.)))
+
+    def test_fit(self):
+        pars, covs, status = turn_on.fit_turn_ons(self.x, self.effs, (50., 500.), slope=0.03)
+        self.assertTrue(status.all())
+        self.assertEqual(covs.shape, (4, 3, 3))
+        # compatible with the true parameters within 4 standard deviations
+        errs = np.sqrt(np.diagonal(covs, axis1=1, axis2=2))
+        self.assertTrue((np.abs(pars - self.true) < 4*errs).all())
+
+        # too few points in the fit range
+        pars, covs, status = turn_on.fit_turn_ons(self.x, self.effs, (50., 60.), slope=0.03)
+        self.assertFalse(status.any())
+        self.assertTrue(np.isnan(pars).all())
+
+    def test_fit_all(self):
+        tasks = [(key, [(self.x, self.effs)] * 2, (50., 500.), 0.03) for key in ('a', 'b')]
+        fits = turn_on.fit_all(tasks)
+        self.assertEqual(set(fits), {'a', 'b'})
+        self.assertEqual(len(fits['a']), 2)
+        single = turn_on.fit_turn_ons(self.x, self.effs, (50., 500.), slope=0.03)
+        for pars in (fits['a'][0][0], fits['a'][1][0], fits['b'][1][0]):
+            np.testing.assert_allclose(pars, single[0], rtol=1e-4)
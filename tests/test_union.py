@@ -0,0 +1,86 @@
+# coding: utf-8
+
+__all__ = ['TestUnion']
+
+import itertools as it
+import tempfile
+import unittest
+import numpy as np
+
+from inclusion import union
+from inclusion.utils import utils
+
+class FakeStore:
+    """Mimics `scale_factors.EfficiencyStore` with a single cut per trigger combination."""
+    def __init__(self, effs):
+        self.effs = effs
+
+    def keys(self):
+        return [(v, t, 'NoCut') for v, t in self.effs]
+
+    def get(self, variable, tcomb, cut):
+        eff = self.effs[(variable, tcomb)]
+        return {'edges': (np.arange(len(eff) + 1.),),
+                'eff_data': np.stack((eff, eff/10, eff/10)), 'eff_mc': np.stack((eff/2, eff, eff))}
+
+class TestUnion(unittest.TestCase):
+    def setUp(self):
+        # independent triggers, with one efficiency per trigger and bin
+        rng = np.random.default_rng(7)
+        self.ntrigs = 5
+        self.effs = rng.uniform(0., 1., size=(3, self.ntrigs))
+        self.inters = np.ones((3, 1 << self.ntrigs))
+        for mask in range(1 << self.ntrigs):
+            for i in range(self.ntrigs):
+                if mask & (1 << i):
+                    self.inters[:, mask] *= self.effs[:, i]
+
+    def test_transforms(self):
+        f = np.arange(16.).reshape(2, 8)
+        g = union.zeta_transform(f)
+        # subset sums computed explicitly
+        for mask in range(8):
+            expected = sum(f[:, s] for s in range(8) if s & mask == s)
+            np.testing.assert_allclose(g[:, mask], expected)
+        np.testing.assert_allclose(union.mobius_transform(g), f)
+        np.testing.assert_array_equal(union.popcount(3), [0, 1, 1, 2, 1, 2, 2, 3])
+        self.assertEqual(union.combination_mask(('B', 'D'), ('A', 'B', 'C', 'D')), 0b1010)
+
+    def test_union(self):
+        probs = union.union_probabilities(self.inters)
+        self.assertEqual(probs.shape, self.inters.shape)
+        for mask in range(1 << self.ntrigs):
+            sel = [i for i in range(self.ntrigs) if mask & (1 << i)]
+            expected = 1. - np.prod(1. - self.effs[:, sel], axis=1)
+            np.testing.assert_allclose(probs[:, mask], expected, atol=1e-12)
+
+        # explicit inclusion-exclusion sum over all non-empty subsets
+        full = 0.
+        for n in range(1, self.ntrigs + 1):
+            for comb in it.combinations(range(self.ntrigs), n):
+                full = full + (-1)**(n+1) * self.inters[:, sum(1 << i for i in comb)]
+        np.testing.assert_allclose(probs[:, -1], full)
+
+    def test_lookup_table(self):
+        triggers = ('IsoMu24', 'IsoTau180')
+        comb = utils.join_name_trigger_intersection(triggers)
+        store = FakeStore({('dau1_pt', 'IsoMu24'): np.array([.2, .4, .6]),
+                           ('dau1_pt', 'IsoTau180'): np.array([.5, .5, .5]),
+                           ('dau1_pt', comb): np.array([.1, .2, .3]),
+                           ('dau2_pt', 'IsoMu24'): np.array([.8, .9])})
+        with tempfile.TemporaryDirectory() as tmpdir:
+            fname = union.lookup_path(tmpdir, 'Data', 'MC', 'mutau', '_default')
+            union.write_lookup_table(fname, store, 'mutau', triggers, {})
+            lut = union.LookupTable(fname)
+
+            self.assertEqual(lut.triggers, triggers)
+            self.assertIsInstance(lut.effs, np.memmap)
+            np.testing.assert_array_equal(lut.edges('dau2_pt'), [0., 1., 2.])
+            np.testing.assert_allclose(lut.intersections('dau1_pt'),
+                                       [[0., .2, .5, .1], [0., .4, .5, .2], [0., .6, .5, .3]])
+            # the second trigger combination is missing for dau2_pt
+            np.testing.assert_allclose(lut.intersections('dau2_pt', data=False),
+                                       [[0., .4, 0., 0.], [0., .45, 0., 0.]])
+            data, mc = lut.unions('dau1_pt')
+            np.testing.assert_allclose(data[:, -1], [.6, .7, .8])
+            del lut
@@ -2,9 +2,42 @@
 
 __all__ = ['TestCase']
 
+import os
+import tempfile
 import unittest
+import numpy as np
+
+from inclusion.utils import utils
 
 class TestCase(unittest.TestCase):
 
     def test_dummy(self):
         return True
+
+    def test_find_bins(self):
+        edges = [0., 10., 20., 50.]
+        values = np.array([-1., 0., 5., 10., 49.9, 50., 60.])
+        binids, (nunder, nover) = utils.find_bins(edges, values)
+        np.testing.assert_array_equal(binids, [1, 1, 1, 2, 3, 3, 3])
+        self.assertEqual((nunder, nover), (1, 2))
+        binids, outside = utils.find_bins(edges, [25.])
+        np.testing.assert_array_equal(binids, [3])
+        self.assertEqual(outside, (0, 0))
+
+    def test_plan_work_units(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            files = []
+            for folder in ('SKIM_A', 'SKIM_B'):
+                os.makedirs(os.path.join(tmpdir, folder))
+                for i in (1, 2):
+                    files.append(os.path.join(tmpdir, folder, 'output_{}.root'.format(i)))
+                    with open(files[-1], 'w') as f:
+                        f.write('events')
+
+            units = utils.plan_work_units(files, unit_size=0)
+            self.assertEqual(units, {'SKIM_A_1': [[files[0], None, None]], 'SKIM_A_2': [[files[1], None, None]],
+                                     'SKIM_B_1': [[files[2], None, None]], 'SKIM_B_2': [[files[3], None, None]]})
+            # small files of the same folder are grouped
+            self.assertEqual(list(utils.plan_work_units(files, unit_size=1)), ['SKIM_A_1', 'SKIM_B_1'])
+            # a file listed twice
+            self.assertRaises(ValueError, utils.plan_work_units, files + files[:1], 0)